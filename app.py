@@ -8,6 +8,7 @@ from routes.resturent_routes import resturent_routes
 from routes.reviews_routes import reviews_routes
 from routes.sites_routes import sites_routes
 from routes.trips_routes import trips_routes
+from routes.search_routes import search_routes
 import os
 import dotenv
 from flask_jwt_extended import JWTManager
@@ -17,6 +18,16 @@ from flasgger import Swagger
 from werkzeug.exceptions import BadRequest, Unauthorized, Forbidden, NotFound, MethodNotAllowed, UnprocessableEntity, TooManyRequests
 from utils.validation import ValidationError
 from routes.rate_limit import L
+from services.cache import catalog_cache
+from services.payment_queue import payment_queue
+from services.booking_holds import booking_holds
+from services.token_blocklist import token_blocklist
+from services.metrics import metrics, stats_collector
+from services.query_guard import query_guard
+from services.text_search import text_search
+from services.fuzzy_search import fuzzy_search
+from utils.json_provider import init_json
+from services.compression import compression
 dotenv.load_dotenv()
 app=Flask(__name__)
 
@@ -24,16 +35,51 @@ app.config['SECRET_KEY']=os.getenv('SECRET_KEY')
 app.config['JWT_SECRET_KEY']=os.getenv('JWT_SECRET_KEY') 
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
+app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() != 'false'  # off only for load tests
+app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'memory')  # memory, redis, none
+app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL', 'local://')
+app.config['CACHE_TTL'] = int(os.getenv('CACHE_TTL', 60))
+app.config['PAYMENT_INTENT_MODE'] = os.getenv('PAYMENT_INTENT_MODE', 'sync')  # sync, async
+app.config['PAYMENT_QUEUE_WORKERS'] = int(os.getenv('PAYMENT_QUEUE_WORKERS', 4))
+app.config['STRIPE_WEBHOOK_SECRET'] = os.getenv('STRIPE_WEBHOOK_SECRET')
+app.config['BOOKING_HOLD_MINUTES'] = int(os.getenv('BOOKING_HOLD_MINUTES', 30))  # unpaid bookings release their rooms/seats after this
+app.config['BOOKING_HOLD_SWEEP_SECONDS'] = float(os.getenv('BOOKING_HOLD_SWEEP_SECONDS', 60))
+app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() != 'false'
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')  # optional bearer token for /metrics
+app.config['SQL_BUDGET_MODE'] = os.getenv('SQL_BUDGET_MODE', 'off')  # off, warn, raise (development and tests)
+app.config['SQL_BUDGET_DEFAULT'] = int(os.getenv('SQL_BUDGET_DEFAULT', 50))
+app.config['SQL_N_PLUS_ONE_THRESHOLD'] = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', 5))
+app.config['FUZZY_MIN_SIMILARITY'] = float(os.getenv('FUZZY_MIN_SIMILARITY', 0.5))
+app.config['FUZZY_INDEX_TTL'] = int(os.getenv('FUZZY_INDEX_TTL', 300))  # in-process trigram index (non-PostgreSQL)
+app.config['JSON_ENCODER'] = os.getenv('JSON_ENCODER', 'auto')  # auto (orjson when installed), orjson, stdlib
+app.config['COMPRESSION_ENABLED'] = os.getenv('COMPRESSION_ENABLED', 'true').lower() != 'false'
+app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))  # bytes; smaller buffered bodies are sent as is
+app.config['COMPRESSION_GZIP_LEVEL'] = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))  # br is offered only when brotli is installed
+app.config['TOKEN_BLOCKLIST_BACKEND'] = os.getenv('TOKEN_BLOCKLIST_BACKEND', 'database')  # database, redis
+app.config['TOKEN_BLOCKLIST_REDIS_URL'] = os.getenv('TOKEN_BLOCKLIST_REDIS_URL', 'local://')
+app.config['TOKEN_BLOCKLIST_SYNC_SECONDS'] = float(os.getenv('TOKEN_BLOCKLIST_SYNC_SECONDS', 1))
+
+init_json(app)
+# Registered first so it runs after every other after_request hook has set its headers
+compression.init_app(app)
 db.init_app(app)
 auth.init_app(app)
 L.init_app(app)
+catalog_cache.init_app(app, models=[hotel, restaurant, torist_place])
+text_search.init_app(app, models=[hotel, restaurant, torist_place])
+fuzzy_search.init_app(app)
+payment_queue.init_app(app)
+booking_holds.init_app(app)
+metrics.init_app(app)
+query_guard.init_app(app)
+metrics.register_collector(stats_collector('catalog_cache', catalog_cache.stats))
 jwt=JWTManager(app)
-app.config['TOKEN_BLOCKLIST'] = set()
+token_blocklist.init_app(app)
 
 @jwt.token_in_blocklist_loader
 def is_token_revoked(jwt_header, jwt_payload):
-    return jwt_payload.get('jti') in app.config['TOKEN_BLOCKLIST']
+    return token_blocklist.is_revoked(jwt_payload.get('jti'))
 
 # Swagger configuration
 swagger_config = {
@@ -83,6 +129,7 @@ app.register_blueprint(resturent_routes,url_prefix='/resturent')
 app.register_blueprint(reviews_routes,url_prefix='/reviews')
 app.register_blueprint(sites_routes,url_prefix='/sites')
 app.register_blueprint(trips_routes,url_prefix='/trips')
+app.register_blueprint(search_routes,url_prefix='/search')
 app.register_blueprint(homes,url_prefix='/')
 
 
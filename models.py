@@ -2,6 +2,8 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash,check_password_hash
 import secrets
+from services.metrics import metrics
+from utils import geohash
 db=SQLAlchemy()
 
 class User(db.Model):
@@ -12,9 +14,11 @@ class User(db.Model):
     role = db.Column(db.String(20), default='user')  # user, owner, guest, admin
     provider = db.Column(db.String(50), nullable=True)  
     def set_password(self,password):
-        self.password=generate_password_hash(password)
+        with metrics.password_hash_duration.time('hash'):
+            self.password=generate_password_hash(password)
     def check_password(self,password):
-        return check_password_hash(self.password,password)
+        with metrics.password_hash_duration.time('check'):
+            return check_password_hash(self.password,password)
 
     
     def to_dict(self):
@@ -26,7 +30,89 @@ class User(db.Model):
         }
 
 
-class torist_place(db.Model):
+class revoked_token(db.Model):
+    """Revoked JWTs, kept until the token would have expired anyway"""
+    jti=db.Column(db.String(64),primary_key=True)
+    token_type=db.Column(db.String(10))
+    expires_at=db.Column(db.DateTime,nullable=True,index=True)  # None = token has no exp, never purged
+    revoked_at=db.Column(db.DateTime,nullable=False,default=datetime.utcnow,index=True)
+
+
+class ReviewStats:
+    """
+    Review aggregates kept on catalog rows
+
+    Maintained incrementally by ReviewStatsService whenever a review is
+    created, updated or deleted, so reads never aggregate the review table.
+    """
+    review_count=db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    review_sum=db.Column(db.Float,nullable=False,default=0.0,server_default='0')
+    review_average=db.Column(db.Float,nullable=False,default=0.0,server_default='0')  # 0 while unreviewed
+    review_hist_1=db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    review_hist_2=db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    review_hist_3=db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    review_hist_4=db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    review_hist_5=db.Column(db.Integer,nullable=False,default=0,server_default='0')
+
+    STATS_COLUMNS=('review_count','review_average','review_hist_1','review_hist_2','review_hist_3','review_hist_4','review_hist_5')
+    # to_dict() key -> (columns it is computed from, function of the row)
+    STATS_FIELDS={
+        "review_count":(('review_count',), lambda row: row.review_count or 0),
+        "review_average":(('review_average',), lambda row: round(row.review_average or 0.0, 2)),
+        "rating_histogram":(STATS_COLUMNS[2:], lambda row: {"1":row.review_hist_1 or 0,"2":row.review_hist_2 or 0,"3":row.review_hist_3 or 0,
+                                                            "4":row.review_hist_4 or 0,"5":row.review_hist_5 or 0}),
+    }
+
+    @staticmethod
+    def stats_of(row):
+        """review_stats() of an instance or of a projected row"""
+        return {name: value(row) for name, (_, value) in ReviewStats.STATS_FIELDS.items()}
+
+    def review_stats(self):
+        return ReviewStats.stats_of(self)
+
+
+class GeoPoint:
+    """
+    Optional coordinates of a catalog row
+
+    geohash is derived from latitude/longitude on every insert and update
+    (see _sync_geohash) and indexed, so proximity queries read a few
+    geohash prefix ranges instead of scanning the table.
+    """
+    latitude=db.Column(db.Float,nullable=True)
+    longitude=db.Column(db.Float,nullable=True)
+    geohash=db.Column(db.String(12),nullable=True)
+
+    def geo_point(self):
+        return {"latitude":self.latitude,"longitude":self.longitude}
+
+
+@db.event.listens_for(GeoPoint, 'before_insert', propagate=True)
+@db.event.listens_for(GeoPoint, 'before_update', propagate=True)
+def _sync_geohash(mapper, connection, target):
+    if target.latitude is None or target.longitude is None:
+        target.geohash = None
+    else:
+        target.geohash = geohash.encode(target.latitude, target.longitude)
+
+
+def search_vector(name, location, description):
+    """
+    Weighted tsvector over a catalog row (name > location > description)
+
+    PostgreSQL only. The GIN expression indexes below and the full-text
+    queries in services/text_search.py must build the exact same
+    expression, or the planner will not use the index. The 'simple'
+    configuration does no stemming, which suits transliterated place names.
+    """
+    config = db.literal_column("'simple'")
+    return db.func.setweight(db.func.to_tsvector(config, name), db.literal_column("'A'")).op('||')(
+        db.func.setweight(db.func.to_tsvector(config, location), db.literal_column("'B'"))).op('||')(
+        db.func.setweight(db.func.to_tsvector(config, description), db.literal_column("'C'")))
+
+
+class torist_place(ReviewStats, GeoPoint, db.Model):
     id=db.Column(db.Integer,primary_key=True)
     name=db.Column(db.String(100),nullable=False)
     description=db.Column(db.String(200),nullable=False)
@@ -34,16 +120,48 @@ class torist_place(db.Model):
     rating=db.Column(db.Float,nullable=False)
     price=db.Column(db.Float,nullable=False)
     created_at=db.Column(db.DateTime,default=datetime.utcnow)
-    updated_at=db.Column(db.DateTime,default=datetime.utcnow)
+    updated_at=db.Column(db.DateTime,default=datetime.utcnow,onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_torist_place_location_price_rating', 'location', 'price', 'rating'),
+        db.Index('ix_torist_place_lower_name', db.func.lower(name)),
+        db.Index('ix_torist_place_created_at_id', 'created_at', 'id'),
+        db.Index('ix_torist_place_review_average_id', 'review_average', 'id'),
+        db.Index('ix_torist_place_geohash', 'geohash'),
+        db.Index('ix_torist_place_search', search_vector(name, location, description),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+        db.Index('ix_torist_place_name_trgm', db.text('lower(name) gin_trgm_ops'), postgresql_using='gin').ddl_if(dialect='postgresql'),
+        db.Index('ix_torist_place_location_trgm', db.text('lower(location) gin_trgm_ops'), postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
     
+    DICT_COLUMNS=('id','name','description','location','rating','price','latitude','longitude',*ReviewStats.STATS_COLUMNS)
+    DERIVED_FIELDS=ReviewStats.STATS_FIELDS
+
+    @staticmethod
+    def row_dict(row):
+        """to_dict() of an instance or of a projected row (see utils/projection.py)"""
+        return {
+            "id":row.id,
+            "name":row.name,
+            "description":row.description,
+            "location":row.location,
+            "rating":row.rating,
+            "price":row.price,
+            "latitude":row.latitude,
+            "longitude":row.longitude,
+            **ReviewStats.stats_of(row)
+        }
+
     def to_dict(self):
+        return self.row_dict(self)
+
+    def to_summary(self):
+        """Compact form embedded in other resources (e.g. trip itineraries)"""
         return {
             "id":self.id,
             "name":self.name,
-            "description":self.description,
             "location":self.location,
-            "rating":self.rating,
-            "price":self.price
+            "price":self.price,
+            "review_average":round(self.review_average or 0.0, 2)
         }
 """Non-breaking naming aliases"""
 tourist_place = torist_place
@@ -51,49 +169,180 @@ tourist_place = torist_place
 
 
 
-class hotel(db.Model):
+class hotel(ReviewStats, GeoPoint, db.Model):
     id=db.Column(db.Integer,primary_key=True)
     name=db.Column(db.String(100),nullable=False)
     description=db.Column(db.String(200),nullable=False)
     location=db.Column(db.String(100),nullable=False)
     rating=db.Column(db.Float,nullable=False)
     price=db.Column(db.Float,nullable=False)
+    total_rooms=db.Column(db.Integer,nullable=True)  # None = room inventory not tracked
     created_at=db.Column(db.DateTime,default=datetime.utcnow)
-    updated_at=db.Column(db.DateTime,default=datetime.utcnow)
+    updated_at=db.Column(db.DateTime,default=datetime.utcnow,onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_hotel_location_price_rating', 'location', 'price', 'rating'),
+        db.Index('ix_hotel_lower_name', db.func.lower(name)),
+        db.Index('ix_hotel_created_at_id', 'created_at', 'id'),
+        db.Index('ix_hotel_review_average_id', 'review_average', 'id'),
+        db.Index('ix_hotel_geohash', 'geohash'),
+        db.Index('ix_hotel_search', search_vector(name, location, description),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+        db.Index('ix_hotel_name_trgm', db.text('lower(name) gin_trgm_ops'), postgresql_using='gin').ddl_if(dialect='postgresql'),
+        db.Index('ix_hotel_location_trgm', db.text('lower(location) gin_trgm_ops'), postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+    DICT_COLUMNS=('id','name','description','location','rating','price','total_rooms','latitude','longitude',*ReviewStats.STATS_COLUMNS)
+    DERIVED_FIELDS=ReviewStats.STATS_FIELDS
+
+    @staticmethod
+    def row_dict(row):
+        return {
+            "id":row.id,
+            "name":row.name,
+            "description":row.description,
+            "location":row.location,
+            "rating":row.rating,
+            "price":row.price,
+            "total_rooms":row.total_rooms,
+            "latitude":row.latitude,
+            "longitude":row.longitude,
+            **ReviewStats.stats_of(row)
+        }
+
     def to_dict(self):
+        return self.row_dict(self)
+
+    def to_summary(self):
+        """Compact form embedded in other resources (e.g. bookings with include=hotel)"""
         return {
             "id":self.id,
             "name":self.name,
-            "description":self.description,
             "location":self.location,
-            "rating":self.rating,
-            "price":self.price
+            "price":self.price,
+            "review_average":round(self.review_average or 0.0, 2)
         }
+
+
+class room_allocation(db.Model):
+    """Rooms already booked per hotel per night"""
+    id=db.Column(db.Integer,primary_key=True)
+    hotel_id=db.Column(db.Integer,db.ForeignKey('hotel.id',ondelete='CASCADE'),nullable=False)
+    night=db.Column(db.Date,nullable=False)
+    rooms_booked=db.Column(db.Integer,nullable=False,default=0)
+    __table_args__ = (
+        db.UniqueConstraint('hotel_id', 'night', name='uq_room_allocation_hotel_night'),
+    )
    
    
 
-class restaurant(db.Model):
+class restaurant(ReviewStats, GeoPoint, db.Model):
     id=db.Column(db.Integer,primary_key=True)
     name=db.Column(db.String(100),nullable=False)
     description=db.Column(db.String(200),nullable=False)
     location=db.Column(db.String(100),nullable=False)
     rating=db.Column(db.Float,nullable=False)
     price=db.Column(db.Float,nullable=False)
+    seats_per_slot=db.Column(db.Integer,nullable=True)  # None = table capacity not tracked
     created_at=db.Column(db.DateTime,default=datetime.utcnow)
-    updated_at=db.Column(db.DateTime,default=datetime.utcnow)
+    updated_at=db.Column(db.DateTime,default=datetime.utcnow,onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_restaurant_location_price_rating', 'location', 'price', 'rating'),
+        db.Index('ix_restaurant_lower_name', db.func.lower(name)),
+        db.Index('ix_restaurant_created_at_id', 'created_at', 'id'),
+        db.Index('ix_restaurant_review_average_id', 'review_average', 'id'),
+        db.Index('ix_restaurant_geohash', 'geohash'),
+        db.Index('ix_restaurant_search', search_vector(name, location, description),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+        db.Index('ix_restaurant_name_trgm', db.text('lower(name) gin_trgm_ops'), postgresql_using='gin').ddl_if(dialect='postgresql'),
+        db.Index('ix_restaurant_location_trgm', db.text('lower(location) gin_trgm_ops'), postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+    DICT_COLUMNS=('id','name','description','location','rating','price','seats_per_slot','latitude','longitude',*ReviewStats.STATS_COLUMNS)
+    DERIVED_FIELDS=ReviewStats.STATS_FIELDS
+
+    @staticmethod
+    def row_dict(row):
+        return {
+            "id":row.id,   
+            "name":row.name,
+            "description":row.description,
+            "location":row.location,
+            "rating":row.rating,
+            "price":row.price,
+            "seats_per_slot":row.seats_per_slot,
+            "latitude":row.latitude,
+            "longitude":row.longitude,
+            **ReviewStats.stats_of(row)
+        }
+
     def to_dict(self):
+        return self.row_dict(self)
+
+    def to_summary(self):
+        """Compact form embedded in other resources (e.g. bookings with include=restaurant)"""
         return {
-            "id":self.id,   
+            "id":self.id,
             "name":self.name,
-            "description":self.description,
             "location":self.location,
-            "rating":self.rating,
-            "price":self.price
+            "price":self.price,
+            "review_average":round(self.review_average or 0.0, 2)
+        }
+
+
+class restaurant_slot(db.Model):
+    """Seat capacity of a restaurant for one time slot on one day"""
+    id=db.Column(db.Integer,primary_key=True)
+    restaurant_id=db.Column(db.Integer,db.ForeignKey('restaurant.id',ondelete='CASCADE'),nullable=False)
+    slot_date=db.Column(db.Date,nullable=False)
+    slot_time=db.Column(db.String(5),nullable=False)  # "HH:MM"
+    capacity=db.Column(db.Integer,nullable=False)
+    seats_booked=db.Column(db.Integer,nullable=False,default=0)
+    __table_args__ = (
+        db.UniqueConstraint('restaurant_id', 'slot_date', 'slot_time', name='uq_restaurant_slot'),
+        db.Index('ix_restaurant_slot_date_restaurant', 'slot_date', 'restaurant_id'),
+    )
+
+    def to_dict(self):
+        return {
+            "restaurant_id":self.restaurant_id,
+            "date":self.slot_date.isoformat(),
+            "time":self.slot_time,
+            "capacity":self.capacity,
+            "seats_left":self.capacity-self.seats_booked
         }
    
    
    
 
+class booking_group(db.Model):
+    """Reservations created together and paid with one combined PaymentIntent"""
+    __tablename__ = 'booking_groups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    total_price = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3), default='USD')
+    payment_status = db.Column(db.String(20), default='pending')  # pending, creating, processing, paid, failed, refunded
+    stripe_payment_intent_id = db.Column(db.String(255), unique=True)  # Shared by every booking of the group
+    stripe_client_secret = db.Column(db.String(255))  # Never in to_dict()
+    refund_amount = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    bookings = db.relationship('booking', back_populates='group', order_by='booking.id')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'total_price': self.total_price,
+            'currency': self.currency,
+            'payment_status': self.payment_status,
+            'stripe_payment_intent_id': self.stripe_payment_intent_id,
+            'refund_amount': self.refund_amount,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
 class booking(db.Model):
     """Booking model for hotel and restaurant reservations"""
     __tablename__ = 'bookings'
@@ -105,6 +354,7 @@ class booking(db.Model):
     booking_type = db.Column(db.String(20), nullable=False)  # 'hotel' or 'restaurant'
     hotel_id = db.Column(db.Integer, db.ForeignKey('hotel.id'), nullable=True)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('restaurant.id'), nullable=True)
+    group_id = db.Column(db.Integer, db.ForeignKey('booking_groups.id'), nullable=True, index=True)  # Paid through the group's PaymentIntent
     
     # Booking Details
     check_in_date = db.Column(db.DateTime)
@@ -123,9 +373,10 @@ class booking(db.Model):
     currency = db.Column(db.String(3), default='USD')
     
     # Payment Information - Stripe
-    payment_status = db.Column(db.String(20), default='pending')  # pending, processing, paid, failed, refunded
+    payment_status = db.Column(db.String(20), default='pending')  # pending, creating, processing, paid, failed, refunded
     payment_method = db.Column(db.String(50), default='stripe')
     stripe_payment_intent_id = db.Column(db.String(255), unique=True)  # Stripe Payment Intent ID
+    stripe_client_secret = db.Column(db.String(255))  # Handed to the client once the intent exists; never in to_dict()
     stripe_charge_id = db.Column(db.String(255))  # Stripe Charge ID
     stripe_customer_id = db.Column(db.String(255))  # Stripe Customer ID
     payment_date = db.Column(db.DateTime)
@@ -143,11 +394,17 @@ class booking(db.Model):
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_bookings_user_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_bookings_created_at_id', 'created_at', 'id'),
+    )
     
     # Relationships
     user = db.relationship('User', backref='bookings')
     hotel = db.relationship('hotel', backref='bookings')
     restaurant = db.relationship('restaurant', backref='bookings')
+    group = db.relationship('booking_group', back_populates='bookings')
     
     def __init__(self, **kwargs):
         super(booking, self).__init__(**kwargs)
@@ -174,42 +431,66 @@ class booking(db.Model):
         self.total_price = self.base_price + self.tax_amount + self.service_fee
         return self.total_price
     
-    def to_dict(self):
-        """Convert booking to dictionary"""
+    DICT_COLUMNS = (
+        'id', 'user_id', 'booking_type', 'hotel_id', 'restaurant_id', 'group_id', 'check_in_date', 'check_out_date',
+        'booking_date', 'booking_time', 'number_of_guests', 'number_of_rooms', 'special_requests', 'base_price',
+        'tax_amount', 'service_fee', 'total_price', 'currency', 'payment_status', 'payment_method',
+        'stripe_payment_intent_id', 'payment_date', 'booking_status', 'confirmation_code', 'cancelled_at',
+        'cancellation_reason', 'refund_amount', 'refund_status', 'created_at', 'updated_at'
+    )
+
+    @staticmethod
+    def row_dict(row):
+        """Convert a booking, or a projected booking row, to a dictionary"""
         return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'booking_type': self.booking_type,
-            'hotel_id': self.hotel_id,
-            'restaurant_id': self.restaurant_id,
-            'check_in_date': self.check_in_date.isoformat() if self.check_in_date else None,
-            'check_out_date': self.check_out_date.isoformat() if self.check_out_date else None,
-            'booking_date': self.booking_date.isoformat() if self.booking_date else None,
-            'booking_time': self.booking_time,
-            'number_of_guests': self.number_of_guests,
-            'number_of_rooms': self.number_of_rooms,
-            'special_requests': self.special_requests,
-            'base_price': self.base_price,
-            'tax_amount': self.tax_amount,
-            'service_fee': self.service_fee,
-            'total_price': self.total_price,
-            'currency': self.currency,
-            'payment_status': self.payment_status,
-            'payment_method': self.payment_method,
-            'stripe_payment_intent_id': self.stripe_payment_intent_id,
-            'payment_date': self.payment_date.isoformat() if self.payment_date else None,
-            'booking_status': self.booking_status,
-            'confirmation_code': self.confirmation_code,
-            'cancelled_at': self.cancelled_at.isoformat() if self.cancelled_at else None,
-            'cancellation_reason': self.cancellation_reason,
-            'refund_amount': self.refund_amount,
-            'refund_status': self.refund_status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'id': row.id,
+            'user_id': row.user_id,
+            'booking_type': row.booking_type,
+            'hotel_id': row.hotel_id,
+            'restaurant_id': row.restaurant_id,
+            'group_id': row.group_id,
+            'check_in_date': row.check_in_date.isoformat() if row.check_in_date else None,
+            'check_out_date': row.check_out_date.isoformat() if row.check_out_date else None,
+            'booking_date': row.booking_date.isoformat() if row.booking_date else None,
+            'booking_time': row.booking_time,
+            'number_of_guests': row.number_of_guests,
+            'number_of_rooms': row.number_of_rooms,
+            'special_requests': row.special_requests,
+            'base_price': row.base_price,
+            'tax_amount': row.tax_amount,
+            'service_fee': row.service_fee,
+            'total_price': row.total_price,
+            'currency': row.currency,
+            'payment_status': row.payment_status,
+            'payment_method': row.payment_method,
+            'stripe_payment_intent_id': row.stripe_payment_intent_id,
+            'payment_date': row.payment_date.isoformat() if row.payment_date else None,
+            'booking_status': row.booking_status,
+            'confirmation_code': row.confirmation_code,
+            'cancelled_at': row.cancelled_at.isoformat() if row.cancelled_at else None,
+            'cancellation_reason': row.cancellation_reason,
+            'refund_amount': row.refund_amount,
+            'refund_status': row.refund_status,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'updated_at': row.updated_at.isoformat() if row.updated_at else None
         }
-    
-   
-   
+
+    def to_dict(self):
+        """Convert booking to dictionary"""
+        return self.row_dict(self)
+ 
+
+class stripe_event(db.Model):
+    """Stripe webhook events, keyed by event ID so redeliveries are ignored"""
+    id=db.Column(db.String(255),primary_key=True)  # Stripe event ID (evt_...)
+    type=db.Column(db.String(100),nullable=False)
+    payment_intent_id=db.Column(db.String(255),index=True)
+    payload=db.Column(db.Text)  # JSON of the event's data.object
+    received_at=db.Column(db.DateTime,default=datetime.utcnow)
+    processed_at=db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('ix_stripe_event_pending', 'processed_at', 'received_at'),
+    )
    
    
 class review(db.Model):
@@ -221,19 +502,31 @@ class review(db.Model):
     rating=db.Column(db.Float,nullable=False)
     comment=db.Column(db.String(200),nullable=False)
     created_at=db.Column(db.DateTime,default=datetime.utcnow)
-    updated_at=db.Column(db.DateTime,default=datetime.utcnow)
-    def to_dict(self):
+    updated_at=db.Column(db.DateTime,default=datetime.utcnow,onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_review_user_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_review_hotel_created_at_id', 'hotel_id', 'created_at', 'id'),
+        db.Index('ix_review_restaurant_created_at_id', 'restaurant_id', 'created_at', 'id'),
+        db.Index('ix_review_torist_place_created_at_id', 'torist_place_id', 'created_at', 'id'),
+    )
+    DICT_COLUMNS=('id','user_id','torist_place_id','hotel_id','restaurant_id','rating','comment','created_at','updated_at')
+
+    @staticmethod
+    def row_dict(row):
         return {
-            "id":self.id,
-            "user_id":self.user_id,
-            "torist_place_id":self.torist_place_id,
-            "hotel_id":self.hotel_id,
-            "restaurant_id":self.restaurant_id,
-            "rating":self.rating,
-            "comment":self.comment,
-            "created_at":self.created_at,
-            "updated_at":self.updated_at
+            "id":row.id,
+            "user_id":row.user_id,
+            "torist_place_id":row.torist_place_id,
+            "hotel_id":row.hotel_id,
+            "restaurant_id":row.restaurant_id,
+            "rating":row.rating,
+            "comment":row.comment,
+            "created_at":row.created_at.isoformat() if row.created_at else None,
+            "updated_at":row.updated_at.isoformat() if row.updated_at else None
         }
+
+    def to_dict(self):
+        return self.row_dict(self)
    
 class trips(db.Model):
     id=db.Column(db.Integer,primary_key=True)
@@ -245,21 +538,73 @@ class trips(db.Model):
     end_date=db.Column(db.DateTime,nullable=False)
     created_at=db.Column(db.DateTime,default=datetime.utcnow)
     updated_at=db.Column(db.DateTime,default=datetime.utcnow)
-    def to_dict(self):
+    __table_args__ = (
+        db.Index('ix_trips_user_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_trips_user_start_date_id', 'user_id', 'start_date', 'id'),
+        db.Index('ix_trips_created_at_id', 'created_at', 'id'),
+        db.Index('ix_trips_torist_place_start_date', 'torist_place_id', 'start_date'),
+        db.Index('ix_trips_hotel_start_date', 'hotel_id', 'start_date'),
+        db.Index('ix_trips_restaurant_start_date', 'restaurant_id', 'start_date'),
+    )
+    DICT_COLUMNS=('id','user_id','torist_place_id','hotel_id','restaurant_id','start_date','end_date','created_at','updated_at')
+
+    @staticmethod
+    def row_dict(row):
         return {
-            "id":self.id,
-            "user_id":self.user_id,
-            "torist_place_id":self.torist_place_id,
-            "hotel_id":self.hotel_id,
-            "restaurant_id":self.restaurant_id,
-            "start_date":self.start_date,
-            "end_date":self.end_date,
-            "created_at":self.created_at,
-            "updated_at":self.updated_at
+            "id":row.id,
+            "user_id":row.user_id,
+            "torist_place_id":row.torist_place_id,
+            "hotel_id":row.hotel_id,
+            "restaurant_id":row.restaurant_id,
+            "start_date":row.start_date.isoformat() if row.start_date else None,
+            "end_date":row.end_date.isoformat() if row.end_date else None,
+            "created_at":row.created_at.isoformat() if row.created_at else None,
+            "updated_at":row.updated_at.isoformat() if row.updated_at else None
         }
+
+    def to_dict(self):
+        return self.row_dict(self)
    
    
    
    
    
-   
\ No newline at end of file
+   
+
+
+class trip_items(db.Model):
+    """
+    One stop of a multi-day trip: a site, hotel or restaurant on a given day
+
+    Exactly one of torist_place_id / hotel_id / restaurant_id is set,
+    matching item_type. visit_date is the trip start date plus day - 1,
+    stored so "trips touching X between two dates" is an index range scan.
+    """
+    id=db.Column(db.Integer,primary_key=True)
+    trip_id=db.Column(db.Integer,db.ForeignKey('trips.id',ondelete='CASCADE'),nullable=False)
+    day=db.Column(db.Integer,nullable=False)  # 1-based
+    position=db.Column(db.Integer,nullable=False)  # order within the day, 1-based
+    item_type=db.Column(db.String(20),nullable=False)  # site, hotel, restaurant
+    torist_place_id=db.Column(db.Integer,db.ForeignKey('torist_place.id',ondelete='CASCADE'),nullable=True)
+    hotel_id=db.Column(db.Integer,db.ForeignKey('hotel.id',ondelete='CASCADE'),nullable=True)
+    restaurant_id=db.Column(db.Integer,db.ForeignKey('restaurant.id',ondelete='CASCADE'),nullable=True)
+    visit_date=db.Column(db.Date,nullable=False)
+    __table_args__ = (
+        db.UniqueConstraint('trip_id', 'day', 'position', name='uq_trip_items_trip_day_position'),
+        db.Index('ix_trip_items_torist_place_visit_date', 'torist_place_id', 'visit_date'),
+        db.Index('ix_trip_items_hotel_visit_date', 'hotel_id', 'visit_date'),
+        db.Index('ix_trip_items_restaurant_visit_date', 'restaurant_id', 'visit_date'),
+    )
+
+    def entity_id(self):
+        return {'site': self.torist_place_id, 'hotel': self.hotel_id, 'restaurant': self.restaurant_id}[self.item_type]
+
+    def to_dict(self):
+        return {
+            "id":self.id,
+            "day":self.day,
+            "position":self.position,
+            "date":self.visit_date.isoformat(),
+            "type":self.item_type,
+            "entity_id":self.entity_id()
+        }
@@ -8,9 +8,12 @@ import dotenv
 import jwt
 from routes.role_req import role_required
 from routes.rate_limit import rate_limit
-from flask import url_for, current_app
+from flask import url_for
 from utils.validation import require_json, validate_fields, ValidationError, validate_password_strength
 from flask_jwt_extended import decode_token
+from utils.pagination import keyset_paginate
+from services.token_blocklist import token_blocklist
+from services.metrics import metrics
 
 
 from routes.home import auth
@@ -87,7 +90,8 @@ def register():
         if User.query.filter_by(username=username).first() is not None:
             raise ValidationError('Username already taken', 409)
 
-        hashed_password = generate_password_hash(password=password)
+        with metrics.password_hash_duration.time('hash'):
+            hashed_password = generate_password_hash(password=password)
 
         user = User(username=username, email=email, password=hashed_password, role=role)
         db.session.add(user)
@@ -247,7 +251,7 @@ def logout():
         jti = decoded.get('jti')
         if not jti:
             return jsonify({"success": False, "error": "Invalid token"}), 400
-        current_app.config['TOKEN_BLOCKLIST'].add(jti)
+        token_blocklist.revoke(jti, decoded.get('exp'), decoded.get('type'))
         return jsonify({"message":"Logged out successfully"}),200
     except Exception as e:
         return jsonify({"success": False, "error": f"Logout failed: {str(e)}"}), 400
@@ -279,7 +283,7 @@ def verify_token():
         validate_fields(data, {'token': {'required': True, 'type': 'string'}})
         decoded = decode_token(data.get('token'))
         jti = decoded.get('jti')
-        if jti in current_app.config['TOKEN_BLOCKLIST']:
+        if token_blocklist.is_revoked(jti):
             return jsonify({"success": False, "error": "Token revoked"}), 401
         return jsonify({"success": True, "message":"Token is valid", "claims": {"sub": decoded.get('sub'), "type": decoded.get('type')}}),200
     except Exception as e:
@@ -315,12 +319,39 @@ def get_all_users():
       - Auth
     security:
       - Bearer: []
+    parameters:
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: id (default)
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
     responses:
       200:
         description: List of users
     """
-    users=User.query.all()
-    return jsonify({"users": [user.to_dict() for user in users]}),200
+    try:
+        users, pagination = keyset_paginate(User.query, User, request.args, sort_fields=('id',), default_order='asc')
+        return jsonify({"users": [user.to_dict() for user in users], "pagination": pagination}),200
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
 
 @auth_routes.route('/get_user_by_id',methods=['GET'])
 @jwt_required()
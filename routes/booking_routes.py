@@ -4,16 +4,36 @@ from models import booking,db
 from flask_jwt_extended import jwt_required,get_jwt_identity
 from routes.rate_limit import rate_limit
 from routes.role_req import role_required
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, url_for, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, booking, hotel, restaurant, User
+from models import db, booking, booking_group, hotel, restaurant, User
 from services.stripe_service import StripeService
+from services.inventory_service import InventoryService, MAX_STAY_NIGHTS
+from services.payment_queue import payment_queue, payment_metadata, group_payment_metadata, WAITING_STATUSES
+from services.group_booking import GroupBookingService, ReservationConflict
+from services.stripe_webhooks import StripeWebhookProcessor
+from services.booking_export import BookingExportService
+from services.query_guard import sql_budget
+from routes.rate_limit import L
+from utils.pagination import keyset_paginate
+from utils.projection import project, project_dicts, parse_fields, pick
+from utils.validation import ValidationError, parse_slot_time, parse_include
+from sqlalchemy.orm import selectinload
 from datetime import datetime
 import os
 
 booking_routes = Blueprint('booking', __name__)
 
 
+def _pending_payment(bookings):
+    return {
+        'status': 'pending',
+        'poll_url': url_for('booking.get_booking_payment', booking_id=bookings.id),
+        'amount': bookings.total_price,
+        'currency': bookings.currency
+    }
+
+
 @booking_routes.route('/hotel', methods=['POST'])
 @jwt_required()
 def create_hotel_booking():
@@ -44,8 +64,12 @@ def create_hotel_booking():
     responses:
       201:
         description: Booking created
+      202:
+        description: Booking created, PaymentIntent is being created (async payment mode)
       400:
         description: Bad request
+      409:
+        description: No rooms available for the selected dates
     """
     try:
         user_id = get_jwt_identity()
@@ -71,6 +95,15 @@ def create_hotel_booking():
             return jsonify({'success': False, 'message': 'Check-out date must be after check-in date'}), 400
         if check_in_date < datetime.now():
             return jsonify({'success': False, 'message': 'Check-in date must be in the future'}), 400
+        if (check_out_date - check_in_date).days > MAX_STAY_NIGHTS:
+            return jsonify({'success': False, 'message': f'A stay can last at most {MAX_STAY_NIGHTS} nights'}), 400
+        if not isinstance(data['number_of_rooms'], int) or data['number_of_rooms'] < 1:
+            return jsonify({'success': False, 'message': 'number_of_rooms must be a positive integer'}), 400
+
+        # Hold the rooms in the same transaction as the booking row
+        if not InventoryService.reserve_rooms(hotels, check_in_date, check_out_date, data['number_of_rooms']):
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'Not enough rooms available for the selected dates'}), 409
 
         # Calculate nights and base price
         nights = (check_out_date - check_in_date).days
@@ -99,27 +132,34 @@ def create_hotel_booking():
         db.session.add(bookings)
         db.session.commit()
 
+        if payment_queue.is_async:
+            payment_queue.enqueue(bookings.id)
+            return jsonify({
+                'success': True,
+                'message': 'Booking created successfully',
+                'booking': bookings.to_dict(),
+                'hotel': hotels.to_dict(),
+                'payment': _pending_payment(bookings),
+                'stripe_public_key': os.getenv('STRIPE_PUBLIC_KEY')
+            }), 202
      
         payment_result = StripeService.create_payment_intent(
             amount=bookings.total_price,  
             currency=bookings.currency.lower(),
-            metadata={
-                'booking_id': bookings.id,
-                'booking_type': 'hotel',
-                'hotel_id': hotels.id,
-                'user_id': user_id,
-                'confirmation_code': bookings.confirmation_code
-            }
+            metadata=payment_metadata(bookings),
+            idempotency_key=f"booking-{bookings.id}"
         )
 
         if not payment_result['success']:
            
             db.session.delete(bookings)
+            InventoryService.release_rooms(hotels.id, check_in_date, check_out_date, bookings.number_of_rooms)
             db.session.commit()
             return jsonify({'success': False, 'message': 'Failed to create payment', 'error': payment_result.get('message')}), 500
 
         
         bookings.stripe_payment_intent_id = payment_result['payment_intent_id']
+        bookings.stripe_client_secret = payment_result['client_secret']
         bookings.payment_status = 'processing'
         db.session.commit()
 
@@ -171,8 +211,12 @@ def create_restaurant_booking():
     responses:
       201:
         description: Booking created
+      202:
+        description: Booking created, PaymentIntent is being created (async payment mode)
       400:
-        description: Bad request
+        description: Bad request, or the restaurant tracks seats and this time slot was not opened
+      409:
+        description: Time slot is full
     """
     try:
         user_id = get_jwt_identity()
@@ -205,6 +249,31 @@ def create_restaurant_booking():
                 'message': 'Booking date must be in the future'
             }), 400
         
+        if restaurants.seats_per_slot is not None:
+            # Capacity is tracked per slot, so the slot key must be canonical
+            try:
+                data['booking_time'] = parse_slot_time(data['booking_time'], 'booking_time')
+            except ValidationError as e:
+                return jsonify({'success': False, 'message': e.message}), e.status_code
+        if not isinstance(data['number_of_guests'], int) or data['number_of_guests'] < 1:
+            return jsonify({
+                'success': False,
+                'message': 'number_of_guests must be a positive integer'
+            }), 400
+
+        # Take the seats in the same transaction as the booking row
+        if not InventoryService.reserve_seats(restaurants, booking_date, data['booking_time'], data['number_of_guests']):
+            db.session.rollback()
+            if not InventoryService.slot_is_open(restaurants.id, booking_date, data['booking_time']):
+                return jsonify({
+                    'success': False,
+                    'message': 'This time slot is not open for booking'
+                }), 400
+            return jsonify({
+                'success': False,
+                'message': 'No seats left in this time slot'
+            }), 409
+        
         # Calculate base price
         base_price = 10.0 * float(data['number_of_guests'])
         
@@ -229,22 +298,30 @@ def create_restaurant_booking():
         # Save booking
         db.session.add(bookings)
         db.session.commit()
+
+        # Async mode: Stripe is called by the payment queue, the client polls for the client_secret
+        if payment_queue.is_async:
+            payment_queue.enqueue(bookings.id)
+            return jsonify({
+                'success': True,
+                'message': 'Restaurant booking created successfully',
+                'booking': bookings.to_dict(),
+                'restaurant': restaurants.to_dict(),
+                'payment': _pending_payment(bookings),
+                'stripe_public_key': os.getenv('STRIPE_PUBLIC_KEY')
+            }), 202
         
         # Create Stripe Payment Intent
         payment_result = StripeService.create_payment_intent(
             amount=bookings.total_price,
             currency=bookings.currency.lower(),
-            metadata={
-                'booking_id': bookings.id,
-                'booking_type': 'restaurant',
-                'restaurant_id': restaurants.id,
-                'user_id': user_id,
-                'confirmation_code': bookings.confirmation_code
-            }
+            metadata=payment_metadata(bookings),
+            idempotency_key=f"booking-{bookings.id}"
         )
         
         if not payment_result['success']:
             db.session.delete(bookings)
+            InventoryService.release_seats(restaurants.id, booking_date, bookings.booking_time, bookings.number_of_guests)
             db.session.commit()
             
             return jsonify({
@@ -255,6 +332,7 @@ def create_restaurant_booking():
         
         # Update booking with payment intent
         bookings.stripe_payment_intent_id = payment_result['payment_intent_id']
+        bookings.stripe_client_secret = payment_result['client_secret']
         bookings.payment_status = 'processing'
         db.session.commit()
         
@@ -281,6 +359,249 @@ def create_restaurant_booking():
 
 
 
+def _group_payment(group):
+    """Payment block of a booking group: the client_secret once the combined intent exists"""
+    if not group.stripe_payment_intent_id and group.payment_status in WAITING_STATUSES:
+        return {
+            'status': 'pending',
+            'poll_url': url_for('booking.get_group_payment', group_id=group.id),
+            'amount': group.total_price,
+            'currency': group.currency
+        }
+    return {
+        'status': group.payment_status,
+        'client_secret': group.stripe_client_secret,
+        'payment_intent_id': group.stripe_payment_intent_id,
+        'amount': group.total_price,
+        'currency': group.currency
+    }
+
+
+def _group_response(group):
+    return {
+        'group': group.to_dict(),
+        'bookings': [b.to_dict() for b in group.bookings],
+        'payment': _group_payment(group),
+        'stripe_public_key': os.getenv('STRIPE_PUBLIC_KEY')
+    }
+
+
+@booking_routes.route('/group', methods=['POST'])
+@jwt_required()
+def create_group_booking():
+    """
+    Create a group of hotel and restaurant bookings paid with one PaymentIntent
+    ---
+    tags:
+      - Bookings
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            reservations:
+              type: array
+              description: up to 100 items; {"type":"hotel"} items take the fields of POST /booking/hotel, {"type":"restaurant"} items those of POST /booking/restaurant
+              items:
+                type: object
+    responses:
+      201:
+        description: All bookings created, combined PaymentIntent returned
+      202:
+        description: All bookings created, PaymentIntent is being created (async payment mode)
+      400:
+        description: Bad request
+      404:
+        description: Hotel or restaurant not found
+      409:
+        description: Some reservations are not available (full, or a restaurant time slot that was not opened); nothing was booked
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+
+        # Every booking, room and seat is written in one transaction, or none is
+        group = GroupBookingService.create(user_id, data.get('reservations'))
+        db.session.commit()
+
+        if payment_queue.is_async:
+            payment_queue.enqueue_group(group.id)
+            return jsonify({'success': True, 'message': 'Group booking created successfully', **_group_response(group)}), 202
+
+        payment_result = StripeService.create_payment_intent(
+            amount=group.total_price,
+            currency=group.currency.lower(),
+            metadata=group_payment_metadata(group),
+            idempotency_key=f"booking-group-{group.id}"
+        )
+        if not payment_result['success']:
+            GroupBookingService.discard(group)
+            db.session.commit()
+            return jsonify({'success': False, 'message': 'Failed to create payment', 'error': payment_result.get('message')}), 500
+
+        GroupBookingService.record_intent(group, payment_result)
+        db.session.commit()
+        return jsonify({'success': True, 'message': 'Group booking created successfully', **_group_response(group)}), 201
+
+    except ReservationConflict as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': e.message, 'unavailable': e.indexes}), e.status_code
+    except ValidationError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': e.message}), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Failed to create booking: {str(e)}'}), 500
+
+
+def _owned_group(group_id):
+    group = booking_group.query.get(group_id)
+    if not group:
+        raise ValidationError('Booking group not found', 404)
+    if group.user_id != int(get_jwt_identity()):
+        raise ValidationError('Unauthorized', 403)
+    return group
+
+
+@booking_routes.route('/group/<int:group_id>/payment', methods=['GET'])
+@jwt_required()
+def get_group_payment(group_id):
+    """
+    Poll for a booking group's combined PaymentIntent client_secret
+    ---
+    tags:
+      - Bookings
+    security:
+      - Bearer: []
+    parameters:
+      - name: group_id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: PaymentIntent ready (or payment failed)
+      202:
+        description: PaymentIntent still being created, poll again
+      404:
+        description: Booking group not found
+    """
+    try:
+        group = _owned_group(group_id)
+    except ValidationError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status_code
+
+    if not group.stripe_payment_intent_id and group.payment_status in WAITING_STATUSES:
+        payment_queue.requeue_group_if_stale(group)
+        return jsonify({'success': True, 'payment': _group_payment(group)}), 202
+    return jsonify({'success': group.payment_status != 'failed', **_group_response(group)}), 200
+
+
+@booking_routes.route('/group/<int:group_id>/confirm-payment', methods=['POST'])
+@jwt_required()
+def confirm_group_payment(group_id):
+    """
+    Confirm payment of a booking group
+    ---
+    tags:
+      - Bookings
+    security:
+      - Bearer: []
+    parameters:
+      - name: group_id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: Payment confirmed for every booking of the group
+      400:
+        description: Payment not completed
+      404:
+        description: Booking group not found
+    """
+    try:
+        group = _owned_group(group_id)
+        if group.payment_status == 'paid':
+            return jsonify({'success': True, 'message': 'Payment confirmed successfully', **_group_response(group)}), 200
+
+        # With webhooks configured Stripe pushes the result to us, so never poll it here
+        if current_app.config.get('STRIPE_WEBHOOK_SECRET') or not group.stripe_payment_intent_id:
+            return jsonify({'success': False, 'message': f'Payment not completed. Status: {group.payment_status}'}), 400
+
+        payment_result = StripeService.retrieve_payment_intent(group.stripe_payment_intent_id)
+        if not payment_result['success']:
+            return jsonify({'success': False, 'message': 'Failed to verify payment'}), 500
+        if payment_result['status'] != 'succeeded':
+            return jsonify({'success': False, 'message': f'Payment not completed. Status: {payment_result["status"]}'}), 400
+
+        GroupBookingService.mark_paid(group)
+        db.session.commit()
+        return jsonify({'success': True, 'message': 'Payment confirmed successfully', **_group_response(group)}), 200
+
+    except ValidationError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Failed to confirm payment: {str(e)}'}), 500
+
+
+@booking_routes.route('/<int:booking_id>/payment', methods=['GET'])
+@jwt_required()
+def get_booking_payment(booking_id):
+    """
+    Poll for a booking's PaymentIntent client_secret
+    ---
+    tags:
+      - Bookings
+    security:
+      - Bearer: []
+    parameters:
+      - name: booking_id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: PaymentIntent ready (or payment failed)
+      202:
+        description: PaymentIntent still being created, poll again
+      404:
+        description: Booking not found
+    """
+    user_id = get_jwt_identity()
+    bookings = booking.query.get(booking_id)
+    if not bookings:
+        return jsonify({'success': False, 'message': 'Booking not found'}), 404
+    if bookings.user_id != int(user_id):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    # Grouped bookings are paid through the group's combined PaymentIntent
+    if bookings.group_id:
+        return get_group_payment(bookings.group_id)
+
+    if not bookings.stripe_payment_intent_id and bookings.payment_status in WAITING_STATUSES:
+        payment_queue.requeue_if_stale(bookings)
+        return jsonify({'success': True, 'payment': _pending_payment(bookings)}), 202
+
+    return jsonify({
+        'success': bookings.payment_status != 'failed',
+        'booking': bookings.to_dict(),
+        'payment': {
+            'status': bookings.payment_status,
+            'client_secret': bookings.stripe_client_secret,
+            'payment_intent_id': bookings.stripe_payment_intent_id,
+            'amount': bookings.total_price,
+            'currency': bookings.currency
+        },
+        'stripe_public_key': os.getenv('STRIPE_PUBLIC_KEY')
+    }), 200
+
+
 @booking_routes.route('/<int:booking_id>/confirm-payment', methods=['POST'])
 @jwt_required()
 def confirm_payment(booking_id):
@@ -320,6 +641,23 @@ def confirm_payment(booking_id):
                 'message': 'Unauthorized'
             }), 403
         
+        if bookings.payment_status == 'paid':
+            return jsonify({
+                'success': True,
+                'message': 'Payment confirmed successfully',
+                'booking': bookings.to_dict()
+            }), 200
+
+        if bookings.group_id:
+            return confirm_group_payment(bookings.group_id)
+
+        # With webhooks configured Stripe pushes the result to us, so never poll it here
+        if current_app.config.get('STRIPE_WEBHOOK_SECRET'):
+            return jsonify({
+                'success': False,
+                'message': f'Payment not completed. Status: {bookings.payment_status}'
+            }), 400
+
         # Verify payment with Stripe
         payment_result = StripeService.retrieve_payment_intent(bookings.stripe_payment_intent_id)
         
@@ -354,7 +692,60 @@ def confirm_payment(booking_id):
         }), 500
 
 
+@booking_routes.route('/webhook/stripe', methods=['POST'])
+@L.exempt
+def stripe_webhook():
+    """
+    Stripe webhook receiver
+    ---
+    tags:
+      - Bookings
+    security: []
+    parameters:
+      - name: Stripe-Signature
+        in: header
+        type: string
+        required: true
+    responses:
+      200:
+        description: Event accepted
+      400:
+        description: Invalid payload or signature
+    """
+    secret = current_app.config.get('STRIPE_WEBHOOK_SECRET')
+    if not secret:
+        return jsonify({'success': False, 'message': 'Webhooks are not configured'}), 400
+
+    event = StripeService.verify_webhook_signature(
+        request.get_data(), request.headers.get('Stripe-Signature'), secret
+    )
+    if event is None:
+        return jsonify({'success': False, 'message': 'Invalid signature'}), 400
+
+    try:
+        recorded = StripeWebhookProcessor.record_event(event)
+        db.session.commit()
+        # Each delivery drains a batch of pending events, including ones left by failed deliveries
+        processed = StripeWebhookProcessor.process_pending() if recorded else 0
+        return jsonify({'success': True, 'received': event['id'], 'processed': processed}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Failed to process event: {str(e)}'}), 500
+
+
+BOOKING_INCLUDES = ('hotel', 'restaurant')
+
+
+def _booking_with_includes(booking_obj, include):
+    data = booking_obj.to_dict()
+    for name in include:
+        related = getattr(booking_obj, name)
+        data[name] = related.to_summary() if related else None
+    return data
+
+
 @booking_routes.route('/my', methods=['GET'])
+@sql_budget(10)
 @jwt_required()
 def get_my_bookings():
     """
@@ -365,45 +756,161 @@ def get_my_bookings():
     security:
       - Bearer: []
     parameters:
-      - name: page
+      - name: cursor
         in: query
-        type: integer
-        
+        type: string
         required: false
+        description: next_cursor from the previous page
       - name: per_page
         in: query
         type: integer
         required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default)
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
       - name: booking_type
         in: query
         type: string
         required: false
         description: filter by 'hotel' or 'restaurant'
+      - name: include
+        in: query
+        type: string
+        required: false
+        description: comma-separated related entities to embed (hotel, restaurant)
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated booking fields to return (default all), e.g. id,booking_status,total_price
     responses:
       200:
         description: List of user's bookings
     """
     try:
         user_id = get_jwt_identity()
-        page = int(request.args.get('page', 1))
-        per_page = min(int(request.args.get('per_page', 10)), 100)
         btype = request.args.get('booking_type')
+        include = parse_include(request.args.get('include'), BOOKING_INCLUDES)
+        fields = parse_fields(request.args, booking)
 
         query = booking.query.filter_by(user_id=int(user_id))
         if btype in ('hotel', 'restaurant'):
             query = query.filter_by(booking_type=btype)
+        if not include:
+            # Plain listing: serialize straight from the selected columns
+            items, pagination = keyset_paginate(project(query, booking, 'created_at', fields=fields), booking, request.args)
+            return jsonify({'success': True, 'bookings': project_dicts(booking, items, fields), 'pagination': pagination}), 200
+
+        # One IN query per included relationship for the whole page, instead of one per booking
+        for name in include:
+            query = query.options(selectinload(getattr(booking, name)))
 
-        pagination = query.order_by(booking.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
-        items = [b.to_dict() for b in pagination.items]
+        items, pagination = keyset_paginate(query, booking, request.args)
         return jsonify({
             'success': True,
-            'bookings': items,
-            'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'bookings': pick([_booking_with_includes(b, include) for b in items], fields, keep=include),
+            'pagination': pagination
         }), 200
+    except ValidationError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status_code
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@booking_routes.route('/export', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def export_bookings():
+    """
+    Stream bookings as NDJSON or CSV (admins only)
+    ---
+    tags:
+      - Bookings
+    security:
+      - Bearer: []
+    parameters:
+      - name: format
+        in: query
+        type: string
+        required: false
+        description: ndjson (default) or csv
+      - name: start_date
+        in: query
+        type: string
+        required: false
+        description: YYYY-MM-DD, inclusive
+      - name: end_date
+        in: query
+        type: string
+        required: false
+        description: YYYY-MM-DD, inclusive
+      - name: date_field
+        in: query
+        type: string
+        required: false
+        description: date the range applies to, created_at (default), payment_date, check_in_date or booking_date
+      - name: booking_status
+        in: query
+        type: string
+        required: false
+        description: comma-separated subset of pending, confirmed, cancelled, completed
+      - name: payment_status
+        in: query
+        type: string
+        required: false
+        description: comma-separated subset of pending, processing, paid, failed, refunded
+      - name: booking_type
+        in: query
+        type: string
+        required: false
+        description: hotel or restaurant
+      - name: hotel_id
+        in: query
+        type: integer
+        required: false
+      - name: restaurant_id
+        in: query
+        type: integer
+        required: false
+      - name: after_id
+        in: query
+        type: integer
+        required: false
+        description: resume an interrupted export after the last id received
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated booking fields to export (default all)
+    produces:
+      - application/x-ndjson
+      - text/csv
+    responses:
+      200:
+        description: Matching bookings in id order, streamed as they are read
+      400:
+        description: Invalid filter
+      403:
+        description: Not an admin
+    """
+    try:
+        chunks, mimetype = BookingExportService.export(request.args, current_app.json.dumps)
+    except ValidationError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status_code
+
+    extension = 'csv' if mimetype == 'text/csv' else 'ndjson'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="bookings-{datetime.utcnow():%Y%m%d%H%M%S}.{extension}"'
+    response.cache_control.no_store = True
+    return response
@@ -1,6 +1,12 @@
-from flask import Blueprint,request,jsonify
+import hmac
+from flask import Blueprint,request,jsonify,current_app,Response
+from flask_jwt_extended import jwt_required
 # extensions.py
 from authlib.integrations.flask_client import OAuth
+from routes.role_req import role_required
+from services.cache import catalog_cache
+from services.metrics import metrics
+from routes.rate_limit import L
 
 auth = OAuth()
 homes=Blueprint('home',__name__)
@@ -8,3 +14,46 @@ homes=Blueprint('home',__name__)
 @homes.route('/',methods=['GET'])
 def home():
     return jsonify({"message":"Welcome to the Home API"}),200
+
+@homes.route('/cache/stats',methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def cache_stats():
+    """
+    Catalog cache hit/miss counters (Admin only)
+    ---
+    tags:
+      - Monitoring
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Cache counters
+    """
+    return jsonify({"cache": catalog_cache.stats()}),200
+
+
+@homes.route('/metrics',methods=['GET'])
+@L.exempt
+def prometheus_metrics():
+    """
+    Prometheus metrics (text exposition format)
+    ---
+    tags:
+      - Monitoring
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Request latency, SQL, Stripe, password hashing and cache metrics of this worker
+      401:
+        description: METRICS_TOKEN is set and the bearer token does not match
+      404:
+        description: Metrics are disabled
+    """
+    if not metrics.enabled:
+        return jsonify({"success": False, "error": "Not found"}),404
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return jsonify({"success": False, "error": "Unauthorized"}),401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -4,7 +4,14 @@ from flask_jwt_extended import jwt_required,get_jwt_identity
 from datetime import datetime
 from routes.rate_limit import rate_limit
 from routes.role_req import role_required
-from utils.validation import require_json, validate_fields
+from utils.validation import require_json, validate_fields, validate_coordinates, ValidationError, parse_date
+from utils.catalog_search import search_catalog, search_validators, SORT_FIELDS
+from utils.pagination import keyset_paginate
+from utils.projection import project, project_dicts, parse_fields, pick
+from utils.conditional import query_validators, conditional
+from services.cache import catalog_cache
+from services.fuzzy_search import fuzzy_search, wants_fuzzy
+from services.inventory_service import InventoryService
 hotel_routes=Blueprint('hotel',__name__)
 
 @hotel_routes.route('/',methods=['GET'])
@@ -40,6 +47,12 @@ def create_hotel():
               type: number
             price:
               type: number
+            latitude:
+              type: number
+            longitude:
+              type: number
+            total_rooms:
+              type: integer
     responses:
       201:
         description: Hotel created
@@ -51,15 +64,20 @@ def create_hotel():
             'description': {'required': True, 'type': 'string', 'min_length': 5, 'max_length': 200},
             'location': {'required': True, 'type': 'string', 'min_length': 2, 'max_length': 100},
             'rating': {'required': True, 'type': 'number', 'min': 0, 'max': 5},
-            'price': {'required': True, 'type': 'number', 'min': 0}
+            'price': {'required': True, 'type': 'number', 'min': 0},
+            'total_rooms': {'required': False, 'type': 'integer', 'min': 0}
         })
+        latitude, longitude = validate_coordinates(data)
 
         new_hotel=hotel(
             name=data.get('name').strip(),
             description=data.get('description').strip(),
             location=data.get('location').strip(),
             rating=data.get('rating'),
-            price=data.get('price')
+            price=data.get('price'),
+            total_rooms=data.get('total_rooms'),
+            latitude=latitude,
+            longitude=longitude
         )
         db.session.add(new_hotel)
         db.session.commit()
@@ -83,15 +101,40 @@ def get_hotel_by_id():
         in: query
         type: integer
         required: true
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all)
     responses:
       200:
         description: Hotel data
+      304:
+        description: Not modified since the ETag sent in If-None-Match
     """
-    hotel_id=request.args.get('hotel_id')
+    try:
+        fields = parse_fields(request.args, hotel)
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+    hotel_id=request.args.get('hotel_id', type=int)
+
+    def render():
+        hotel_data=catalog_cache.entity(hotel, hotel_id, lambda: _hotel_dict(hotel_id))
+        if not hotel_data:
+            return jsonify({"error":"Hotel not found"}),404
+        return jsonify({"hotel":pick(hotel_data, fields)}),200
+
+    validators=catalog_cache.query(hotel, 'validators', {'id': hotel_id}, lambda: query_validators(hotel.query.filter_by(id=hotel_id), hotel))
+    return conditional(validators, render)
+
+def _hotel_dict(hotel_id):
     hotel_obj=hotel.query.filter_by(id=hotel_id).first()
-    if not hotel_obj:
-        return jsonify({"error":"Hotel not found"}),404
-    return jsonify({"hotel":hotel_obj.to_dict()}),200
+    return hotel_obj.to_dict() if hotel_obj else None
+
+def _list_hotels(args):
+    fields = parse_fields(args, hotel)
+    items, pagination = keyset_paginate(project(hotel.query, hotel, *SORT_FIELDS, fields=fields), hotel, args, sort_fields=SORT_FIELDS)
+    return project_dicts(hotel, items, fields), pagination
 
 @hotel_routes.route('/get_all_hotels',methods=['GET'])
 def get_all_hotels():
@@ -100,27 +143,216 @@ def get_all_hotels():
     ---
     tags:
       - Hotels
+    parameters:
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default), price, rating (owner-set) or review_average (live average of reviews)
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,name,price,rating
     responses:
       200:
         description: List of hotels
+      304:
+        description: Not modified since the ETag sent in If-None-Match
     """
     try:
-        page = int(request.args.get('page', 1))
-        per_page = min(int(request.args.get('per_page', 10)), 100)
-        pagination = hotel.query.paginate(page=page, per_page=per_page, error_out=False)
-        items = [h.to_dict() for h in pagination.items]
-        return jsonify({
-            "hotels": items,
-            "pagination": {
-                "page": pagination.page,
-                "per_page": pagination.per_page,
-                "total": pagination.total,
-                "pages": pagination.pages
-            }
-        }),200
+        def render():
+            items, pagination = catalog_cache.query(hotel, 'all', request.args, lambda: _list_hotels(request.args))
+            return jsonify({
+                "hotels": items,
+                "pagination": pagination
+            }),200
+
+        validators = catalog_cache.query(hotel, 'validators', {}, lambda: query_validators(hotel.query, hotel))
+        return conditional(validators, render)
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
+@hotel_routes.route('/search',methods=['GET'])
+def search_hotels():
+    """
+    Search hotels by any combination of filters
+    ---
+    tags:
+      - Hotels
+    parameters:
+      - name: location
+        in: query
+        type: string
+        required: false
+      - name: name
+        in: query
+        type: string
+        required: false
+        description: name prefix (case-insensitive)
+      - name: min_price
+        in: query
+        type: number
+        required: false
+      - name: max_price
+        in: query
+        type: number
+        required: false
+      - name: min_rating
+        in: query
+        type: number
+        required: false
+      - name: max_rating
+        in: query
+        type: number
+        required: false
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default), price, rating (owner-set) or review_average (live average of reviews)
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,name,price,rating
+    responses:
+      200:
+        description: Paginated list of hotels
+      304:
+        description: Not modified since the ETag sent in If-None-Match
+      400:
+        description: Invalid filter
+    """
+    try:
+        def render():
+            items, pagination = catalog_cache.query(hotel, 'search', request.args, lambda: search_catalog(hotel, request.args))
+            return jsonify({"hotels": items, "pagination": pagination}),200
+
+        validators = catalog_cache.query(hotel, 'search:validators', request.args, lambda: search_validators(hotel, request.args))
+        return conditional(validators, render)
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+
+@hotel_routes.route('/availability',methods=['GET'])
+def get_available_hotels():
+    """
+    Hotels with enough free rooms for every night of a stay
+    ---
+    tags:
+      - Hotels
+    parameters:
+      - name: check_in
+        in: query
+        type: string
+        required: true
+        description: YYYY-MM-DD
+      - name: check_out
+        in: query
+        type: string
+        required: true
+        description: YYYY-MM-DD
+      - name: rooms
+        in: query
+        type: integer
+        required: false
+        description: rooms needed (default 1)
+      - name: location
+        in: query
+        type: string
+        required: false
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: price (default), rating, review_average or created_at
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,name,price,rating
+    responses:
+      200:
+        description: Available hotels
+      400:
+        description: Invalid dates
+    """
+    try:
+        check_in = parse_date(request.args.get('check_in', ''), 'check_in')
+        check_out = parse_date(request.args.get('check_out', ''), 'check_out')
+        if check_in >= check_out:
+            raise ValidationError('check_out must be after check_in', 400)
+        try:
+            rooms = int(request.args.get('rooms', 1))
+        except ValueError:
+            raise ValidationError('rooms must be an integer', 400)
+        if rooms < 1:
+            raise ValidationError('rooms must be >= 1', 400)
+
+        query = InventoryService.available_hotels_query(check_in, check_out, rooms, request.args.get('location'))
+        sort_fields = ('price', 'rating', 'review_average', 'created_at')
+        fields = parse_fields(request.args, hotel)
+        items, pagination = keyset_paginate(project(query, hotel, *sort_fields, fields=fields), hotel, request.args, sort_fields=sort_fields, default_order='asc')
+        return jsonify({"hotels": project_dicts(hotel, items, fields), "pagination": pagination}),200
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+
 @hotel_routes.route('/get_hotels_by_name',methods=['GET'])
 def get_hotels_by_name():
     """
@@ -128,16 +360,32 @@ def get_hotels_by_name():
     ---
     tags:
       - Hotels
+    deprecated: true
     parameters:
       - name: name
         in: query
         type: string
         required: true
+      - name: fuzzy
+        in: query
+        type: boolean
+        required: false
+        description: typo-tolerant match ranked by trigram similarity (e.g. "Ramalla" finds "Ramallah")
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: maximum fuzzy matches (default 20, max 50)
     responses:
       200:
         description: List of hotels
     """
     name=request.args.get('name')
+    if wants_fuzzy(request.args):
+        try:
+            return jsonify({"hotels": fuzzy_search.lookup(hotel, 'name', request.args)}),200
+        except ValidationError as e:
+            return jsonify({"success": False, "error": e.message}), e.status_code
     hotels=hotel.query.filter_by(name=name).all()
     return jsonify({"hotels": [hotel.to_dict() for hotel in hotels]}),200
 
@@ -148,11 +396,22 @@ def get_hotels_by_location():
     ---
     tags:
       - Hotels
+    deprecated: true
     parameters:
       - name: location
         in: query
         type: string
         required: true
+      - name: fuzzy
+        in: query
+        type: boolean
+        required: false
+        description: typo-tolerant match ranked by trigram similarity (e.g. "Ramalla" finds "Ramallah")
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: maximum fuzzy matches (default 20, max 50)
     responses:
       200:
         description: List of hotels
@@ -162,6 +421,7 @@ def get_hotels_by_location():
     ---
     tags:
       - Hotels
+    deprecated: true
     parameters:
       - name: location
         in: query
@@ -172,6 +432,11 @@ def get_hotels_by_location():
         description: List of hotels
     """
     location=request.args.get('location')
+    if wants_fuzzy(request.args):
+        try:
+            return jsonify({"hotels": fuzzy_search.lookup(hotel, 'location', request.args)}),200
+        except ValidationError as e:
+            return jsonify({"success": False, "error": e.message}), e.status_code
     hotels=hotel.query.filter_by(location=location).all()
     return jsonify({"hotels": [hotel.to_dict() for hotel in hotels]}),200
 
@@ -182,6 +447,7 @@ def get_hotels_by_rating():
     ---
     tags:
       - Hotels
+    deprecated: true
     parameters:
       - name: rating
         in: query
@@ -202,6 +468,7 @@ def get_hotels_by_price():
     ---
     tags:
       - Hotels
+    deprecated: true
     parameters:
       - name: price
         in: query
@@ -222,6 +489,7 @@ def get_hotels_by_price_range():
     ---
     tags:
       - Hotels
+    deprecated: true
     parameters:
       - name: price_range
         in: query
@@ -328,6 +596,7 @@ def get_hotels_by_rating_range():
     ---
     tags:
       - Hotels
+    deprecated: true
     parameters:
       - name: rating_range
         in: query
@@ -382,11 +651,19 @@ def update_hotel(hotel_id):
               type: number
             price:
               type: number
+            latitude:
+              type: number
+            longitude:
+              type: number
+            total_rooms:
+              type: integer
     responses:
       200:
         description: Hotel updated
       404:
         description: Hotel not found
+      409:
+        description: total_rooms is below the rooms already booked on a future night
     """
     try:
         hotel_obj = hotel.query.get(hotel_id)
@@ -405,11 +682,22 @@ def update_hotel(hotel_id):
             hotel_obj.rating = data.get('rating')
         if data.get('price') is not None:
             hotel_obj.price = data.get('price')
+        if data.get('latitude') is not None or data.get('longitude') is not None:
+            hotel_obj.latitude, hotel_obj.longitude = validate_coordinates(data)
+        if data.get('total_rooms') is not None:
+            validate_fields(data, {'total_rooms': {'required': False, 'type': 'integer', 'min': 0}})
+            booked = InventoryService.max_rooms_booked(hotel_obj.id, datetime.utcnow().date())
+            if data.get('total_rooms') < booked:
+                raise ValidationError(f"total_rooms cannot be below the {booked} rooms already booked on a future night", 409)
+            hotel_obj.total_rooms = data.get('total_rooms')
         
         hotel_obj.updated_at = datetime.utcnow()
         db.session.commit()
         
         return jsonify({"message": "Hotel updated successfully", "hotel": hotel_obj.to_dict()}), 200
+    except ValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -1,12 +1,21 @@
 from flask import Flask,request,jsonify,Blueprint
-from models import restaurant,db
+from models import restaurant,restaurant_slot,db
 from flask_jwt_extended import jwt_required,get_jwt_identity
 from datetime import datetime
 from routes.role_req import role_required
 from routes.rate_limit import rate_limit
-from utils.validation import require_json, validate_fields
+from utils.validation import require_json, validate_fields, validate_coordinates, ValidationError, parse_date, parse_slot_time
+from utils.catalog_search import search_catalog, search_validators, SORT_FIELDS
+from utils.pagination import keyset_paginate
+from utils.projection import project, project_dicts, parse_fields, pick
+from utils.conditional import query_validators, conditional
+from services.cache import catalog_cache
+from services.fuzzy_search import fuzzy_search, wants_fuzzy
+from services.inventory_service import InventoryService
 resturent_routes=Blueprint('resturent',__name__)
 
+MAX_AVAILABILITY_DAYS = 31
+
 @resturent_routes.route('/',methods=['GET'])
 def home():
     return jsonify({"message":"Welcome to the resturent API"}),200
@@ -40,6 +49,13 @@ def create_resturent():
               type: number
             price:
               type: number
+            latitude:
+              type: number
+            longitude:
+              type: number
+            seats_per_slot:
+              type: integer
+              description: turns on seat tracking; bookings need slots opened with POST /resturent/<restaurant_id>/slots
     responses:
       201:
         description: Restaurant created
@@ -51,15 +67,20 @@ def create_resturent():
             'description': {'required': True, 'type': 'string', 'min_length': 5, 'max_length': 200},
             'location': {'required': True, 'type': 'string', 'min_length': 2, 'max_length': 100},
             'rating': {'required': True, 'type': 'number', 'min': 0, 'max': 5},
-            'price': {'required': True, 'type': 'number', 'min': 0}
+            'price': {'required': True, 'type': 'number', 'min': 0},
+            'seats_per_slot': {'required': False, 'type': 'integer', 'min': 1}
         })
+        latitude, longitude = validate_coordinates(data)
 
         resturent=restaurant(
             name=data.get('name').strip(),
             description=data.get('description').strip(),
             location=data.get('location').strip(),
             rating=data.get('rating'),
-            price=data.get('price')
+            price=data.get('price'),
+            seats_per_slot=data.get('seats_per_slot'),
+            latitude=latitude,
+            longitude=longitude
         )
         db.session.add(resturent)
         db.session.commit()
@@ -80,15 +101,40 @@ def get_resturent_by_id():
         in: query
         type: integer
         required: true
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all)
     responses:
       200:
         description: Restaurant data
+      304:
+        description: Not modified since the ETag sent in If-None-Match
     """
-    resturent_id=request.args.get('resturent_id')
+    try:
+        fields = parse_fields(request.args, restaurant)
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+    resturent_id=request.args.get('resturent_id', type=int)
+
+    def render():
+        resturent=catalog_cache.entity(restaurant, resturent_id, lambda: _resturent_dict(resturent_id))
+        if not resturent:
+            return jsonify({"error":"Resturent not found"}),404
+        return jsonify({"resturent":pick(resturent, fields)}),200
+
+    validators=catalog_cache.query(restaurant, 'validators', {'id': resturent_id}, lambda: query_validators(restaurant.query.filter_by(id=resturent_id), restaurant))
+    return conditional(validators, render)
+
+def _resturent_dict(resturent_id):
     resturent=restaurant.query.filter_by(id=resturent_id).first()
-    if not resturent:
-        return jsonify({"error":"Resturent not found"}),404
-    return jsonify({"resturent":resturent.to_dict()}),200
+    return resturent.to_dict() if resturent else None
+
+def _list_resturents(args):
+    fields = parse_fields(args, restaurant)
+    resturents, pagination = keyset_paginate(project(restaurant.query, restaurant, *SORT_FIELDS, fields=fields), restaurant, args, sort_fields=SORT_FIELDS)
+    return project_dicts(restaurant, resturents, fields), pagination
 
 @resturent_routes.route('/get_all_resturents',methods=['GET'])
 def get_all_resturents():
@@ -97,12 +143,266 @@ def get_all_resturents():
     ---
     tags:
       - Restaurants
+    parameters:
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default), price, rating (owner-set) or review_average (live average of reviews)
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,name,price,rating
     responses:
       200:
         description: List of restaurants
+      304:
+        description: Not modified since the ETag sent in If-None-Match
     """
-    resturents=restaurant.query.all()
-    return jsonify({"resturents": [resturent.to_dict() for resturent in resturents]}),200
+    try:
+        def render():
+            resturents, pagination = catalog_cache.query(restaurant, 'all', request.args, lambda: _list_resturents(request.args))
+            return jsonify({"resturents": resturents, "pagination": pagination}),200
+
+        validators = catalog_cache.query(restaurant, 'validators', {}, lambda: query_validators(restaurant.query, restaurant))
+        return conditional(validators, render)
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+
+@resturent_routes.route('/search',methods=['GET'])
+def search_resturents():
+    """
+    Search restaurants by any combination of filters
+    ---
+    tags:
+      - Restaurants
+    parameters:
+      - name: location
+        in: query
+        type: string
+        required: false
+      - name: name
+        in: query
+        type: string
+        required: false
+        description: name prefix (case-insensitive)
+      - name: min_price
+        in: query
+        type: number
+        required: false
+      - name: max_price
+        in: query
+        type: number
+        required: false
+      - name: min_rating
+        in: query
+        type: number
+        required: false
+      - name: max_rating
+        in: query
+        type: number
+        required: false
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default), price, rating (owner-set) or review_average (live average of reviews)
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,name,price,rating
+    responses:
+      200:
+        description: Paginated list of restaurants
+      304:
+        description: Not modified since the ETag sent in If-None-Match
+      400:
+        description: Invalid filter
+    """
+    try:
+        def render():
+            items, pagination = catalog_cache.query(restaurant, 'search', request.args, lambda: search_catalog(restaurant, request.args))
+            return jsonify({"resturents": items, "pagination": pagination}),200
+
+        validators = catalog_cache.query(restaurant, 'search:validators', request.args, lambda: search_validators(restaurant, request.args))
+        return conditional(validators, render)
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+
+@resturent_routes.route('/availability',methods=['GET'])
+def get_resturent_availability():
+    """
+    Open slots for many restaurants over a date range in one call
+    ---
+    tags:
+      - Restaurants
+    parameters:
+      - name: start_date
+        in: query
+        type: string
+        required: true
+        description: YYYY-MM-DD
+      - name: end_date
+        in: query
+        type: string
+        required: true
+        description: YYYY-MM-DD (at most 31 days after start_date)
+      - name: guests
+        in: query
+        type: integer
+        required: false
+        description: seats needed (default 1)
+      - name: location
+        in: query
+        type: string
+        required: false
+      - name: restaurant_ids
+        in: query
+        type: string
+        required: false
+        description: comma separated restaurant IDs
+    responses:
+      200:
+        description: Open slots grouped by restaurant
+      400:
+        description: Invalid parameters
+    """
+    try:
+        start_date = parse_date(request.args.get('start_date', ''), 'start_date').date()
+        end_date = parse_date(request.args.get('end_date', ''), 'end_date').date()
+        if end_date < start_date:
+            raise ValidationError('end_date must not be before start_date', 400)
+        if (end_date - start_date).days > MAX_AVAILABILITY_DAYS:
+            raise ValidationError(f'date range must be at most {MAX_AVAILABILITY_DAYS} days', 400)
+        try:
+            guests = int(request.args.get('guests', 1))
+            ids = [int(i) for i in request.args.get('restaurant_ids', '').split(',') if i.strip()]
+        except ValueError:
+            raise ValidationError('guests and restaurant_ids must be integers', 400)
+
+        slots = InventoryService.open_slots_query(start_date, end_date, guests, request.args.get('location'), ids)
+        availability = {}
+        for slot in slots:
+            availability.setdefault(str(slot.restaurant_id), []).append(slot.to_dict())
+        return jsonify({"availability": availability}),200
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+
+@resturent_routes.route('/<int:restaurant_id>/slots',methods=['POST'])
+@jwt_required()
+@role_required(['owner','admin'])
+@rate_limit("3 per minute")
+def create_resturent_slots(restaurant_id):
+    """
+    Open bookable time slots for a restaurant over a date range
+    ---
+    tags:
+      - Restaurants
+    security:
+      - Bearer: []
+    parameters:
+      - name: restaurant_id
+        in: path
+        type: integer
+        required: true
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            start_date:
+              type: string
+            end_date:
+              type: string
+            times:
+              type: array
+              items:
+                type: string
+              description: slot start times, HH:MM
+            capacity:
+              type: integer
+              description: seats per slot (defaults to seats_per_slot)
+    responses:
+      201:
+        description: Slots opened; `skipped` counts slots that already existed and kept their capacity
+      404:
+        description: Restaurant not found
+    """
+    try:
+        restaurant_obj = restaurant.query.get(restaurant_id)
+        if not restaurant_obj:
+            return jsonify({"error": "Restaurant not found"}), 404
+
+        data = require_json(request.get_json())
+        validate_fields(data, {
+            'start_date': {'required': True, 'type': 'string'},
+            'end_date': {'required': True, 'type': 'string'},
+            'capacity': {'required': False, 'type': 'integer', 'min': 1}
+        })
+        start_date = parse_date(data.get('start_date'), 'start_date').date()
+        end_date = parse_date(data.get('end_date'), 'end_date').date()
+        if end_date < start_date:
+            raise ValidationError('end_date must not be before start_date', 400)
+        if (end_date - start_date).days > 366:
+            raise ValidationError('date range must be at most 366 days', 400)
+        times = data.get('times')
+        if not isinstance(times, list) or not times:
+            raise ValidationError('times must be a non-empty list', 400)
+        times = [parse_slot_time(t) for t in times]
+        capacity = data.get('capacity') or restaurant_obj.seats_per_slot
+        if not capacity:
+            raise ValidationError('capacity is required when seats_per_slot is not set', 400)
+
+        if restaurant_obj.seats_per_slot is None:
+            restaurant_obj.seats_per_slot = capacity
+        opened, skipped = InventoryService.create_slots(restaurant_obj, start_date, end_date, times, capacity)
+        db.session.commit()
+        return jsonify({"message": "Slots opened successfully", "slots": opened, "skipped": skipped}), 201
+    except ValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
 
 @resturent_routes.route('/get_resturents_by_name',methods=['GET'])
 def get_resturents_by_name():
@@ -111,16 +411,32 @@ def get_resturents_by_name():
     ---
     tags:
       - Restaurants
+    deprecated: true
     parameters:
       - name: name
         in: query
         type: string
         required: true
+      - name: fuzzy
+        in: query
+        type: boolean
+        required: false
+        description: typo-tolerant match ranked by trigram similarity (e.g. "Ramalla" finds "Ramallah")
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: maximum fuzzy matches (default 20, max 50)
     responses:
       200:
         description: List of restaurants
     """
     name=request.args.get('name')
+    if wants_fuzzy(request.args):
+        try:
+            return jsonify({"resturents": fuzzy_search.lookup(restaurant, 'name', request.args)}),200
+        except ValidationError as e:
+            return jsonify({"success": False, "error": e.message}), e.status_code
     resturents=restaurant.query.filter_by(name=name).all()
     return jsonify({"resturents": [resturent.to_dict() for resturent in resturents]}),200
 
@@ -131,16 +447,32 @@ def get_resturents_by_location():
     ---
     tags:
       - Restaurants
+    deprecated: true
     parameters:
       - name: location
         in: query
         type: string
         required: true
+      - name: fuzzy
+        in: query
+        type: boolean
+        required: false
+        description: typo-tolerant match ranked by trigram similarity (e.g. "Ramalla" finds "Ramallah")
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: maximum fuzzy matches (default 20, max 50)
     responses:
       200:
         description: List of restaurants
     """
     location=request.args.get('location')
+    if wants_fuzzy(request.args):
+        try:
+            return jsonify({"resturents": fuzzy_search.lookup(restaurant, 'location', request.args)}),200
+        except ValidationError as e:
+            return jsonify({"success": False, "error": e.message}), e.status_code
     resturents=restaurant.query.filter_by(location=location).all()          
     return jsonify({"resturents": [resturent.to_dict() for resturent in resturents]}),200
 
@@ -151,6 +483,7 @@ def get_resturents_by_rating():
     ---
     tags:
       - Restaurants
+    deprecated: true
     parameters:
       - name: rating
         in: query
@@ -172,6 +505,7 @@ def get_resturents_by_price():
     ---
     tags:
       - Restaurants
+    deprecated: true
     parameters:
       - name: price
         in: query
@@ -193,6 +527,7 @@ def get_resturents_by_price_range():
     ---
     tags:
       - Restaurants
+    deprecated: true
     parameters:
       - name: price_range
         in: query
@@ -273,6 +608,7 @@ def get_resturents_by_rating_range():
     ---
     tags:
       - Restaurants
+    deprecated: true
     parameters:
       - name: rating_range
         in: query
@@ -327,9 +663,22 @@ def update_resturent(restaurant_id):
               type: number
             price:
               type: number
+            latitude:
+              type: number
+            longitude:
+              type: number
+            seats_per_slot:
+              type: integer
+              description: >
+                default capacity of newly opened slots. Turning seat tracking
+                on makes bookings fail with "slot not open" until slots exist,
+                so it is rejected while the restaurant has no slots; open
+                slots with POST /resturent/<restaurant_id>/slots instead
     responses:
       200:
         description: Restaurant updated
+      400:
+        description: Invalid seats_per_slot, or seat tracking turned on before any slot is open
       404:
         description: Restaurant not found
     """
@@ -338,7 +687,13 @@ def update_resturent(restaurant_id):
         if not restaurant_obj:
             return jsonify({"error": "Restaurant not found"}), 404
         
-        data = request.get_json()
+        data = require_json(request.get_json())
+        validate_fields(data, {
+            'seats_per_slot': {'required': False, 'type': 'integer', 'min': 1}
+        })
+        if (data.get('seats_per_slot') is not None and restaurant_obj.seats_per_slot is None
+                and not restaurant_slot.query.filter_by(restaurant_id=restaurant_id).first()):
+            raise ValidationError('Open slots with POST /resturent/<restaurant_id>/slots before setting seats_per_slot', 400)
         
         if data.get('name'):
             restaurant_obj.name = data.get('name')
@@ -350,11 +705,18 @@ def update_resturent(restaurant_id):
             restaurant_obj.rating = data.get('rating')
         if data.get('price') is not None:
             restaurant_obj.price = data.get('price')
+        if data.get('latitude') is not None or data.get('longitude') is not None:
+            restaurant_obj.latitude, restaurant_obj.longitude = validate_coordinates(data)
+        if data.get('seats_per_slot') is not None:
+            restaurant_obj.seats_per_slot = data.get('seats_per_slot')
         
         restaurant_obj.updated_at = datetime.utcnow()
         db.session.commit()
         
         return jsonify({"message": "Restaurant updated successfully", "restaurant": restaurant_obj.to_dict()}), 200
+    except ValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -4,8 +4,14 @@ from flask_jwt_extended import jwt_required,get_jwt_identity
 from datetime import datetime
 from routes.role_req import role_required
 from utils.validation import require_json, validate_fields, ValidationError
+from utils.pagination import keyset_paginate
+from utils.projection import project, project_dicts, parse_fields
+from utils.conditional import query_validators, conditional
+from services.review_stats import ReviewStatsService
 reviews_routes=Blueprint('reviews',__name__)
 
+REVIEW_SORT_FIELDS = ('created_at', 'rating')
+
 @reviews_routes.route('/',methods=['GET'])
 def home():
     return jsonify({"message":"Welcome to the reviews API"}),200
@@ -64,14 +70,28 @@ def create_review():
             comment=data.get('comment').strip()
         )
         db.session.add(review_obj)
+        ReviewStatsService.apply(review_obj, new_rating=review_obj.rating)
         db.session.commit()
         return jsonify({"message":"Review created successfully", "review": review_obj.to_dict()}),201
     except ValidationError as e:
+        db.session.rollback()
         return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+def _paginated_reviews(query, scope=()):
+    try:
+        fields = parse_fields(request.args, review)
+
+        def render():
+            reviews, pagination = keyset_paginate(project(query, review, *REVIEW_SORT_FIELDS, fields=fields), review, request.args, sort_fields=REVIEW_SORT_FIELDS)
+            return jsonify({"reviews": project_dicts(review, reviews, fields), "pagination": pagination}),200
+
+        return conditional(query_validators(query, review), render, scope)
+    except ValidationError as e:
+        return jsonify({"error": e.message}), e.status_code
+
 @reviews_routes.route('/get_reviews_by_user_id',methods=['GET'])
 @jwt_required()
 def get_reviews_by_user_id():
@@ -82,26 +102,54 @@ def get_reviews_by_user_id():
       - Reviews
     security:
       - Bearer: []
+    parameters:
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default) or rating
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,rating,comment
     responses:
       200:
         description: List of reviews
+      304:
+        description: Not modified since the ETag sent in If-None-Match
     """
     user_id=get_jwt_identity()
-    reviews=review.query.filter_by(user_id=user_id).all()               
-    return jsonify({"reviews": [review.to_dict() for review in reviews]}),200
+    return _paginated_reviews(review.query.filter_by(user_id=user_id), scope=(user_id,))
 
 @reviews_routes.route('/get_reviews_by_torist_place_id',methods=['GET'])
 
 def get_reviews_by_torist_place_id():
     torist_place_id=request.args.get('torist_place_id')
-    reviews=review.query.filter_by(torist_place_id=torist_place_id).all()               
-    return jsonify({"reviews": [review.to_dict() for review in reviews]}),200
+    return _paginated_reviews(review.query.filter_by(torist_place_id=torist_place_id))
 
 @reviews_routes.route('/get_reviews_by_hotel_id',methods=['GET'])
 def get_reviews_by_hotel_id():
     hotel_id=request.args.get('hotel_id')
-    reviews=review.query.filter_by(hotel_id=hotel_id).all()               
-    return jsonify({"reviews": [review.to_dict() for review in reviews]}),200
+    return _paginated_reviews(review.query.filter_by(hotel_id=hotel_id))
 
 @reviews_routes.route('/get_reviews_by_restaurant_id',methods=['GET'])
 
@@ -116,13 +164,42 @@ def get_reviews_by_restaurant_id():
         in: query
         type: integer
         required: true
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default) or rating
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,rating,comment
     responses:
       200:
         description: List of reviews
+      304:
+        description: Not modified since the ETag sent in If-None-Match
     """
     restaurant_id=request.args.get('restaurant_id')
-    reviews=review.query.filter_by(restaurant_id=restaurant_id).all()               
-    return jsonify({"reviews": [review.to_dict() for review in reviews]}),200
+    return _paginated_reviews(review.query.filter_by(restaurant_id=restaurant_id))
 
 @reviews_routes.route('/get_reviews_by_rating',methods=['GET'])
 
@@ -251,9 +328,14 @@ def update_review(review_id):
         if str(review_obj.user_id) != user_id:
             return jsonify({"error": "Unauthorized"}), 403
         
-        data = request.get_json()
+        data = require_json(request.get_json())
+        validate_fields(data, {
+            'rating': {'required': False, 'type': 'number', 'min': 0, 'max': 5},
+            'comment': {'required': False, 'type': 'string', 'min_length': 1, 'max_length': 200}
+        })
         
-        if data.get('rating') is not None:
+        if data.get('rating') is not None and data.get('rating') != review_obj.rating:
+            ReviewStatsService.apply(review_obj, old_rating=review_obj.rating, new_rating=data.get('rating'))
             review_obj.rating = data.get('rating')
         if data.get('comment'):
             review_obj.comment = data.get('comment')
@@ -262,6 +344,9 @@ def update_review(review_id):
         db.session.commit()
         
         return jsonify({"message": "Review updated successfully", "review": review_obj.to_dict()}), 200
+    except ValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -298,6 +383,7 @@ def delete_review(review_id):
         if str(review_obj.user_id) != user_id:
             return jsonify({"error": "Unauthorized"}), 403
         
+        ReviewStatsService.apply(review_obj, old_rating=review_obj.rating)
         db.session.delete(review_obj)
         db.session.commit()
         
@@ -0,0 +1,175 @@
+from flask import Blueprint,request,jsonify
+from models import hotel,restaurant,torist_place
+from utils.validation import ValidationError, parse_include, parse_limit
+from utils.projection import parse_fields, pick
+from services.cache import catalog_cache
+from services.text_search import text_search, search_terms, MAX_LIMIT
+from services.geo_search import GeoSearchService, MAX_LIMIT as GEO_MAX_LIMIT
+search_routes=Blueprint('search',__name__)
+
+# type name -> (model, response key)
+SEARCH_TYPES = {
+    'hotel': (hotel, 'hotels'),
+    'restaurant': (restaurant, 'restaurants'),
+    'site': (torist_place, 'sites'),
+}
+
+
+def _search(model, q, limit):
+    return [{**row.to_dict(), "score": score} for row, score in text_search.search(model, q, limit)]
+
+
+@search_routes.route('',methods=['GET'])
+def search_catalog_text():
+    """
+    Full-text search across hotels, restaurants and tourist sites
+    ---
+    tags:
+      - Search
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: words to find in names, locations and descriptions; every word must match, as a prefix
+      - name: types
+        in: query
+        type: string
+        required: false
+        description: comma-separated subset of hotel, restaurant, site (default all)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: results per type, best first (default 10, max 50)
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return per row (default all); score is always returned
+    responses:
+      200:
+        description: Ranked matches per type; a higher score is a better match
+      400:
+        description: Missing q or invalid types/limit
+    """
+    try:
+        q = (request.args.get('q') or '').strip()
+        search_terms(q)
+        types = parse_include(request.args.get('types'), tuple(SEARCH_TYPES), 'types') or set(SEARCH_TYPES)
+        limit = parse_limit(request.args.get('limit'), 10, MAX_LIMIT)
+        fields = parse_fields(request.args, *(model for name, (model, _) in SEARCH_TYPES.items() if name in types))
+        result = {"query": q}
+        for name, (model, key) in SEARCH_TYPES.items():
+            if name in types:
+                hits = catalog_cache.query(model, 'fulltext', {'q': q, 'limit': limit},
+                                           lambda: _search(model, q, limit))
+                result[key] = pick(hits, fields, keep=('score',))
+        return jsonify(result),200
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+
+
+def _parse_coordinate(args, name, limit):
+    try:
+        value = float(args.get(name))
+    except (TypeError, ValueError):
+        raise ValidationError(f"{name} must be a number", 400)
+    if not -limit <= value <= limit:
+        raise ValidationError(f"{name} must be between -{limit} and {limit}", 400)
+    return value
+
+
+def _search_point(args):
+    """(latitude, longitude) from lat/lng, or from the tourist site given as site_id"""
+    if args.get('site_id'):
+        site = torist_place.query.get(args.get('site_id'))
+        if not site:
+            raise ValidationError("Site not found", 404)
+        if site.latitude is None:
+            raise ValidationError("Site has no coordinates", 400)
+        return site.latitude, site.longitude
+    return _parse_coordinate(args, 'lat', 90), _parse_coordinate(args, 'lng', 180)
+
+
+def _nearby(model, latitude, longitude, radius_km, limit):
+    if radius_km is None:
+        matches = GeoSearchService.nearest(model, latitude, longitude, limit)
+    else:
+        matches = GeoSearchService.within(model, latitude, longitude, radius_km, limit)
+    return [{**row.to_dict(), "distance_km": round(distance, 3)} for row, distance in matches]
+
+
+@search_routes.route('/nearby',methods=['GET'])
+def nearby():
+    """
+    Hotels, restaurants and tourist sites near a point, nearest first
+    ---
+    tags:
+      - Search
+    parameters:
+      - name: lat
+        in: query
+        type: number
+        required: false
+        description: latitude of the point (required unless site_id is given)
+      - name: lng
+        in: query
+        type: number
+        required: false
+        description: longitude of the point (required unless site_id is given)
+      - name: site_id
+        in: query
+        type: integer
+        required: false
+        description: search around this tourist site instead of lat/lng
+      - name: radius_km
+        in: query
+        type: number
+        required: false
+        description: only rows within this distance (max 1000); without it the nearest rows are returned
+      - name: types
+        in: query
+        type: string
+        required: false
+        description: comma-separated subset of hotel, restaurant, site (default all)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: results per type (default 10, max 50)
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return per row (default all); distance_km is always returned
+    responses:
+      200:
+        description: Rows per type with distance_km; rows without coordinates never match
+      400:
+        description: Invalid coordinates, radius, types or limit
+      404:
+        description: Site not found
+    """
+    try:
+        types = parse_include(request.args.get('types'), tuple(SEARCH_TYPES), 'types') or set(SEARCH_TYPES)
+        latitude, longitude = _search_point(request.args)
+        limit = parse_limit(request.args.get('limit'), 10, GEO_MAX_LIMIT)
+        radius_km = None
+        if request.args.get('radius_km'):
+            try:
+                radius_km = float(request.args.get('radius_km'))
+            except ValueError:
+                raise ValidationError("radius_km must be a number", 400)
+        # Keyed by the resolved point, so moving a site does not leave stale hotel/restaurant entries
+        key_args = {'lat': latitude, 'lng': longitude, 'radius_km': radius_km, 'limit': limit}
+        fields = parse_fields(request.args, *(model for name, (model, _) in SEARCH_TYPES.items() if name in types))
+        result = {}
+        for name, (model, key) in SEARCH_TYPES.items():
+            if name in types:
+                rows = catalog_cache.query(model, 'nearby', key_args,
+                                           lambda: _nearby(model, latitude, longitude, radius_km, limit))
+                result[key] = pick(rows, fields, keep=('distance_km',))
+        return jsonify(result),200
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
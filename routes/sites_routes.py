@@ -4,7 +4,13 @@ from flask_jwt_extended import jwt_required,get_jwt_identity
 from datetime import datetime
 from routes.rate_limit import rate_limit
 from routes.role_req import role_required
-from utils.validation import require_json, validate_fields
+from utils.validation import require_json, validate_fields, validate_coordinates, ValidationError
+from utils.catalog_search import search_catalog, search_validators, SORT_FIELDS
+from utils.pagination import keyset_paginate
+from utils.projection import project, project_dicts, parse_fields, pick
+from utils.conditional import query_validators, conditional
+from services.cache import catalog_cache
+from services.fuzzy_search import fuzzy_search, wants_fuzzy
 sites_routes=Blueprint('sites',__name__)
 
 @sites_routes.route('/',methods=['GET'])
@@ -40,6 +46,10 @@ def create_site():
               type: number
             price:
               type: number
+            latitude:
+              type: number
+            longitude:
+              type: number
     responses:
       201:
         description: Site created
@@ -53,13 +63,16 @@ def create_site():
             'rating': {'required': True, 'type': 'number', 'min': 0, 'max': 5},
             'price': {'required': True, 'type': 'number', 'min': 0}
         })
+        latitude, longitude = validate_coordinates(data)
 
         site = torist_place(
             name=data.get('name').strip(),
             description=data.get('description').strip(),
             location=data.get('location').strip(),
             rating=data.get('rating'),
-            price=data.get('price')
+            price=data.get('price'),
+            latitude=latitude,
+            longitude=longitude
         )
 
         db.session.add(site)
@@ -77,21 +90,129 @@ def get_sites():
     ---
     tags:
       - Sites
+    parameters:
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default), price, rating (owner-set) or review_average (live average of reviews)
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,name,location
     responses:
       200:
         description: List of sites
+      304:
+        description: Not modified since the ETag sent in If-None-Match
     """
+    try:
+        def render():
+            sites, pagination = catalog_cache.query(torist_place, 'all', request.args, lambda: _list_sites(request.args))
+            return jsonify({"sites": sites, "pagination": pagination}),200
+
+        validators = catalog_cache.query(torist_place, 'validators', {}, lambda: query_validators(torist_place.query, torist_place))
+        return conditional(validators, render)
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+
+@sites_routes.route('/search',methods=['GET'])
+def search_sites():
     """
-    Get all sites
+    Search sites by any combination of filters
     ---
     tags:
       - Sites
+    parameters:
+      - name: location
+        in: query
+        type: string
+        required: false
+      - name: name
+        in: query
+        type: string
+        required: false
+        description: name prefix (case-insensitive)
+      - name: min_price
+        in: query
+        type: number
+        required: false
+      - name: max_price
+        in: query
+        type: number
+        required: false
+      - name: min_rating
+        in: query
+        type: number
+        required: false
+      - name: max_rating
+        in: query
+        type: number
+        required: false
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default), price, rating (owner-set) or review_average (live average of reviews)
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,name,location
     responses:
       200:
-        description: List of sites
+        description: Paginated list of sites
+      304:
+        description: Not modified since the ETag sent in If-None-Match
+      400:
+        description: Invalid filter
     """
-    sites=torist_place.query.all()
-    return jsonify({"sites": [site.to_dict() for site in sites]}),200
+    try:
+        def render():
+            items, pagination = catalog_cache.query(torist_place, 'search', request.args, lambda: search_catalog(torist_place, request.args))
+            return jsonify({"sites": items, "pagination": pagination}),200
+
+        validators = catalog_cache.query(torist_place, 'search:validators', request.args, lambda: search_validators(torist_place, request.args))
+        return conditional(validators, render)
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
 
 @sites_routes.route('/get_site_by_id',methods=['GET'])
 def get_site_by_id():
@@ -105,9 +226,16 @@ def get_site_by_id():
         in: query
         type: integer
         required: true
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all)
     responses:
       200:
         description: Site data
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       404:
         description: Not found
     """
@@ -125,11 +253,29 @@ def get_site_by_id():
       200:
         description: Site data
     """
-    id=request.args.get('id')
-    site=torist_place.query.filter_by(id=id).first()
-    if not site:
-        return jsonify({"success": False, "error": "Site not found"}),404
-    return jsonify({"site": site.to_dict()}),200
+    try:
+        fields = parse_fields(request.args, torist_place)
+    except ValidationError as e:
+        return jsonify({"success": False, "error": e.message}), e.status_code
+    id=request.args.get('id', type=int)
+
+    def render():
+        site=catalog_cache.entity(torist_place, id, lambda: _site_dict(id))
+        if not site:
+            return jsonify({"success": False, "error": "Site not found"}),404
+        return jsonify({"site": pick(site, fields)}),200
+
+    validators=catalog_cache.query(torist_place, 'validators', {'id': id}, lambda: query_validators(torist_place.query.filter_by(id=id), torist_place))
+    return conditional(validators, render)
+
+def _site_dict(site_id):
+    site=torist_place.query.filter_by(id=site_id).first()
+    return site.to_dict() if site else None
+
+def _list_sites(args):
+    fields = parse_fields(args, torist_place)
+    sites, pagination = keyset_paginate(project(torist_place.query, torist_place, *SORT_FIELDS, fields=fields), torist_place, args, sort_fields=SORT_FIELDS)
+    return project_dicts(torist_place, sites, fields), pagination
 
 @sites_routes.route('/get_site_by_name',methods=['GET'])
 def get_site_by_name():
@@ -143,11 +289,26 @@ def get_site_by_name():
         in: query
         type: string
         required: true
+      - name: fuzzy
+        in: query
+        type: boolean
+        required: false
+        description: typo-tolerant match ranked by trigram similarity (e.g. "Ramalla" finds "Ramallah")
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: maximum fuzzy matches (default 20, max 50)
     responses:
       200:
-        description: Site data
+        description: Site data (with fuzzy=true, a sites list ranked by similarity)
     """
     name=request.args.get('name')
+    if wants_fuzzy(request.args):
+        try:
+            return jsonify({"sites": fuzzy_search.lookup(torist_place, 'name', request.args)}),200
+        except ValidationError as e:
+            return jsonify({"success": False, "error": e.message}), e.status_code
     site=torist_place.query.filter_by(name=name).first()
     return jsonify({"site": site.to_dict()}),200
 
@@ -163,11 +324,26 @@ def get_site_by_location():
         in: query
         type: string
         required: true
+      - name: fuzzy
+        in: query
+        type: boolean
+        required: false
+        description: typo-tolerant match ranked by trigram similarity (e.g. "Ramalla" finds "Ramallah")
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: maximum fuzzy matches (default 20, max 50)
     responses:
       200:
-        description: Site data
+        description: Site data (with fuzzy=true, a sites list ranked by similarity)
     """
     location=request.args.get('location')
+    if wants_fuzzy(request.args):
+        try:
+            return jsonify({"sites": fuzzy_search.lookup(torist_place, 'location', request.args)}),200
+        except ValidationError as e:
+            return jsonify({"success": False, "error": e.message}), e.status_code
     site=torist_place.query.filter_by(location=location).first()
     return jsonify({"site": site.to_dict()}),200
 
@@ -240,6 +416,7 @@ def get_site_by_rating_range():
     ---
     tags:
       - Sites
+    deprecated: true
     parameters:
       - name: rating_range
         in: query
@@ -294,6 +471,10 @@ def update_site(site_id):
               type: number
             price:
               type: number
+            latitude:
+              type: number
+            longitude:
+              type: number
     responses:
       200:
         description: Site updated
@@ -317,11 +498,16 @@ def update_site(site_id):
             site.rating = data.get('rating')
         if data.get('price') is not None:
             site.price = data.get('price')
+        if data.get('latitude') is not None or data.get('longitude') is not None:
+            site.latitude, site.longitude = validate_coordinates(data)
         
         site.updated_at = datetime.utcnow()
         db.session.commit()
         
         return jsonify({"message": "Site updated successfully", "site": site.to_dict()}), 200
+    except ValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
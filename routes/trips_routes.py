@@ -1,12 +1,21 @@
 from flask import Flask,request,jsonify,Blueprint
-from models import trips,db
+from models import trips,trip_items,db
 from flask_jwt_extended import jwt_required,get_jwt_identity
 from datetime import datetime
 from routes.role_req import role_required
 from routes.rate_limit import rate_limit
 from utils.validation import require_json, validate_fields, parse_date, ValidationError
+from utils.pagination import keyset_paginate
+from utils.projection import project, project_dicts, parse_fields, pick
+from services.itinerary import ItineraryService, ITEM_TYPES
+from services.query_guard import sql_budget
 trips_routes=Blueprint('trips',__name__)
 
+TRIP_SORT_FIELDS = ('created_at', 'start_date')
+ITINERARY_SORT_FIELDS = ('start_date', 'created_at')
+# Embedded by ItineraryService.build(); kept whatever fields= asks for
+ITINERARY_KEYS = ('site', 'hotel', 'restaurant', 'items')
+
 @trips_routes.route('/',methods=['GET'])
 def home():
     return jsonify({"message":"Welcome to the trips API"}),200
@@ -84,13 +93,335 @@ def get_trips_by_user_id():
     ---
     tags:
       - Trips
+    parameters:
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default) or start_date
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,start_date,end_date
     responses:
       200:
         description: List of trips
     """
-    user_id=get_jwt_identity()
-    trip=trips.query.filter_by(user_id=user_id).all()
-    return jsonify({"trips": [trip.to_dict() for trip in trip]}),200
+    try:
+        user_id=get_jwt_identity()
+        fields = parse_fields(request.args, trips)
+        trip, pagination = keyset_paginate(project(trips.query.filter_by(user_id=user_id), trips, *TRIP_SORT_FIELDS, fields=fields), trips, request.args, sort_fields=TRIP_SORT_FIELDS)
+        return jsonify({"trips": project_dicts(trips, trip, fields), "pagination": pagination}),200
+    except ValidationError as e:
+        return jsonify({"error": e.message}), e.status_code
+
+@trips_routes.route('/itinerary',methods=['GET'])
+@jwt_required()
+@sql_budget(7)
+def get_itinerary():
+    """
+    Current user's trips with their site, hotel and restaurant embedded
+    ---
+    tags:
+      - Trips
+    security:
+      - Bearer: []
+    parameters:
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: start_date (default) or created_at
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc (default) or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,start_date,end_date
+    responses:
+      200:
+        description: >
+          Trips with their items and site, hotel and restaurant summaries
+          with review aggregates; the whole page is resolved with one
+          query for the items and one per entity type
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        fields = parse_fields(request.args, trips)
+        trip_rows, pagination = keyset_paginate(trips.query.filter_by(user_id=user_id), trips, request.args,
+                                                sort_fields=ITINERARY_SORT_FIELDS, default_order='asc')
+        itineraries = pick(ItineraryService.build(trip_rows), fields, keep=ITINERARY_KEYS)
+        return jsonify({"trips": itineraries, "pagination": pagination}),200
+    except ValidationError as e:
+        return jsonify({"error": e.message}), e.status_code
+
+@trips_routes.route('/itinerary',methods=['POST'])
+@jwt_required()
+@role_required(['user', 'admin'])
+@rate_limit("10 per minute")
+def create_itinerary():
+    """
+    Create a multi-day trip with all its stops in one request
+    ---
+    tags:
+      - Trips
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            start_date:
+              type: string
+            end_date:
+              type: string
+            items:
+              type: array
+              description: stops of the trip; positions default to the order within each day
+              items:
+                type: object
+                properties:
+                  day:
+                    type: integer
+                    description: 1 = start_date
+                  type:
+                    type: string
+                    enum: [site, hotel, restaurant]
+                  id:
+                    type: integer
+                  position:
+                    type: integer
+    responses:
+      201:
+        description: Trip created with its items
+      400:
+        description: Invalid dates or items
+    """
+    try:
+        data = require_json(request.get_json())
+        validate_fields(data, {
+            'start_date': {'required': True, 'type': 'string'},
+            'end_date': {'required': True, 'type': 'string'}
+        })
+        start_date = parse_date(data.get('start_date'), 'start_date')
+        end_date = parse_date(data.get('end_date'), 'end_date')
+        if start_date >= end_date:
+            raise ValidationError('end_date must be after start_date', 400)
+        rows = ItineraryService.parse_items(data.get('items', []), start_date, end_date)
+
+        trip = trips(user_id=int(get_jwt_identity()), start_date=start_date, end_date=end_date)
+        db.session.add(trip)
+        db.session.flush()
+        ItineraryService.add_items(trip, rows)
+        db.session.commit()
+        return jsonify({"message": "Trip created successfully", "trip": ItineraryService.build([trip])[0]}),201
+    except ValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@trips_routes.route('/<int:trip_id>/itinerary',methods=['PUT'])
+@jwt_required()
+@role_required(['user', 'admin'])
+@rate_limit("10 per minute")
+def replace_itinerary(trip_id):
+    """
+    Replace all stops of a trip (and optionally its dates) in one transaction
+    ---
+    tags:
+      - Trips
+    security:
+      - Bearer: []
+    parameters:
+      - name: trip_id
+        in: path
+        type: integer
+        required: true
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            start_date:
+              type: string
+            end_date:
+              type: string
+            items:
+              type: array
+              description: every stop of the trip (required; [] removes them all); positions default to the order within each day
+              items:
+                type: object
+                properties:
+                  day:
+                    type: integer
+                    description: 1 = start_date
+                  type:
+                    type: string
+                    enum: [site, hotel, restaurant]
+                  id:
+                    type: integer
+                  position:
+                    type: integer
+    responses:
+      200:
+        description: Trip updated with its new items
+      400:
+        description: Invalid dates or items
+      403:
+        description: Not your trip
+      404:
+        description: Trip not found
+    """
+    try:
+        trip_obj = trips.query.get(trip_id)
+        if not trip_obj:
+            return jsonify({"error": "Trip not found"}), 404
+        if str(trip_obj.user_id) != get_jwt_identity():
+            return jsonify({"error": "Unauthorized"}), 403
+
+        data = require_json(request.get_json())
+        validate_fields(data, {
+            'start_date': {'required': False, 'type': 'string'},
+            'end_date': {'required': False, 'type': 'string'}
+        })
+        if data.get('start_date'):
+            trip_obj.start_date = parse_date(data.get('start_date'), 'start_date')
+        if data.get('end_date'):
+            trip_obj.end_date = parse_date(data.get('end_date'), 'end_date')
+        if trip_obj.start_date >= trip_obj.end_date:
+            raise ValidationError('end_date must be after start_date', 400)
+        if 'items' not in data:
+            raise ValidationError('items is required; send [] to remove every stop', 400)
+        rows = ItineraryService.parse_items(data['items'], trip_obj.start_date, trip_obj.end_date)
+
+        ItineraryService.replace_items(trip_obj, rows)
+        trip_obj.updated_at = datetime.utcnow()
+        db.session.commit()
+        return jsonify({"message": "Trip updated successfully", "trip": ItineraryService.build([trip_obj])[0]}),200
+    except ValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@trips_routes.route('/visiting',methods=['GET'])
+@jwt_required()
+@role_required(['owner', 'admin'])
+@sql_budget(8)
+def get_trips_visiting():
+    """
+    Trips that visit a site, hotel or restaurant within a date range (owner/admin)
+    ---
+    tags:
+      - Trips
+    security:
+      - Bearer: []
+    parameters:
+      - name: type
+        in: query
+        type: string
+        required: true
+        enum: [site, hotel, restaurant]
+      - name: id
+        in: query
+        type: integer
+        required: true
+      - name: start_date
+        in: query
+        type: string
+        required: true
+      - name: end_date
+        in: query
+        type: string
+        required: true
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,start_date,end_date
+    responses:
+      200:
+        description: Matching trips as itineraries, by start date
+      400:
+        description: Invalid type, id or dates
+    """
+    try:
+        item_type = request.args.get('type')
+        if item_type not in ITEM_TYPES:
+            raise ValidationError(f"type must be one of: {', '.join(ITEM_TYPES)}", 400)
+        try:
+            entity_id = int(request.args.get('id', ''))
+        except ValueError:
+            raise ValidationError("id must be an integer", 400)
+        start_date = parse_date(request.args.get('start_date') or '', 'start_date')
+        end_date = parse_date(request.args.get('end_date') or '', 'end_date')
+        if start_date > end_date:
+            raise ValidationError('end_date must not be before start_date', 400)
+
+        query = ItineraryService.trips_touching(item_type, entity_id, start_date, end_date)
+        fields = parse_fields(request.args, trips)
+        trip_rows, pagination = keyset_paginate(query, trips, request.args,
+                                                sort_fields=ITINERARY_SORT_FIELDS, default_order='asc')
+        itineraries = pick(ItineraryService.build(trip_rows), fields, keep=ITINERARY_KEYS)
+        return jsonify({"trips": itineraries, "pagination": pagination}),200
+    except ValidationError as e:
+        return jsonify({"error": e.message}), e.status_code
 
 @trips_routes.route('/get_trips_by_torist_place_id',methods=['GET'])
 #@jwt_required()
@@ -161,21 +492,45 @@ def get_all_trips():
     ---
     tags:
       - Trips
+    parameters:
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+      - name: sort
+        in: query
+        type: string
+        required: false
+        description: created_at (default) or start_date
+      - name: order
+        in: query
+        type: string
+        required: false
+        description: asc or desc
+      - name: include_total
+        in: query
+        type: boolean
+        required: false
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: comma-separated fields to return (default all), e.g. id,start_date,end_date
     responses:
       200:
         description: List of trips
     """
-    """
-    Get all trips
-    ---
-    tags:
-      - Trips
-    responses:
-      200:
-        description: List of trips
-    """
-    trip=trips.query.all()
-    return jsonify({"trips": [trip.to_dict() for trip in trip]}),200
+    try:
+        fields = parse_fields(request.args, trips)
+        trip, pagination = keyset_paginate(project(trips.query, trips, *TRIP_SORT_FIELDS, fields=fields), trips, request.args, sort_fields=TRIP_SORT_FIELDS)
+        return jsonify({"trips": project_dicts(trips, trip, fields), "pagination": pagination}),200
+    except ValidationError as e:
+        return jsonify({"error": e.message}), e.status_code
 
 @trips_routes.route('/update_trip/<int:trip_id>', methods=['PUT'])
 @jwt_required()
@@ -213,6 +568,8 @@ def update_trip(trip_id):
     responses:
       200:
         description: Trip updated
+      400:
+        description: Invalid dates, or a new end_date that would leave items past the last day
       404:
         description: Trip not found
     """
@@ -236,14 +593,21 @@ def update_trip(trip_id):
         if data.get('restaurant_id') is not None:
             trip_obj.restaurant_id = data.get('restaurant_id')
         if data.get('start_date'):
-            trip_obj.start_date = datetime.strptime(data.get('start_date'), "%Y-%m-%d")
+            trip_obj.start_date = parse_date(data.get('start_date'), 'start_date')
         if data.get('end_date'):
-            trip_obj.end_date = datetime.strptime(data.get('end_date'), "%Y-%m-%d")
+            trip_obj.end_date = parse_date(data.get('end_date'), 'end_date')
+        if data.get('start_date') or data.get('end_date'):
+            ItineraryService.check_dates(trip_obj)
+        if data.get('start_date'):
+            ItineraryService.refresh_dates(trip_obj)
         
         trip_obj.updated_at = datetime.utcnow()
         db.session.commit()
         
         return jsonify({"message": "Trip updated successfully", "trip": trip_obj.to_dict()}), 200
+    except ValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -282,6 +646,8 @@ def delete_trip(trip_id):
         if str(trip_obj.user_id) != user_id:
             return jsonify({"error": "Unauthorized"}), 403
         
+        # Not left to ON DELETE CASCADE: SQLite only enforces it with foreign_keys on
+        trip_items.query.filter_by(trip_id=trip_id).delete(synchronize_session=False)
         db.session.delete(trip_obj)
         db.session.commit()
         
@@ -0,0 +1,357 @@
+"""
+Benchmark the API against a seeded local database
+
+Seeds configurable volumes of users, catalog rows, bookings and reviews,
+then drives real endpoints and reports throughput and p50/p95/p99 latency
+per route.
+
+Two drivers:
+    testclient  requests go through the Flask test client in this process
+                (no network, measures the application and database path)
+    http        several processes send requests to a running server
+                (e.g. `gunicorn -w 4 app:app`) over keep-alive connections
+
+Examples:
+    python scripts/benchmark.py --hotels 100000 --bookings 1000000 --reviews 1000000
+    python scripts/benchmark.py --database-url postgresql://localhost/yalla_bench --bookings 10000000
+    python scripts/benchmark.py --no-seed --driver http --url http://127.0.0.1:8000 --processes 8
+    python scripts/benchmark.py --no-seed --output new.json --baseline old.json
+
+Seeding drops and recreates every table in the target database. For the
+http driver, start the server against the same database with
+STRIPE_BACKEND=fake and RATELIMIT_ENABLED=false, and the same JWT_SECRET_KEY.
+"""
+from datetime import datetime, timedelta
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+# Ensure project root is on sys.path
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+LOCATIONS = ['Jerusalem', 'Bethlehem', 'Ramallah', 'Nablus', 'Hebron', 'Jericho', 'Jenin', 'Gaza', 'Tulkarm', 'Qalqilya']
+PASSWORD = 'Password@123'
+ROUTES = ('catalog_search', 'my_bookings', 'create_hotel_booking', 'login')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Seed a local database and benchmark the API')
+    parser.add_argument('--database-url', default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'yalla_bench.db')}")
+    parser.add_argument('--no-seed', dest='seed', action='store_false', help='reuse the data already in the database')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--hotels', type=int, default=10000)
+    parser.add_argument('--restaurants', type=int, default=10000)
+    parser.add_argument('--sites', type=int, default=1000)
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--driver', choices=('testclient', 'http'), default='testclient')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='server for the http driver')
+    parser.add_argument('--processes', type=int, default=4, help='client processes for the http driver')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per route')
+    parser.add_argument('--routes', default=','.join(ROUTES), help=f"comma separated subset of {', '.join(ROUTES)}")
+    parser.add_argument('--random-seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='fail when a route p95 is this fraction slower than the baseline')
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    # Must run before the app is imported: app.py reads its config at import time
+    os.environ['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    os.environ['STRIPE_BACKEND'] = 'fake'
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-change-me-0123456789')
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+
+
+def seed(args, rng):
+    from werkzeug.security import generate_password_hash
+    from models import db, User, hotel, restaurant, torist_place, booking, review
+    from services.review_stats import ReviewStatsService
+    from utils.bulk_load import bulk_insert
+
+    print(f"Seeding {args.database_url}")
+    db.drop_all()
+    db.create_all()
+
+    # Hashing is deliberately slow; every benchmark user shares one hash
+    password_hash = generate_password_hash(PASSWORD)
+    bulk_insert(User, (
+        {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': password_hash, 'role': 'user'}
+        for i in range(1, args.users + 1)
+    ), batch_size=10000)
+
+    now = datetime.utcnow()
+
+    def catalog_rows(count, prefix, extra):
+        for i in range(1, count + 1):
+            yield {
+                'name': f'{prefix} {i}',
+                'description': f'{prefix} number {i}',
+                'location': rng.choice(LOCATIONS),
+                'rating': round(rng.uniform(1, 5), 1),
+                'price': round(rng.uniform(5, 500), 2),
+                'created_at': now - timedelta(minutes=rng.randrange(525600)),
+                'updated_at': now,
+                **extra
+            }
+
+    bulk_insert(hotel, catalog_rows(args.hotels, 'Hotel', {'total_rooms': 500}), batch_size=10000)
+    bulk_insert(restaurant, catalog_rows(args.restaurants, 'Restaurant', {}), batch_size=10000)
+    bulk_insert(torist_place, catalog_rows(args.sites, 'Site', {}), batch_size=10000)
+
+    def booking_rows():
+        for i in range(1, args.bookings + 1):
+            created_at = now - timedelta(minutes=rng.randrange(525600))
+            base_price = round(rng.uniform(20, 2000), 2)
+            row = {
+                'user_id': rng.randint(1, args.users),
+                'number_of_guests': rng.randint(1, 6),
+                'base_price': base_price,
+                'tax_amount': 0.0,
+                'service_fee': base_price * 0.05,
+                'total_price': base_price * 1.05,
+                'currency': 'USD',
+                'payment_status': 'paid',
+                'payment_method': 'stripe',
+                'booking_status': 'confirmed',
+                'confirmation_code': f'YPB{i:010d}',
+                'created_at': created_at,
+                'updated_at': created_at,
+            }
+            if i % 2 and args.hotels:
+                check_in = created_at + timedelta(days=rng.randint(1, 60))
+                row.update(booking_type='hotel', hotel_id=rng.randint(1, args.hotels), number_of_rooms=1,
+                           check_in_date=check_in, check_out_date=check_in + timedelta(days=rng.randint(1, 7)))
+            else:
+                row.update(booking_type='restaurant', restaurant_id=rng.randint(1, max(args.restaurants, 1)),
+                           booking_date=created_at + timedelta(days=rng.randint(1, 30)), booking_time='19:00')
+            yield row
+
+    bulk_insert(booking, booking_rows(), batch_size=10000)
+
+    targets = [('hotel_id', args.hotels), ('restaurant_id', args.restaurants), ('torist_place_id', args.sites)]
+    targets = [(column, count) for column, count in targets if count]
+
+    def review_rows():
+        for _ in range(args.reviews):
+            column, count = rng.choice(targets)
+            created_at = now - timedelta(minutes=rng.randrange(525600))
+            yield {
+                'user_id': rng.randint(1, args.users),
+                column: rng.randint(1, count),
+                'rating': float(rng.randint(1, 5)),
+                'comment': 'Benchmark review',
+                'created_at': created_at,
+                'updated_at': created_at,
+            }
+
+    if targets:
+        bulk_insert(review, review_rows(), batch_size=10000)
+    started = time.perf_counter()
+    ReviewStatsService.rebuild()
+    print(f"  review aggregates rebuilt in {time.perf_counter() - started:.1f}s")
+
+
+def build_requests(args, routes, rng, count):
+    """(route, method, path, body, headers) tuples; identical for both drivers"""
+    from flask_jwt_extended import create_access_token
+    from models import User, hotel
+
+    user_count = User.query.count()
+    hotel_count = hotel.query.count()
+    if not user_count or not hotel_count:
+        sys.exit('The database has no benchmark data; run without --no-seed first')
+
+    tokens = {}
+
+    def auth(user_id):
+        if user_id not in tokens:
+            tokens[user_id] = 'Bearer ' + create_access_token(identity=str(user_id), additional_claims={'role': 'user'})
+        return {'Authorization': tokens[user_id]}
+
+    requests = []
+    for route in routes:
+        for _ in range(count):
+            user_id = rng.randint(1, user_count)
+            if route == 'catalog_search':
+                path = f"/hotel/search?location={rng.choice(LOCATIONS)}&min_price={rng.randrange(0, 400, 25)}&sort=price&per_page=20"
+                requests.append((route, 'GET', path, None, {}))
+            elif route == 'my_bookings':
+                requests.append((route, 'GET', '/booking/my?per_page=20', None, auth(user_id)))
+            elif route == 'create_hotel_booking':
+                check_in = datetime.utcnow().date() + timedelta(days=rng.randint(30, 300))
+                body = {
+                    'hotel_id': rng.randint(1, hotel_count),
+                    'check_in_date': check_in.isoformat(),
+                    'check_out_date': (check_in + timedelta(days=rng.randint(1, 4))).isoformat(),
+                    'number_of_rooms': 1,
+                    'number_of_guests': 2
+                }
+                requests.append((route, 'POST', '/booking/hotel', body, auth(user_id)))
+            elif route == 'login':
+                body = {'email': f'bench{user_id}@example.com', 'password': PASSWORD}
+                requests.append((route, 'POST', '/auth/login', body, {}))
+    return requests
+
+
+def run_testclient(requests):
+    from app import app
+    client = app.test_client()
+    results = []
+    for route, method, path, body, headers in requests:
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body, headers=headers)
+        results.append((route, response.status_code, time.perf_counter() - started))
+    return results
+
+
+def _http_worker(job):
+    url, requests = job
+    parts = urlsplit(url)
+    conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    conn = conn_class(parts.hostname, parts.port)
+    results = []
+    for route, method, path, body, headers in requests:
+        payload = json.dumps(body) if body is not None else None
+        headers = dict(headers, **({'Content-Type': 'application/json'} if payload else {}))
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = conn_class(parts.hostname, parts.port)
+            status = 0
+        results.append((route, status, time.perf_counter() - started))
+    conn.close()
+    return results
+
+
+def run_http(url, requests, processes):
+    jobs = [(url, requests[i::processes]) for i in range(processes)]
+    with multiprocessing.Pool(processes) as pool:
+        return [result for chunk in pool.map(_http_worker, jobs) for result in chunk]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(results, wall_seconds):
+    summary = {}
+    for route in dict.fromkeys(route for route, _, _ in results):
+        timings = sorted(seconds for r, _, seconds in results if r == route)
+        errors = sum(1 for r, status, _ in results if r == route and not 200 <= status < 300)
+        busy = wall_seconds.get(route) or sum(timings)
+        summary[route] = {
+            'requests': len(timings),
+            'errors': errors,
+            'throughput_rps': round(len(timings) / busy, 1) if busy else 0.0,
+            'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 99) * 1000, 2),
+            'max_ms': round(timings[-1] * 1000, 2),
+        }
+    return summary
+
+
+def print_summary(summary):
+    header = f"{'route':<24}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for route, s in summary.items():
+        print(f"{route:<24}{s['requests']:>10}{s['errors']:>8}{s['throughput_rps']:>10}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+
+
+def compare(summary, driver, baseline_path, max_regression):
+    """Returns the routes whose p95 regressed beyond max_regression"""
+    with open(baseline_path) as f:
+        data = json.load(f)
+    if data.get('driver') != driver:
+        print(f"Warning: baseline was measured with the {data.get('driver')} driver, this run with {driver}")
+    baseline = data['routes']
+    regressions = []
+    for route, s in summary.items():
+        before = baseline.get(route)
+        if not before or not before['p95_ms']:
+            continue
+        change = s['p95_ms'] / before['p95_ms'] - 1
+        print(f"{route:<24}p95 {before['p95_ms']} -> {s['p95_ms']} ms ({change:+.0%})")
+        if change > max_regression:
+            regressions.append(route)
+    return regressions
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    routes = [r.strip() for r in args.routes.split(',') if r.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        sys.exit(f"Unknown routes: {', '.join(sorted(unknown))}")
+    rng = random.Random(args.random_seed)
+
+    from app import app
+    with app.app_context():
+        if args.seed:
+            seed(args, rng)
+        warmup = build_requests(args, routes, rng, args.warmup)
+        timed = build_requests(args, routes, rng, args.requests)
+
+    print(f"Driver: {args.driver}, {args.requests} requests per route")
+    wall = {}
+    results = []
+    for route in routes:
+        route_warmup = [r for r in warmup if r[0] == route]
+        route_timed = [r for r in timed if r[0] == route]
+        if args.driver == 'http':
+            run_http(args.url, route_warmup, args.processes)
+            started = time.perf_counter()
+            results.extend(run_http(args.url, route_timed, args.processes))
+        else:
+            run_testclient(route_warmup)
+            started = time.perf_counter()
+            results.extend(run_testclient(route_timed))
+        wall[route] = time.perf_counter() - started
+
+    summary = summarize(results, wall)
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'driver': args.driver,
+                'database': urlsplit(args.database_url).scheme,
+                'created_at': datetime.utcnow().isoformat(),
+                'routes': summary
+            }, f, indent=2)
+    if args.baseline:
+        regressions = compare(summary, args.driver, args.baseline, args.max_regression)
+        if regressions:
+            sys.exit(f"p95 regressed by more than {args.max_regression:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
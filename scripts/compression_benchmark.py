@@ -0,0 +1,138 @@
+"""
+Benchmark response compression on catalog and booking bodies
+
+Builds JSON bodies the way the list endpoints do and reports, for each
+Content-Encoding and level, the compressed size and the best time (like
+timeit) to compress it:
+
+    hotels     one 100-row page of GET /hotel/get_all_hotels
+    bookings   one 100-row page of GET /booking/my
+    export     --rows bookings in one body, like a large export
+
+The database is an in-memory SQLite seeded with --rows hotels and
+bookings with randomized names, descriptions, prices and dates (fixed
+seed), since identical rows would compress far better than real data.
+brotli rows are skipped when brotli is not installed.
+
+Examples:
+    python scripts/compression_benchmark.py
+    python scripts/compression_benchmark.py --rows 20000 --repeat 5
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+WORDS = ('old', 'city', 'view', 'quiet', 'family', 'garden', 'terrace', 'breakfast', 'historic', 'modern',
+         'spacious', 'near', 'market', 'church', 'mosque', 'olive', 'hills', 'valley', 'rooftop', 'pool',
+         'parking', 'free', 'wifi', 'traditional', 'stone', 'house', 'center', 'walk', 'minutes', 'from')
+CITIES = ('Ramallah', 'Bethlehem', 'Jericho', 'Nablus', 'Hebron', 'Jenin', 'Jerusalem', 'Gaza')
+STATUSES = ('pending', 'confirmed', 'cancelled', 'completed')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark gzip/brotli levels on JSON list responses')
+    parser.add_argument('--rows', type=int, default=5000, help='rows seeded, and rows in the export body')
+    parser.add_argument('--repeat', type=int, default=10, help='timed runs per variant')
+    return parser.parse_args()
+
+
+def seed(rows):
+    from models import db, User, hotel, booking
+    from utils.bulk_load import bulk_insert
+
+    rng = random.Random(42)
+    db.create_all()
+    bulk_insert(User, [{'username': 'bench', 'email': 'bench@example.com', 'password': 'x', 'role': 'user'}])
+    now = datetime.utcnow()
+    bulk_insert(hotel, ({
+        'name': f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} Hotel {i}",
+        'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 25))),
+        'location': rng.choice(CITIES), 'rating': round(rng.uniform(1, 5), 1),
+        'price': round(rng.uniform(40, 400), 2), 'total_rooms': rng.randint(5, 200),
+        'latitude': round(rng.uniform(31.2, 32.5), 6), 'longitude': round(rng.uniform(34.9, 35.5), 6),
+        'created_at': now - timedelta(minutes=rng.randint(0, 10 ** 6)), 'updated_at': now
+    } for i in range(rows)))
+    bookings = []
+    for i in range(rows):
+        check_in = now + timedelta(days=rng.randint(1, 365), minutes=rng.randint(0, 1440))
+        base_price = round(rng.uniform(40, 2000), 2)
+        bookings.append({
+            'user_id': 1, 'booking_type': 'hotel', 'hotel_id': rng.randint(1, rows),
+            'number_of_rooms': rng.randint(1, 4), 'number_of_guests': rng.randint(1, 8),
+            'check_in_date': check_in, 'check_out_date': check_in + timedelta(days=rng.randint(1, 14)),
+            'base_price': base_price, 'tax_amount': 0.0, 'service_fee': round(base_price * 0.05, 2),
+            'total_price': round(base_price * 1.05, 2), 'currency': 'USD',
+            'payment_status': 'paid', 'payment_method': 'stripe', 'booking_status': rng.choice(STATUSES),
+            'stripe_payment_intent_id': f"pi_{rng.getrandbits(96):024x}",
+            'confirmation_code': f"YP{rng.getrandbits(48):012X}",
+            'created_at': now - timedelta(minutes=rng.randint(0, 10 ** 6)), 'updated_at': now
+        })
+    bulk_insert(booking, bookings)
+
+
+def bodies(app, rows):
+    from models import hotel, booking
+    from utils.projection import project, project_dicts
+
+    def page(model, key, limit):
+        items = project_dicts(model, project(model.query, model).order_by(model.id).limit(limit))
+        return app.json.response({key: items}).get_data()
+
+    yield 'hotels', page(hotel, 'hotels', 100)
+    yield 'bookings', page(booking, 'bookings', 100)
+    yield 'export', page(booking, 'bookings', rows)
+
+
+def variants():
+    from services.compression import brotli
+
+    for level in (1, 6, 9):
+        yield 'gzip', f'gzip {level}', {'gzip_level': level}
+    if brotli is not None:
+        for quality in (1, 4, 6):
+            yield 'br', f'br {quality}', {'brotli_quality': quality}
+
+
+def main():
+    args = parse_args()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-change-me-0123456789')
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+    os.environ['STRIPE_BACKEND'] = 'fake'
+
+    from app import app
+    from services.compression import Compression
+
+    with app.app_context():
+        seed(args.rows)
+        print(f"best of {args.repeat} runs")
+        header = f"{'body':<10}{'encoding':<10}{'bytes':>10}{'ratio':>8}{'ms':>10}{'MB/s':>8}"
+        print(header)
+        print('-' * len(header))
+        for body_name, body in bodies(app, args.rows):
+            print(f"{body_name:<10}{'identity':<10}{len(body):>10}{1:>7.1f}x{0:>10.2f}{'-':>8}")
+            for encoding, name, settings in variants():
+                compression = Compression()
+                for setting, value in settings.items():
+                    setattr(compression, setting, value)
+                compressed = compression.compress(body, encoding)
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    compression.compress(body, encoding)
+                    timings.append(time.perf_counter() - started)
+                best = min(timings)
+                print(f"{body_name:<10}{name:<10}{len(compressed):>10}{len(body) / len(compressed):>7.1f}x"
+                      f"{best * 1000:>10.2f}{len(body) / best / 1e6:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,22 @@
+"""
+Seed demo data or bulk-load CSV/JSONL files
+
+    python scripts/seed.py                                  demo rows for local development
+    python scripts/seed.py load hotels data/hotels.csv      stream a file into a table
+    python scripts/seed.py load bookings data/bookings.jsonl --skip-conflicts --batch-size 20000
+
+Entities: users, hotels, restaurants, sites, bookings, reviews. Column
+names match the model attributes; CSV files need a header row. For users
+a plain `password` column is hashed, once per distinct password. Hotels,
+restaurants and sites get their geohash from latitude/longitude. Bookings
+without a confirmation_code or total_price get them filled in as the API
+would. Loading reviews rebuilds the review aggregates afterwards.
+"""
 from datetime import datetime, timedelta
+import argparse
 import os
 import random
+import secrets
 import sys
 
 # Ensure project root is on sys.path
@@ -10,7 +26,23 @@ if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
 from app import app
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
 from models import db, User, torist_place, hotel, restaurant, booking, review, trips
+from services.review_stats import ReviewStatsService
+from utils.bulk_load import bulk_insert, read_rows
+from utils import geohash
+from utils.validation import ValidationError
+
+
+ENTITIES = {
+    'users': User,
+    'hotels': hotel,
+    'restaurants': restaurant,
+    'sites': torist_place,
+    'bookings': booking,
+    'reviews': review,
+}
 
 
 def get_or_create_user(username: str, email: str, role: str = 'user', password: str = 'Password@123') -> User:
@@ -24,61 +56,41 @@ def get_or_create_user(username: str, email: str, role: str = 'user', password:
     return user
 
 
+def _create_missing(model, samples: list) -> list:
+    """Insert the samples whose name is not taken yet; one lookup and one multi-row insert"""
+    names = [s["name"] for s in samples]
+    existing = {row.name for row in db.session.query(model.name).filter(model.name.in_(names))}
+    missing = [s for s in samples if s["name"] not in existing]
+    if missing:
+        bulk_insert(model, prepare_places(missing), use_copy=False)
+    return model.query.filter(model.name.in_(names)).order_by(model.id).all()
+
+
 def create_hotels() -> list:
     samples = [
-        {"name": "Bethlehem Suites", "description": "Cozy stay near Nativity Church", "location": "Bethlehem", "rating": 4.5, "price": 120.0},
-        {"name": "Jerusalem View Hotel", "description": "Panoramic city views", "location": "Jerusalem", "rating": 4.7, "price": 180.0},
-        {"name": "Ramallah Residence", "description": "Business-friendly rooms", "location": "Ramallah", "rating": 4.2, "price": 90.0},
+        {"name": "Bethlehem Suites", "description": "Cozy stay near Nativity Church", "location": "Bethlehem", "rating": 4.5, "price": 120.0, "latitude": 31.7054, "longitude": 35.2024},
+        {"name": "Jerusalem View Hotel", "description": "Panoramic city views", "location": "Jerusalem", "rating": 4.7, "price": 180.0, "latitude": 31.7767, "longitude": 35.2345},
+        {"name": "Ramallah Residence", "description": "Business-friendly rooms", "location": "Ramallah", "rating": 4.2, "price": 90.0, "latitude": 31.9038, "longitude": 35.2034},
     ]
-    created = []
-    for s in samples:
-        existing = hotel.query.filter_by(name=s["name"]).first()
-        if existing:
-            created.append(existing)
-            continue
-        h = hotel(**s)
-        db.session.add(h)
-        created.append(h)
-    db.session.commit()
-    return created
+    return _create_missing(hotel, samples)
 
 
 def create_restaurants() -> list:
     samples = [
-        {"name": "Falafel House", "description": "Best falafel in town", "location": "Jerusalem", "rating": 4.6, "price": 10.0},
-        {"name": "Olive Tree Diner", "description": "Traditional Palestinian dishes", "location": "Bethlehem", "rating": 4.4, "price": 15.0},
-        {"name": "Cedar Garden", "description": "Family-friendly meals", "location": "Ramallah", "rating": 4.1, "price": 12.0},
+        {"name": "Falafel House", "description": "Best falafel in town", "location": "Jerusalem", "rating": 4.6, "price": 10.0, "latitude": 31.7781, "longitude": 35.2296},
+        {"name": "Olive Tree Diner", "description": "Traditional Palestinian dishes", "location": "Bethlehem", "rating": 4.4, "price": 15.0, "latitude": 31.7043, "longitude": 35.2065},
+        {"name": "Cedar Garden", "description": "Family-friendly meals", "location": "Ramallah", "rating": 4.1, "price": 12.0, "latitude": 31.9066, "longitude": 35.2009},
     ]
-    created = []
-    for s in samples:
-        existing = restaurant.query.filter_by(name=s["name"]).first()
-        if existing:
-            created.append(existing)
-            continue
-        r = restaurant(**s)
-        db.session.add(r)
-        created.append(r)
-    db.session.commit()
-    return created
+    return _create_missing(restaurant, samples)
 
 
 def create_sites() -> list:
     samples = [
-        {"name": "Nativity Church", "description": "Historic basilica", "location": "Bethlehem", "rating": 4.8, "price": 25.0},
-        {"name": "Al-Aqsa Mosque", "description": "Iconic holy site", "location": "Jerusalem", "rating": 4.9, "price": 30.0},
-        {"name": "Old City Market", "description": "Traditional souks", "location": "Jerusalem", "rating": 4.5, "price": 0.0},
+        {"name": "Nativity Church", "description": "Historic basilica", "location": "Bethlehem", "rating": 4.8, "price": 25.0, "latitude": 31.7043, "longitude": 35.2075},
+        {"name": "Al-Aqsa Mosque", "description": "Iconic holy site", "location": "Jerusalem", "rating": 4.9, "price": 30.0, "latitude": 31.7761, "longitude": 35.2358},
+        {"name": "Old City Market", "description": "Traditional souks", "location": "Jerusalem", "rating": 4.5, "price": 0.0, "latitude": 31.7784, "longitude": 35.2316},
     ]
-    created = []
-    for s in samples:
-        existing = torist_place.query.filter_by(name=s["name"]).first()
-        if existing:
-            created.append(existing)
-            continue
-        t = torist_place(**s)
-        db.session.add(t)
-        created.append(t)
-    db.session.commit()
-    return created
+    return _create_missing(torist_place, samples)
 
 
 def create_bookings(user: User, hotels: list, restaurants: list) -> list:
@@ -161,7 +173,85 @@ def create_trips(user: User, sites: list, hotels: list, restaurants: list) -> li
     return created
 
 
+def prepare_users(rows):
+    """Hash plain `password` values, each distinct password only once"""
+    hashes = {}
+    for row in rows:
+        password = row.get('password')
+        if password and not password.startswith(('pbkdf2:', 'scrypt:')):
+            if password not in hashes:
+                hashes[password] = generate_password_hash(password)
+            row['password'] = hashes[password]
+        yield row
+
+
+def prepare_places(rows):
+    """Fill geohash from latitude/longitude; bulk inserts bypass the ORM hook that normally does it"""
+    for row in rows:
+        if row.get('latitude') not in (None, '') and row.get('longitude') not in (None, ''):
+            row['geohash'] = geohash.encode(float(row['latitude']), float(row['longitude']))
+        yield row
+
+
+def prepare_bookings(rows):
+    for row in rows:
+        if not row.get('confirmation_code'):
+            row['confirmation_code'] = f"YP{secrets.token_hex(6).upper()}"
+        if row.get('base_price') not in (None, '') and row.get('total_price') in (None, ''):
+            # Same rule as booking.calculate_total_price
+            base_price = float(row['base_price'])
+            row['service_fee'] = base_price * 0.05
+            row['tax_amount'] = 0.0
+            row['total_price'] = base_price + row['service_fee']
+        yield row
+
+
+PREPARE = {'users': prepare_users, 'bookings': prepare_bookings,
+           'hotels': prepare_places, 'restaurants': prepare_places, 'sites': prepare_places}
+
+
+def load(args):
+    model = ENTITIES[args.entity]
+    rows = read_rows(args.path, args.format)
+    if args.entity in PREPARE:
+        rows = PREPARE[args.entity](rows)
+    with app.app_context():
+        db.create_all()
+        try:
+            bulk_insert(model, rows, batch_size=args.batch_size,
+                        skip_conflicts=args.skip_conflicts, use_copy=not args.no_copy)
+        except ValidationError as e:
+            sys.exit(f"Load failed: {e.message}")
+        except IntegrityError as e:
+            sys.exit(f"Load failed: {e.orig}. Batches before this one were committed; "
+                     f"rerun with --skip-conflicts to skip rows that already exist.")
+        if model is review:
+            ReviewStatsService.rebuild()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Seed demo data or bulk-load CSV/JSONL files')
+    commands = parser.add_subparsers(dest='command')
+    loader = commands.add_parser('load', help='stream a CSV or JSONL file into a table')
+    loader.add_argument('entity', choices=sorted(ENTITIES))
+    loader.add_argument('path', help="CSV or JSONL file, or - for standard input")
+    loader.add_argument('--format', choices=('csv', 'jsonl'), help='defaults to the file extension')
+    loader.add_argument('--batch-size', type=int, default=5000)
+    loader.add_argument('--skip-conflicts', action='store_true',
+                        help='drop rows that clash with a unique key instead of failing')
+    loader.add_argument('--no-copy', action='store_true', help='use INSERT even on PostgreSQL')
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    if args.command == 'load':
+        load(args)
+        return
+    seed_demo()
+
+
+def seed_demo():
     with app.app_context():
         # Ensure tables exist
         db.create_all()
@@ -176,6 +266,7 @@ def main():
 
         create_bookings(user, hotels, restaurants)
         create_reviews(user, sites, hotels, restaurants)
+        ReviewStatsService.rebuild()
         create_trips(user, sites, hotels, restaurants)
 
         print('Seeding completed successfully.')
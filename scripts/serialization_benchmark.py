@@ -0,0 +1,114 @@
+"""
+Benchmark response serialization on large catalog and booking pages
+
+Loads the same page of rows four ways and reports the best time (like
+timeit) to go from a query to a JSON response body:
+
+    orm+stdlib        ORM instances, to_dict(), Flask's stdlib JSON provider
+    orm+orjson        ORM instances, to_dict(), the orjson provider
+    projected+stdlib  project() row tuples, row_dict(), stdlib provider
+    projected+orjson  project() row tuples, row_dict(), orjson provider
+
+The database is an in-memory SQLite seeded with --rows hotels and
+bookings, so the numbers isolate ORM and encoding cost from network and
+disk. orjson rows are skipped when orjson is not installed.
+
+Examples:
+    python scripts/serialization_benchmark.py
+    python scripts/serialization_benchmark.py --rows 1000 --repeat 50
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark to_dict()/jsonify against projected rows and orjson')
+    parser.add_argument('--rows', type=int, default=1000, help='rows per page')
+    parser.add_argument('--repeat', type=int, default=30, help='timed runs per variant')
+    return parser.parse_args()
+
+
+def seed(rows):
+    from models import db, User, hotel, booking
+    from utils.bulk_load import bulk_insert
+
+    db.create_all()
+    bulk_insert(User, [{'username': 'bench', 'email': 'bench@example.com', 'password': 'x', 'role': 'user'}])
+    now = datetime.utcnow()
+    bulk_insert(hotel, ({
+        'name': f'Hotel {i}', 'description': f'Hotel number {i}', 'location': 'Ramallah',
+        'rating': 4.0, 'price': 100.0 + i, 'total_rooms': 20, 'latitude': 31.9, 'longitude': 35.2,
+        'created_at': now - timedelta(minutes=i), 'updated_at': now
+    } for i in range(rows)))
+    bulk_insert(booking, ({
+        'user_id': 1, 'booking_type': 'hotel', 'hotel_id': i % rows + 1, 'number_of_rooms': 1,
+        'number_of_guests': 2, 'check_in_date': now + timedelta(days=30), 'check_out_date': now + timedelta(days=32),
+        'base_price': 200.0, 'tax_amount': 0.0, 'service_fee': 10.0, 'total_price': 210.0, 'currency': 'USD',
+        'payment_status': 'paid', 'payment_method': 'stripe', 'booking_status': 'confirmed',
+        'confirmation_code': f'YPB{i:010d}', 'created_at': now - timedelta(minutes=i), 'updated_at': now
+    } for i in range(rows)))
+
+
+def variants(app, model, rows):
+    from flask.json.provider import DefaultJSONProvider
+    from models import db
+    from utils.json_provider import OrjsonProvider, orjson
+    from utils.projection import project, project_dicts
+
+    providers = {'stdlib': DefaultJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+    key = model.__tablename__
+
+    def orm():
+        db.session.expunge_all()
+        return [obj.to_dict() for obj in model.query.order_by(model.id).limit(rows)]
+
+    def projected():
+        return project_dicts(model, project(model.query, model).order_by(model.id).limit(rows))
+
+    for load_name, load in (('orm', orm), ('projected', projected)):
+        for provider_name, provider in providers.items():
+            yield f"{load_name}+{provider_name}", lambda load=load, provider=provider: provider.response({key: load()}).get_data()
+
+
+def main():
+    args = parse_args()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret-key-change-me-0123456789')
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+    os.environ['STRIPE_BACKEND'] = 'fake'
+
+    from app import app
+    from models import hotel, booking
+
+    with app.app_context():
+        seed(args.rows)
+        print(f"{args.rows} rows per page, best of {args.repeat} runs")
+        header = f"{'page':<10}{'variant':<20}{'ms':>10}{'speedup':>10}{'bytes':>10}"
+        print(header)
+        print('-' * len(header))
+        for model in (hotel, booking):
+            baseline = None
+            for name, run in variants(app, model, args.rows):
+                body = run()
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    run()
+                    timings.append(time.perf_counter() - started)
+                best = min(timings) * 1000
+                baseline = baseline or best
+                print(f"{model.__tablename__:<10}{name:<20}{best:>10.2f}{baseline / best:>9.1f}x{len(body):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import csv
+import io
+from datetime import timedelta
+from sqlalchemy import select
+from sqlalchemy.types import Date, DateTime
+from models import db, booking
+from utils.projection import project_dicts, parse_fields
+from utils.validation import ValidationError, parse_date, parse_include
+
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+DATE_FIELDS = ('created_at', 'payment_date', 'check_in_date', 'booking_date')
+BOOKING_STATUSES = ('pending', 'confirmed', 'cancelled', 'completed')
+PAYMENT_STATUSES = ('pending', 'creating', 'processing', 'paid', 'failed', 'refunded')
+BATCH_SIZE = 1000
+# Columns customers type into; spreadsheets evaluate cells starting with _FORMULA_PREFIXES
+FREE_TEXT_COLUMNS = ('special_requests', 'cancellation_reason', 'booking_time')
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _int_arg(args, name):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError(f"{name} must be an integer", 400)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _csv_text(value):
+    if value and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_converters(columns):
+    """Per-column conversion of a raw row for CSV, None where the value is written as is"""
+    converters = []
+    for name in columns:
+        if isinstance(booking.__table__.c[name].type, (Date, DateTime)):
+            converters.append(_isoformat)
+        elif name in FREE_TEXT_COLUMNS:
+            converters.append(_csv_text)
+        else:
+            converters.append(None)
+    return converters
+
+
+class BookingExportService:
+    """Streams booking rows out of the database as NDJSON or CSV with flat memory use"""
+
+    @staticmethod
+    def parse_filters(args):
+        """
+        Read export filters from query args
+
+        Supported args: start_date / end_date (YYYY-MM-DD, inclusive) on
+        date_field (created_at by default, or payment_date, check_in_date,
+        booking_date), booking_status and payment_status (comma-separated),
+        booking_type, hotel_id, restaurant_id, and after_id to resume an
+        interrupted export after the last id received.
+        """
+        date_field = args.get('date_field') or 'created_at'
+        if date_field not in DATE_FIELDS:
+            raise ValidationError(f"date_field must be one of: {', '.join(DATE_FIELDS)}", 400)
+        filters = {
+            'date_field': date_field,
+            'start_date': parse_date(args['start_date'], 'start_date') if args.get('start_date') else None,
+            'end_date': parse_date(args['end_date'], 'end_date') if args.get('end_date') else None,
+            'booking_status': parse_include(args.get('booking_status'), BOOKING_STATUSES, 'booking_status'),
+            'payment_status': parse_include(args.get('payment_status'), PAYMENT_STATUSES, 'payment_status'),
+            'booking_type': args.get('booking_type') or None,
+            'hotel_id': _int_arg(args, 'hotel_id'),
+            'restaurant_id': _int_arg(args, 'restaurant_id'),
+            'after_id': _int_arg(args, 'after_id'),
+        }
+        if filters['booking_type'] not in (None, 'hotel', 'restaurant'):
+            raise ValidationError("booking_type must be hotel or restaurant", 400)
+        if filters['start_date'] and filters['end_date'] and filters['start_date'] > filters['end_date']:
+            raise ValidationError('end_date must not be before start_date', 400)
+        return filters
+
+    @staticmethod
+    def columns(fields=None):
+        """Exported columns in to_dict() order"""
+        return [name for name in booking.DICT_COLUMNS if fields is None or name in fields]
+
+    @staticmethod
+    def statement(filters, fields=None):
+        """SELECT of the exported columns in id order, so after_id can resume it"""
+        columns = BookingExportService.columns(fields)
+        stmt = select(*(getattr(booking, name) for name in columns)).order_by(booking.id)
+        date_column = getattr(booking, filters['date_field'])
+        if filters['start_date']:
+            stmt = stmt.where(date_column >= filters['start_date'])
+        if filters['end_date']:
+            stmt = stmt.where(date_column < filters['end_date'] + timedelta(days=1))
+        if filters['booking_status']:
+            stmt = stmt.where(booking.booking_status.in_(sorted(filters['booking_status'])))
+        if filters['payment_status']:
+            stmt = stmt.where(booking.payment_status.in_(sorted(filters['payment_status'])))
+        for name in ('booking_type', 'hotel_id', 'restaurant_id'):
+            if filters[name] is not None:
+                stmt = stmt.where(getattr(booking, name) == filters[name])
+        if filters['after_id'] is not None:
+            stmt = stmt.where(booking.id > filters['after_id'])
+        return stmt
+
+    @staticmethod
+    def batches(filters, fields=None, batch_size=BATCH_SIZE):
+        """
+        Yield lists of up to batch_size rows
+
+        yield_per makes the query run on a server-side cursor
+        (stream_results) where the driver supports one, e.g. psycopg2, so
+        only one batch of rows is held at a time however many match.
+        """
+        result = db.session.execute(
+            BookingExportService.statement(filters, fields).execution_options(yield_per=batch_size))
+        try:
+            yield from result.partitions()
+        finally:
+            result.close()
+
+    @staticmethod
+    def ndjson(batches, dumps, fields=None):
+        """One to_dict() JSON object per line, one string per batch"""
+        for rows in batches:
+            yield ''.join(dumps(row) + '\n' for row in project_dicts(booking, rows, fields))
+
+    @staticmethod
+    def csv(batches, fields=None):
+        """A header line, then one string of CSV lines per batch"""
+        columns = BookingExportService.columns(fields)
+        converters = _csv_converters(columns)
+        convert = [index for index, converter in enumerate(converters) if converter]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        for rows in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            for row in rows:
+                values = list(row)
+                for index in convert:
+                    values[index] = converters[index](values[index])
+                writer.writerow(values)
+            yield buffer.getvalue()
+
+    @staticmethod
+    def export(args, dumps):
+        """
+        (chunks, mimetype) for an export request; filters and fields are
+        validated here, before the response starts
+        """
+        export_format = args.get('format') or 'ndjson'
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError(f"format must be one of: {', '.join(EXPORT_FORMATS)}", 400)
+        filters = BookingExportService.parse_filters(args)
+        fields = parse_fields(args, booking)
+        batches = BookingExportService.batches(filters, fields)
+        if export_format == 'csv':
+            return BookingExportService.csv(batches, fields), EXPORT_FORMATS['csv']
+        return BookingExportService.ndjson(batches, dumps, fields), EXPORT_FORMATS['ndjson']
@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import or_, update
+from models import db, booking, booking_group
+from services.group_booking import GroupBookingService
+from services.inventory_service import InventoryService
+from services.stripe_service import StripeService
+
+
+# Unpaid states that still hold rooms or seats
+HELD_STATUSES = ('pending', 'creating', 'processing', 'failed')
+EXPIRED_REASON = 'Payment not completed in time'
+
+
+class BookingHolds:
+    """
+    Gives back the rooms and seats of bookings that were never paid
+
+    A booking holds its inventory from the moment its row is created, so
+    a booking left unpaid (never confirmed, or with a failed card) would
+    keep a hotel or slot off availability for good. After
+    BOOKING_HOLD_MINUTES such bookings and groups are cancelled and their
+    inventory released.
+
+    The sweep runs at most every BOOKING_HOLD_SWEEP_SECONDS per worker,
+    started from a before_request hook on a background thread with its
+    own session, so no request waits for it or shares its transaction.
+    A PaymentIntent is cancelled at Stripe before its booking is
+    released; if that fails (e.g. the payment just succeeded) the
+    booking is left for the webhook. Each expiry is a conditional UPDATE
+    on the status it was read with, so a booking that a payment job or
+    webhook moved meanwhile is skipped.
+    """
+
+    BATCH_SIZE = 100
+
+    def __init__(self):
+        self.app = None
+        self.hold_for = timedelta(minutes=30)
+        self.sweep_interval = 60.0
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.hold_for = timedelta(minutes=int(app.config.get('BOOKING_HOLD_MINUTES', 30)))
+        self.sweep_interval = float(app.config.get('BOOKING_HOLD_SWEEP_SECONDS', 60))
+        app.before_request(self.maybe_sweep)
+        app.extensions['booking_holds'] = self
+
+    def maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval or not self._lock.acquire(blocking=False):
+            return
+        self._last_sweep = now
+        threading.Thread(target=self._run, name='booking-holds', daemon=True).start()
+
+    def _run(self):
+        try:
+            with self.app.app_context():
+                self.release_expired()
+        except Exception:
+            self.app.logger.exception("Releasing expired booking holds failed")
+        finally:
+            self._lock.release()
+
+    def release_expired(self, now=None):
+        """
+        Cancel unpaid bookings and groups older than the hold time, committing each
+
+        Returns:
+            number of bookings and groups released
+        """
+        cutoff = (now or datetime.utcnow()) - self.hold_for
+        released = 0
+        for model, release in ((booking, self._release_booking), (booking_group, self._release_group)):
+            query = model.query.filter(
+                model.payment_status.in_(HELD_STATUSES),
+                model.created_at < cutoff,
+                # A claimed payment job is only given up once it is as old as the hold
+                or_(model.payment_status != 'creating', model.updated_at < cutoff)
+            )
+            if model is booking:
+                query = query.filter(booking.group_id.is_(None), booking.booking_status == 'pending')
+            for obj in query.order_by(model.id).limit(self.BATCH_SIZE).all():
+                if self._cancel_intent(obj.stripe_payment_intent_id) and self._expire(model, obj):
+                    release(obj)
+                    db.session.commit()
+                    released += 1
+                else:
+                    db.session.rollback()
+        return released
+
+    @staticmethod
+    def _cancel_intent(payment_intent_id):
+        """True when there is no intent, or it is cancelled and can no longer be paid"""
+        if not payment_intent_id:
+            return True
+        if StripeService.cancel_payment_intent(payment_intent_id)['success']:
+            return True
+        intent = StripeService.retrieve_payment_intent(payment_intent_id)
+        return intent['success'] and intent['status'] == 'canceled'
+
+    @staticmethod
+    def _expire(model, obj):
+        """Mark obj failed if its payment status is still the one it was read with"""
+        criteria = [model.id == obj.id, model.payment_status == obj.payment_status]
+        values = {'payment_status': 'failed', 'updated_at': datetime.utcnow()}
+        if model is booking:
+            criteria.append(booking.booking_status == 'pending')
+            values.update(booking_status='cancelled', cancelled_at=datetime.utcnow(), cancellation_reason=EXPIRED_REASON)
+        result = db.session.execute(update(model).where(*criteria).values(**values)
+                                    .execution_options(synchronize_session=False))
+        return result.rowcount == 1
+
+    @staticmethod
+    def _release_booking(booking_obj):
+        InventoryService.release_booking(booking_obj)
+
+    @staticmethod
+    def _release_group(group):
+        db.session.refresh(group)
+        GroupBookingService.cancel(group, EXPIRED_REASON)
+
+
+booking_holds = BookingHolds()
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from services.local_redis import redis_from_url
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries=2048, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires <= time.time():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.time() + (ttl or self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def version(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def bump(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class RedisCache:
+    """Cache backend on top of a redis-py compatible client, values stored as JSON"""
+
+    def __init__(self, client, ttl=60, prefix='yp:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return _MISSING if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value, default=str), ex=ttl or self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def version(self, key):
+        raw = self.client.get(self.prefix + key)
+        return int(raw) if raw is not None else 0
+
+    def bump(self, key):
+        self.client.incr(self.prefix + key)
+
+    def clear(self):
+        pass
+
+
+class CatalogCache:
+    """
+    Read-through cache for catalog reads (hotels, restaurants, sites)
+
+    Single rows and query results are cached under a per-table version
+    which is bumped on any write to the table, so stale entries are never
+    served and simply age out. Writes are picked up from SQLAlchemy session
+    events, so the existing create/update/delete handlers need no
+    changes.
+
+    With the in-process backend every gunicorn worker keeps its own
+    copy, so another worker may serve a stale row for up to CACHE_TTL
+    seconds; use the Redis backend when that matters.
+    """
+
+    def __init__(self):
+        self.backend = LRUCache()
+        self.enabled = True
+        self.tables = set()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app, models=()):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        ttl = int(app.config.get('CACHE_TTL', 60))
+        self.enabled = backend != 'none'
+        if backend == 'redis':
+            self.backend = RedisCache(redis_from_url(app.config['CACHE_REDIS_URL']), ttl=ttl)
+        else:
+            self.backend = LRUCache(max_entries=int(app.config.get('CACHE_MAX_ENTRIES', 2048)), ttl=ttl)
+        self.tables = {model.__tablename__ for model in models}
+
+        if not event.contains(Session, 'after_flush', _collect_changes):
+            event.listen(Session, 'after_flush', _collect_changes)
+            event.listen(Session, 'after_commit', _invalidate_committed)
+            event.listen(Session, 'after_soft_rollback', _discard_changes)
+        app.extensions['catalog_cache'] = self
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def get_or_load(self, key, loader):
+        if not self.enabled:
+            return loader()
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            self._count('hits')
+            return value
+        self._count('misses')
+        value = loader()
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    def _version(self, table):
+        return self.backend.version(f"catalog:{table}:version") if self.enabled else 0
+
+    def entity(self, model, entity_id, loader):
+        """
+        Cached single-row read; loader returns to_dict() or None
+
+        Keyed by the integer id, so '7' and '07' share one entry (None for
+        an id that is not an integer), and by the table version read before
+        loading: a row loaded just before a write commits is stored under
+        the old version, which nothing reads any more, rather than
+        re-cached after the invalidation.
+        """
+        try:
+            entity_id = int(entity_id)
+        except (TypeError, ValueError):
+            return None
+        table = model.__tablename__
+        return self.get_or_load(f"catalog:{table}:v{self._version(table)}:id:{entity_id}", loader)
+
+    def query(self, model, name, args, loader):
+        """Cached query read keyed by the table version and the request args"""
+        table = model.__tablename__
+        items = args.items(multi=True) if hasattr(args, 'getlist') else args.items()
+        digest = hashlib.sha1(json.dumps(sorted(items)).encode()).hexdigest()
+        return self.get_or_load(f"catalog:{table}:v{self._version(table)}:{name}:{digest}", loader)
+
+    def invalidate(self, table):
+        """Bump the table version; every cached row and query of the table is then unreachable"""
+        self.backend.bump(f"catalog:{table}:version")
+        self._count('invalidations')
+
+
+catalog_cache = CatalogCache()
+
+
+def _collect_changes(session, flush_context):
+    if not catalog_cache.tables:
+        return
+    changed = session.info.setdefault('catalog_changes', {})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table in catalog_cache.tables:
+            changed.setdefault(table, set()).add(obj.id)
+
+
+def mark_changed(session, table, ids):
+    """
+    Queue invalidation of catalog rows changed by bulk SQL (UPDATE ... WHERE)
+
+    ORM flushes are tracked automatically; statements executed directly
+    are not, so callers register the rows here. Entries are dropped when
+    the transaction commits, like flushed changes.
+    """
+    session.info.setdefault('catalog_changes', {}).setdefault(table, set()).update(ids)
+
+
+def _invalidate_committed(session):
+    changed = session.info.pop('catalog_changes', None)
+    if not changed or not catalog_cache.enabled:
+        return
+    for table in changed:
+        catalog_cache.invalidate(table)
+
+
+def _discard_changes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('catalog_changes', None)
@@ -0,0 +1,115 @@
+import zlib
+from flask import request
+
+try:
+    import brotli  # optional dependency; without it only gzip is offered
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/plain', 'text/html', 'text/css', 'text/csv',
+}
+
+
+class Compression:
+    """
+    gzip/brotli response compression negotiated with Accept-Encoding
+
+    Buffered responses (jsonify) smaller than COMPRESSION_MIN_SIZE are
+    sent as they are: below about a kilobyte the headers and CPU time
+    outweigh the bytes saved. Larger ones are compressed in one call.
+    Streamed responses (generators) are compressed chunk by chunk as
+    they are produced, so neither the body nor its compressed form is
+    ever held in memory whole; they are sent chunked without a
+    Content-Length.
+
+    brotli is preferred when the client accepts it equally and the
+    brotli package is installed. Levels default to the cheap end
+    (gzip 6, brotli quality 4), where most of the size reduction on JSON
+    is already had; higher levels cost several times the CPU for a few
+    percent.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 4
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESSION_ENABLED', True)
+        self.min_size = int(app.config.get('COMPRESSION_MIN_SIZE', 1024))
+        self.gzip_level = int(app.config.get('COMPRESSION_GZIP_LEVEL', 6))
+        self.brotli_quality = int(app.config.get('COMPRESSION_BROTLI_QUALITY', 4))
+        if not self.enabled:
+            return
+        app.after_request(self._after_request)
+        app.extensions['compression'] = self
+
+    def encodings(self):
+        """Content-Encodings this server can produce, most preferred first"""
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def compressor(self, encoding):
+        """(compress(bytes) -> bytes, finish() -> bytes) for one response body"""
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.finish
+        # wbits 31: zlib stream with a gzip header and trailer
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+
+    def compress(self, data, encoding):
+        compress, finish = self.compressor(encoding)
+        return compress(data) + finish()
+
+    def stream(self, chunks, encoding):
+        """Compress an iterable of body chunks lazily, closing it when done"""
+        compress, finish = self.compressor(encoding)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = compress(chunk)
+                if data:
+                    yield data
+            yield finish()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _compressible(self, response):
+        if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        if response.cache_control.no_transform:
+            return False
+        return response.mimetype in COMPRESSIBLE_TYPES
+
+    def _after_request(self, response):
+        if not self._compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings())
+        if encoding is None:
+            return response
+        if not response.is_streamed and (response.content_length or 0) < self.min_size:
+            return response
+
+        if response.is_streamed:
+            response.response = self.stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(self.compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        # A strong ETag names exact bytes; the compressed body is a different representation
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compression = Compression()
@@ -0,0 +1,130 @@
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+
+class _StripeObject(dict):
+    """dict with attribute access, like the objects returned by the stripe library"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class _Store:
+    lock = threading.Lock()
+    payment_intents = {}
+    idempotency = {}
+
+
+def _latency():
+    # Simulated provider round trip, e.g. FAKE_STRIPE_LATENCY_MS=300 for load tests
+    delay = float(os.getenv('FAKE_STRIPE_LATENCY_MS', 0))
+    if delay:
+        time.sleep(delay / 1000)
+
+
+class PaymentIntent:
+
+    @staticmethod
+    def create(amount, currency, metadata=None, idempotency_key=None, **kwargs):
+        _latency()
+        with _Store.lock:
+            if idempotency_key and idempotency_key in _Store.idempotency:
+                return _Store.payment_intents[_Store.idempotency[idempotency_key]]
+            intent_id = f"pi_fake_{secrets.token_hex(8)}"
+            intent = _StripeObject(
+                id=intent_id,
+                object='payment_intent',
+                amount=amount,
+                currency=currency,
+                metadata=metadata or {},
+                status='requires_payment_method',
+                client_secret=f"{intent_id}_secret_{secrets.token_hex(8)}",
+                payment_method=None,
+                latest_charge=None,
+                created=int(time.time())
+            )
+            _Store.payment_intents[intent_id] = intent
+            if idempotency_key:
+                _Store.idempotency[idempotency_key] = intent_id
+            return intent
+
+    @staticmethod
+    def retrieve(payment_intent_id):
+        _latency()
+        return _Store.payment_intents[payment_intent_id]
+
+    @staticmethod
+    def confirm(payment_intent_id):
+        _latency()
+        intent = _Store.payment_intents[payment_intent_id]
+        intent['status'] = 'succeeded'
+        intent['payment_method'] = 'pm_fake_card'
+        intent['latest_charge'] = f"ch_fake_{secrets.token_hex(8)}"
+        return intent
+
+    @staticmethod
+    def cancel(payment_intent_id):
+        _latency()
+        intent = _Store.payment_intents[payment_intent_id]
+        intent['status'] = 'canceled'
+        return intent
+
+
+class Refund:
+
+    @staticmethod
+    def create(payment_intent, amount=None, reason=None):
+        _latency()
+        intent = _Store.payment_intents[payment_intent]
+        return _StripeObject(
+            id=f"re_fake_{secrets.token_hex(8)}",
+            amount=amount if amount is not None else intent['amount'],
+            currency=intent['currency'],
+            status='succeeded',
+            reason=reason
+        )
+
+
+class Customer:
+
+    @staticmethod
+    def create(email, name=None, metadata=None):
+        _latency()
+        return _StripeObject(id=f"cus_fake_{secrets.token_hex(8)}", email=email, name=name, metadata=metadata or {})
+
+
+class Webhook:
+
+    @staticmethod
+    def sign(payload, secret, timestamp=None):
+        """Build a Stripe-Signature header for payload (handy for tests)"""
+        timestamp = timestamp or int(time.time())
+        if isinstance(payload, str):
+            payload = payload.encode()
+        signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+        return f"t={timestamp},v1={signature}"
+
+    @staticmethod
+    def construct_event(payload, sig_header, secret, tolerance=300):
+        """Same contract as stripe.Webhook.construct_event: ValueError on bad JSON"""
+        if isinstance(payload, bytes):
+            payload = payload.decode()
+        event = json.loads(payload)
+        parts = dict(item.split('=', 1) for item in (sig_header or '').split(',') if '=' in item)
+        expected = Webhook.sign(payload, secret, int(parts.get('t', 0))).split('v1=')[1]
+        if not hmac.compare_digest(expected, parts.get('v1', '')) \
+                or abs(time.time() - int(parts.get('t', 0))) > tolerance:
+            raise SignatureVerificationError('Invalid signature')
+        return event
+
+
+class SignatureVerificationError(Exception):
+    pass
@@ -0,0 +1,189 @@
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter
+from sqlalchemy import event, func, literal, text
+from models import db
+from services.cache import catalog_cache
+from utils.validation import ValidationError, parse_limit
+
+
+FUZZY_FIELDS = ('name', 'location')
+MAX_LIMIT = 50
+_WORD = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def wants_fuzzy(args):
+    return str(args.get('fuzzy', '')).lower() in ('1', 'true', 'yes')
+
+
+def trigrams(value):
+    """pg_trgm-style trigrams: every word lower-cased and padded with two leading and one trailing space"""
+    grams = set()
+    for word in _WORD.findall((value or '').lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index over one text column
+
+    Distinct values are indexed once (many rows share a location), each
+    trigram maps to the set of values containing it. A match scores the
+    share of the query's trigrams found in the value, which like
+    pg_trgm's word_similarity rewards a close word inside a longer name.
+    """
+
+    def __init__(self, rows):
+        self.values = []
+        self.ids = []
+        self.sizes = []
+        self.postings = {}
+        positions = {}
+        for row_id, value in rows:
+            key = (value or '').lower()
+            position = positions.get(key)
+            if position is None:
+                position = positions[key] = len(self.values)
+                grams = trigrams(key)
+                self.values.append(key)
+                self.ids.append([])
+                self.sizes.append(len(grams))
+                for gram in grams:
+                    postings = self.postings.get(gram)
+                    if postings is None:
+                        postings = self.postings[gram] = set()
+                    postings.add(position)
+            self.ids[position].append(row_id)
+
+    def search(self, term, min_similarity, limit):
+        """[(row_id, similarity)] best first, similarity in [0, 1]"""
+        query = trigrams(term)
+        if not query:
+            return []
+        needed = max(1, math.ceil(min_similarity * len(query)))
+        lists = sorted((self.postings.get(gram, ()) for gram in query), key=len)
+        # A value sharing `needed` query trigrams is in at least one of the
+        # len(query) - needed + 1 shortest lists, so only those produce
+        # candidates; the longer (common) trigrams only add to their counts.
+        split = len(query) - needed + 1
+        counts = Counter()
+        for postings in lists[:split]:
+            counts.update(postings)
+        for postings in lists[split:]:
+            counts.update(postings & counts.keys())
+
+        by_count = {}
+        for position, count in counts.items():
+            if count >= needed:
+                by_count.setdefault(count, []).append(position)
+        matches = []
+        for count in sorted(by_count, reverse=True):
+            # Within equal counts the shortest value is the closest overall match
+            for position in heapq.nsmallest(limit, by_count[count], key=self.sizes.__getitem__):
+                for row_id in sorted(self.ids[position]):
+                    matches.append((row_id, count / len(query)))
+                    if len(matches) == limit:
+                        return matches
+        return matches
+
+
+class FuzzySearch:
+    """
+    Typo-tolerant lookup of catalog rows by name or location
+
+    PostgreSQL uses pg_trgm: `term <% lower(column)` is answered by the
+    ix_<table>_<column>_trgm GIN indexes and ranked by word_similarity.
+    The extension is created on db.create_all() (which needs a role
+    allowed to CREATE EXTENSION).
+
+    Elsewhere each worker builds a TrigramIndex per column on first use.
+    It is rebuilt when the catalog cache reports a write to the table, or
+    after FUZZY_INDEX_TTL seconds so writes made by other workers and bulk
+    loads show up.
+    """
+
+    def __init__(self):
+        self.min_similarity = 0.5
+        self.ttl = 300
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.min_similarity = float(app.config.get('FUZZY_MIN_SIMILARITY', 0.5))
+        self.ttl = int(app.config.get('FUZZY_INDEX_TTL', 300))
+        if not event.contains(db.metadata, 'before_create', _create_pg_trgm):
+            event.listen(db.metadata, 'before_create', _create_pg_trgm)
+        app.extensions['fuzzy_search'] = self
+
+    def _index(self, model, field):
+        table = model.__tablename__
+        version = catalog_cache.backend.version(f"catalog:{table}:version")
+        entry = self._indexes.get((table, field))
+        if entry is None or entry[1] != version or time.monotonic() - entry[2] > self.ttl:
+            with self._lock:
+                entry = self._indexes.get((table, field))
+                if entry is None or entry[1] != version or time.monotonic() - entry[2] > self.ttl:
+                    rows = db.session.query(model.id, getattr(model, field)).yield_per(10000)
+                    entry = (TrigramIndex(rows), version, time.monotonic())
+                    self._indexes[(table, field)] = entry
+        return entry[0]
+
+    def search(self, model, field, term, limit=20):
+        """
+        Rows whose field is similar to term
+
+        Returns:
+            list of (row, similarity) pairs, most similar first
+        """
+        if field not in FUZZY_FIELDS:
+            raise ValidationError(f"field must be one of: {', '.join(FUZZY_FIELDS)}", 400)
+        term = (term or '').strip().lower()
+        if not trigrams(term):
+            raise ValidationError(f"{field} is required", 400)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            return self._search_postgresql(model, field, term, limit)
+
+        matches = self._index(model, field).search(term, self.min_similarity, limit)
+        if not matches:
+            return []
+        rows = {row.id: row for row in model.query.filter(model.id.in_([row_id for row_id, _ in matches]))}
+        return [(rows[row_id], similarity) for row_id, similarity in matches if row_id in rows]
+
+    def _search_postgresql(self, model, field, term, limit):
+        # Transaction-local, so pooled connections keep the server default
+        db.session.execute(text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+                           {'threshold': str(self.min_similarity)})
+        column = func.lower(getattr(model, field))
+        similarity = func.word_similarity(term, column)
+        rows = (db.session.query(model, similarity)
+                .filter(literal(term).op('<%')(column))
+                .order_by(similarity.desc(), model.id)
+                .limit(limit)
+                .all())
+        return [(row, float(score)) for row, score in rows]
+
+    def lookup(self, model, field, args):
+        """
+        Fuzzy lookup driven by query args (the field itself and limit),
+        returned as to_dict() rows with a similarity key and cached like
+        other catalog reads
+        """
+        term = (args.get(field) or '').strip().lower()
+        limit = parse_limit(args.get('limit'), 20, MAX_LIMIT)
+        return catalog_cache.query(
+            model, f"fuzzy:{field}", {'term': term, 'limit': limit},
+            lambda: [{**row.to_dict(), "similarity": round(score, 4)}
+                     for row, score in self.search(model, field, term, limit)])
+
+
+fuzzy_search = FuzzySearch()
+
+
+def _create_pg_trgm(target, connection, **kw):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
@@ -0,0 +1,75 @@
+from sqlalchemy import and_, or_
+from models import db
+from utils.geohash import KM_PER_DEGREE, covering_cells, haversine_km, prefix_upper_bound
+from utils.validation import ValidationError
+
+
+MAX_RADIUS_KM = 1000.0
+MAX_LIMIT = 50
+
+
+class GeoSearchService:
+    """
+    Proximity search over catalog rows with coordinates
+
+    Candidates come from the geohash index: the handful of cells covering
+    the search circle, read as prefix ranges on ix_<table>_geohash and cut
+    down by a latitude band. Only (id, latitude, longitude) is read for
+    them; exact haversine distances decide the result, and just those
+    rows are then loaded. Works the same on PostgreSQL and SQLite.
+    """
+
+    @staticmethod
+    def _candidates(model, latitude, longitude, radius_km):
+        """[(distance_km, id)] of rows within radius_km, nearest first"""
+        ranges = []
+        for cell in covering_cells(latitude, longitude, radius_km):
+            upper = prefix_upper_bound(cell)
+            ranges.append(and_(model.geohash >= cell, model.geohash < upper) if upper else model.geohash >= cell)
+        band = radius_km / KM_PER_DEGREE
+        points = (db.session.query(model.id, model.latitude, model.longitude)
+                  .filter(or_(*ranges), model.latitude.between(latitude - band, latitude + band)))
+        hits = []
+        for row_id, lat, lng in points:
+            distance = haversine_km(latitude, longitude, lat, lng)
+            if distance <= radius_km:
+                hits.append((distance, row_id))
+        hits.sort()
+        return hits
+
+    @staticmethod
+    def _load(model, hits):
+        if not hits:
+            return []
+        rows = {row.id: row for row in model.query.filter(model.id.in_([row_id for _, row_id in hits]))}
+        return [(rows[row_id], distance) for distance, row_id in hits if row_id in rows]
+
+    @staticmethod
+    def within(model, latitude, longitude, radius_km, limit=10):
+        """
+        Rows within radius_km of a point
+
+        Returns:
+            list of (row, distance_km) pairs, nearest first
+        """
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValidationError(f"radius_km must be > 0 and <= {MAX_RADIUS_KM:g}", 400)
+        hits = GeoSearchService._candidates(model, latitude, longitude, radius_km)
+        return GeoSearchService._load(model, hits[:limit])
+
+    @staticmethod
+    def nearest(model, latitude, longitude, limit=10, max_radius_km=MAX_RADIUS_KM):
+        """
+        The limit rows nearest to a point, searching at most max_radius_km out
+
+        The search circle starts at 1 km and grows fourfold until it holds
+        enough rows; everything inside a circle is found, so its nearest
+        `limit` rows are the true k nearest.
+        """
+        radius_km = 1.0
+        while True:
+            radius_km = min(radius_km, max_radius_km)
+            hits = GeoSearchService._candidates(model, latitude, longitude, radius_km)
+            if len(hits) >= limit or radius_km >= max_radius_km:
+                return GeoSearchService._load(model, hits[:limit])
+            radius_km *= 4
@@ -0,0 +1,235 @@
+import os
+from datetime import datetime
+from sqlalchemy import update
+from models import db, booking, booking_group, hotel, restaurant
+from services.inventory_service import InventoryService, MAX_STAY_NIGHTS
+from utils.validation import ValidationError, parse_slot_time
+
+
+MAX_RESERVATIONS = 100
+RESERVATION_TYPES = {'hotel': ('hotel_id', hotel), 'restaurant': ('restaurant_id', restaurant)}
+
+
+class ReservationConflict(ValidationError):
+    """Some reservations of a group do not fit; `indexes` points into the request's list"""
+
+    def __init__(self, indexes):
+        super().__init__("Some reservations are not available", 409)
+        self.indexes = indexes
+
+
+class GroupBookingService:
+    """Creates many hotel and restaurant bookings in one transaction, paid together"""
+
+    @staticmethod
+    def _required(item, index, fields):
+        for field in fields:
+            if field not in item:
+                raise ValidationError(f"reservations[{index}].{field} is required", 400)
+
+    @staticmethod
+    def _positive(item, index, field):
+        if not isinstance(item[field], int) or item[field] < 1:
+            raise ValidationError(f"reservations[{index}].{field} must be a positive integer", 400)
+
+    @staticmethod
+    def _date(item, index, field):
+        try:
+            return datetime.strptime(item[field], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValidationError(f"reservations[{index}].{field} must match format YYYY-MM-DD", 400)
+
+    @staticmethod
+    def load_entities(items):
+        """{type: {id: row}} for every hotel and restaurant referenced, one IN query per type"""
+        loaded = {}
+        for item_type, (column, model) in RESERVATION_TYPES.items():
+            ids = set()
+            for index, item in enumerate(items):
+                if item.get('type') != item_type or item.get(column) is None:
+                    continue
+                # Checked before hashing: a list or object id would fail as "unhashable"
+                if not isinstance(item[column], int) or isinstance(item[column], bool):
+                    raise ValidationError(f"reservations[{index}].{column} must be an integer", 400)
+                ids.add(item[column])
+            loaded[item_type] = {row.id: row for row in model.query.filter(model.id.in_(ids))} if ids else {}
+        return loaded
+
+    @staticmethod
+    def parse_reservations(user_id, items):
+        """
+        Validate a group body into unsaved booking rows, in request order
+
+        Each item is {"type": "hotel", ...} with the fields of POST
+        /booking/hotel, or {"type": "restaurant", ...} with those of POST
+        /booking/restaurant. Prices are computed the same way.
+
+        Rows reference their hotel or restaurant by id only: assigning the
+        relationship would put them in the entity's bookings collection
+        before they are in the session, and every autoflush until then
+        warns about it.
+
+        Returns:
+            (rows, entities): the booking rows and their hotel or restaurant
+        """
+        if not isinstance(items, list) or not items:
+            raise ValidationError("reservations must be a non-empty list", 400)
+        if len(items) > MAX_RESERVATIONS:
+            raise ValidationError(f"At most {MAX_RESERVATIONS} reservations per group", 400)
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ValidationError(f"reservations[{index}] must be an object", 400)
+            if item.get('type') not in RESERVATION_TYPES:
+                raise ValidationError(f"reservations[{index}].type must be one of: {', '.join(RESERVATION_TYPES)}", 400)
+        loaded = GroupBookingService.load_entities(items)
+
+        now, currency, rows, entities = datetime.now(), os.getenv('CURRENCY', 'USD'), [], []
+        for index, item in enumerate(items):
+            column, _ = RESERVATION_TYPES[item['type']]
+            if item.get(column) not in loaded[item['type']]:
+                raise ValidationError(f"reservations[{index}]: {item['type'].capitalize()} not found", 404)
+            entity = loaded[item['type']][item[column]]
+
+            if item['type'] == 'hotel':
+                GroupBookingService._required(item, index, ['check_in_date', 'check_out_date', 'number_of_rooms', 'number_of_guests'])
+                check_in_date = GroupBookingService._date(item, index, 'check_in_date')
+                check_out_date = GroupBookingService._date(item, index, 'check_out_date')
+                if check_in_date >= check_out_date:
+                    raise ValidationError(f"reservations[{index}]: Check-out date must be after check-in date", 400)
+                if check_in_date < now:
+                    raise ValidationError(f"reservations[{index}]: Check-in date must be in the future", 400)
+                if (check_out_date - check_in_date).days > MAX_STAY_NIGHTS:
+                    raise ValidationError(f"reservations[{index}]: A stay can last at most {MAX_STAY_NIGHTS} nights", 400)
+                GroupBookingService._positive(item, index, 'number_of_rooms')
+                GroupBookingService._positive(item, index, 'number_of_guests')
+                row = booking(
+                    booking_type='hotel',
+                    hotel_id=entity.id,
+                    check_in_date=check_in_date,
+                    check_out_date=check_out_date,
+                    number_of_rooms=item['number_of_rooms'],
+                    number_of_guests=item['number_of_guests'],
+                    base_price=entity.price * item['number_of_rooms'] * (check_out_date - check_in_date).days
+                )
+            else:
+                GroupBookingService._required(item, index, ['booking_date', 'booking_time', 'number_of_guests'])
+                booking_date = GroupBookingService._date(item, index, 'booking_date')
+                if booking_date < now:
+                    raise ValidationError(f"reservations[{index}]: Booking date must be in the future", 400)
+                booking_time = item['booking_time']
+                if entity.seats_per_slot is not None:
+                    booking_time = parse_slot_time(booking_time, f"reservations[{index}].booking_time")
+                GroupBookingService._positive(item, index, 'number_of_guests')
+                row = booking(
+                    booking_type='restaurant',
+                    restaurant_id=entity.id,
+                    booking_date=booking_date,
+                    booking_time=booking_time,
+                    number_of_guests=item['number_of_guests'],
+                    base_price=10.0 * float(item['number_of_guests'])
+                )
+
+            row.user_id = user_id
+            row.special_requests = item.get('special_requests', '')
+            row.currency = currency
+            row.booking_status = 'pending'
+            row.payment_status = 'pending'
+            row.calculate_total_price()
+            rows.append(row)
+            entities.append(entity)
+        return rows, entities
+
+    @staticmethod
+    def reserve(rows, entities):
+        """
+        Hold rooms and seats for every row with the batched inventory
+        methods; raises ReservationConflict listing the rows that do not
+        fit, after which the caller must roll back
+        """
+        stays = [(index, (entity, row.check_in_date, row.check_out_date, row.number_of_rooms))
+                 for index, (row, entity) in enumerate(zip(rows, entities)) if row.booking_type == 'hotel']
+        tables = [(index, (entity, row.booking_date, row.booking_time, row.number_of_guests))
+                  for index, (row, entity) in enumerate(zip(rows, entities)) if row.booking_type == 'restaurant']
+        # Both kinds are always checked so a 409 lists every reservation that does not fit
+        conflicts = [stays[i][0] for i in InventoryService.reserve_rooms_batch([stay for _, stay in stays])]
+        conflicts += [tables[i][0] for i in InventoryService.reserve_seats_batch([table for _, table in tables])]
+        if conflicts:
+            raise ReservationConflict(sorted(conflicts))
+
+    @staticmethod
+    def create(user_id, items):
+        """
+        Validate, reserve and insert a whole group in one transaction
+
+        The group row is written with one INSERT and the bookings with
+        one flush (a single batched INSERT ... RETURNING on PostgreSQL;
+        SQLite runs it row by row inside the same transaction). Does not
+        commit; on any error the caller rolls back and nothing is held.
+
+        Returns:
+            the booking_group, with .bookings in request order
+        """
+        rows, entities = GroupBookingService.parse_reservations(user_id, items)
+        GroupBookingService.reserve(rows, entities)
+        group = booking_group(
+            user_id=user_id,
+            total_price=round(sum(row.total_price for row in rows), 2),
+            currency=rows[0].currency,
+            payment_status='pending'
+        )
+        group.bookings = rows
+        db.session.add(group)
+        db.session.flush()
+        return group
+
+    @staticmethod
+    def record_intent(group, payment_result):
+        """
+        Store the PaymentIntent on the group and mark it and its bookings as
+        processing, unless a webhook already settled them. Does not commit.
+        """
+        group.stripe_payment_intent_id = payment_result['payment_intent_id']
+        group.stripe_client_secret = payment_result['client_secret']
+        if group.payment_status in ('pending', 'creating'):
+            group.payment_status = 'processing'
+        db.session.execute(
+            update(booking)
+            .where(booking.group_id == group.id, booking.payment_status == 'pending')
+            .values(payment_status='processing')
+            .execution_options(synchronize_session='fetch')
+        )
+
+    @staticmethod
+    def discard(group):
+        """Release everything a group holds and delete it with its bookings. Does not commit."""
+        for booking_obj in group.bookings:
+            InventoryService.release_booking(booking_obj)
+            # Deleted through the session: a bulk delete would leave the loaded
+            # bookings for the group delete to nullify, matching no rows
+            db.session.delete(booking_obj)
+        db.session.delete(group)
+
+    @staticmethod
+    def cancel(group, reason):
+        """Release everything a group holds and cancel its bookings (failed PaymentIntent). Does not commit."""
+        now = datetime.utcnow()
+        group.payment_status = 'failed'
+        for booking_obj in group.bookings:
+            InventoryService.release_booking(booking_obj)
+            booking_obj.payment_status = 'failed'
+            booking_obj.booking_status = 'cancelled'
+            booking_obj.cancelled_at = now
+            booking_obj.cancellation_reason = reason
+
+    @staticmethod
+    def mark_paid(group, paid_at=None, charge_id=None):
+        """Confirm the group and every booking in it. Does not commit."""
+        paid_at = paid_at or datetime.utcnow()
+        group.payment_status = 'paid'
+        for booking_obj in group.bookings:
+            if booking_obj.payment_status in ('paid', 'refunded'):
+                continue
+            booking_obj.payment_status = 'paid'
+            booking_obj.booking_status = 'confirmed'
+            booking_obj.stripe_charge_id = charge_id
+            booking_obj.payment_date = paid_at
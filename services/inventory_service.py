@@ -0,0 +1,323 @@
+from datetime import timedelta
+from sqlalchemy import and_, exists, func, select, tuple_, update
+from models import db, hotel, room_allocation, restaurant, restaurant_slot
+from utils.sql import insert_ignore
+
+
+MAX_STAY_NIGHTS = 366  # one allocation row is written per night
+
+
+class InventoryService:
+    """Service class for hotel room and restaurant table inventory"""
+
+    @staticmethod
+    def nights(check_in, check_out):
+        """Every night (as a date) from check_in up to, not including, check_out"""
+        start = check_in.date() if hasattr(check_in, 'date') else check_in
+        end = check_out.date() if hasattr(check_out, 'date') else check_out
+        return [start + timedelta(days=i) for i in range((end - start).days)]
+
+    @staticmethod
+    def available_hotels_query(check_in, check_out, rooms, location=None):
+        """
+        Hotels with at least `rooms` rooms free on every night of the stay
+
+        One statement: a NOT EXISTS probe per hotel over the
+        (hotel_id, night) unique index finds any night that is already too
+        full. Hotels without a room count (total_rooms is NULL) are not
+        tracked and therefore never reported as available.
+
+        Returns:
+            hotel query, ready to be filtered/paginated further
+        """
+        nights = InventoryService.nights(check_in, check_out)
+        full_night = exists().where(and_(
+            room_allocation.hotel_id == hotel.id,
+            room_allocation.night >= nights[0],
+            room_allocation.night <= nights[-1],
+            room_allocation.rooms_booked + rooms > hotel.total_rooms
+        ))
+        query = hotel.query.filter(hotel.total_rooms >= rooms, ~full_night)
+        if location:
+            query = query.filter(hotel.location == location)
+        return query
+
+    @staticmethod
+    def reserve_rooms(hotel_obj, check_in, check_out, rooms):
+        """
+        Atomically hold `rooms` rooms on every night of the stay
+
+        Missing allocation rows are created with INSERT ... ON CONFLICT DO
+        NOTHING, then a single conditional UPDATE increments every night
+        that still has room. If fewer rows were updated than there are
+        nights, some night is full and the caller must roll back. The
+        UPDATE only locks this hotel's rows for these nights, so bookings
+        for other hotels or dates never wait on each other.
+
+        Does not commit; the reservation becomes visible together with
+        the booking row in the caller's transaction.
+
+        Returns:
+            True if the rooms are held, False if the hotel is full
+        """
+        if hotel_obj.total_rooms is None:
+            return True
+        nights = InventoryService.nights(check_in, check_out)
+        if rooms > hotel_obj.total_rooms:
+            return False
+
+        insert_ignore(
+            room_allocation,
+            [{'hotel_id': hotel_obj.id, 'night': night, 'rooms_booked': 0} for night in nights],
+            index_elements=['hotel_id', 'night']
+        )
+        result = db.session.execute(
+            update(room_allocation)
+            .where(
+                room_allocation.hotel_id == hotel_obj.id,
+                room_allocation.night >= nights[0],
+                room_allocation.night <= nights[-1],
+                room_allocation.rooms_booked + rooms <= hotel_obj.total_rooms
+            )
+            .values(rooms_booked=room_allocation.rooms_booked + rooms)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == len(nights)
+
+    @staticmethod
+    def max_rooms_booked(hotel_id, from_night):
+        """Most rooms held on any night from from_night on (0 when none), the floor for total_rooms"""
+        return db.session.query(func.max(room_allocation.rooms_booked)).filter(
+            room_allocation.hotel_id == hotel_id,
+            room_allocation.night >= from_night
+        ).scalar() or 0
+
+    @staticmethod
+    def release_rooms(hotel_id, check_in, check_out, rooms):
+        """Give back rooms held by reserve_rooms (e.g. after a failed payment). Does not commit."""
+        nights = InventoryService.nights(check_in, check_out)
+        if not nights:
+            return
+        db.session.execute(
+            update(room_allocation)
+            .where(
+                room_allocation.hotel_id == hotel_id,
+                room_allocation.night >= nights[0],
+                room_allocation.night <= nights[-1],
+                room_allocation.rooms_booked >= rooms
+            )
+            .values(rooms_booked=room_allocation.rooms_booked - rooms)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def reserve_rooms_batch(stays):
+        """
+        Hold rooms for many stays at once: [(hotel_obj, check_in, check_out, rooms)]
+
+        Demand is summed per (hotel, night), so two stays in the same hotel
+        compete for the same rooms. One SELECT over the (hotel_id, night)
+        keys finds the nights that cannot take it; only when every stay
+        fits are the allocation rows created (one multi-row insert) and
+        incremented with one conditional UPDATE per distinct room count.
+        An UPDATE touching fewer rows than expected means a concurrent
+        booking took rooms in between. Does not commit.
+
+        Returns:
+            indexes of the stays that do not fit (empty when all are held)
+        """
+        demand, capacity = {}, {}
+        for hotel_obj, check_in, check_out, rooms in stays:
+            if hotel_obj.total_rooms is None:
+                continue
+            capacity[hotel_obj.id] = hotel_obj.total_rooms
+            for night in InventoryService.nights(check_in, check_out):
+                demand[(hotel_obj.id, night)] = demand.get((hotel_obj.id, night), 0) + rooms
+        if not demand:
+            return []
+
+        keys = tuple_(room_allocation.hotel_id, room_allocation.night)
+        booked = {(hotel_id, night): rooms_booked for hotel_id, night, rooms_booked in db.session.query(
+            room_allocation.hotel_id, room_allocation.night, room_allocation.rooms_booked).filter(keys.in_(list(demand)))}
+        full = {key for key, rooms in demand.items() if booked.get(key, 0) + rooms > capacity[key[0]]}
+        tracked = [index for index, stay in enumerate(stays) if stay[0].total_rooms is not None]
+        if full:
+            return [index for index in tracked
+                    if any((stays[index][0].id, night) in full for night in InventoryService.nights(*stays[index][1:3]))]
+
+        insert_ignore(
+            room_allocation,
+            [{'hotel_id': hotel_id, 'night': night, 'rooms_booked': 0} for hotel_id, night in demand if (hotel_id, night) not in booked],
+            index_elements=['hotel_id', 'night']
+        )
+        total_rooms = select(hotel.total_rooms).where(hotel.id == room_allocation.hotel_id).scalar_subquery()
+        by_rooms = {}
+        for key, rooms in demand.items():
+            by_rooms.setdefault(rooms, []).append(key)
+        updated = 0
+        for rooms, group in by_rooms.items():
+            updated += db.session.execute(
+                update(room_allocation)
+                .where(keys.in_(group), room_allocation.rooms_booked + rooms <= total_rooms)
+                .values(rooms_booked=room_allocation.rooms_booked + rooms)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        return [] if updated == len(demand) else tracked
+
+    @staticmethod
+    def create_slots(restaurant_obj, start_date, end_date, times, capacity):
+        """
+        Open `times` slots on every day from start_date to end_date inclusive
+
+        Written as one multi-row insert; slots that already exist keep
+        their capacity and bookings. Does not commit.
+
+        Returns:
+            (opened, skipped): slots inserted, and slots that already existed
+        """
+        days = (end_date - start_date).days + 1
+        rows = [
+            {'restaurant_id': restaurant_obj.id, 'slot_date': start_date + timedelta(days=i),
+             'slot_time': slot_time, 'capacity': capacity, 'seats_booked': 0}
+            for i in range(days) for slot_time in times
+        ]
+        opened = insert_ignore(restaurant_slot, rows, index_elements=['restaurant_id', 'slot_date', 'slot_time'])
+        return opened, len(rows) - opened
+
+    @staticmethod
+    def open_slots_query(start_date, end_date, guests, location=None, restaurant_ids=None):
+        """
+        Slots with at least `guests` free seats, across many restaurants at once
+
+        A single range scan on (slot_date, restaurant_id) instead of one
+        lookup per restaurant.
+        """
+        query = restaurant_slot.query.filter(
+            restaurant_slot.slot_date >= start_date,
+            restaurant_slot.slot_date <= end_date,
+            restaurant_slot.seats_booked + guests <= restaurant_slot.capacity
+        )
+        if restaurant_ids:
+            query = query.filter(restaurant_slot.restaurant_id.in_(restaurant_ids))
+        if location:
+            query = query.join(restaurant, restaurant.id == restaurant_slot.restaurant_id).filter(restaurant.location == location)
+        return query.order_by(restaurant_slot.restaurant_id, restaurant_slot.slot_date, restaurant_slot.slot_time)
+
+    @staticmethod
+    def reserve_seats(restaurant_obj, booking_date, booking_time, guests):
+        """
+        Atomically take `guests` seats in one slot
+
+        Restaurants with seats_per_slot set are tracked: only slots the
+        owner opened with create_slots can be booked, so a party cannot
+        dodge a full 19:00 slot by asking for 19:01. The conditional UPDATE
+        only succeeds while the slot exists and still has room, so
+        concurrent bookings cannot oversell it. Does not commit.
+
+        Returns:
+            True if the seats are held, False if the slot is full or not open
+        """
+        if restaurant_obj.seats_per_slot is None:
+            return True
+        slot_date = booking_date.date() if hasattr(booking_date, 'date') else booking_date
+        result = db.session.execute(
+            update(restaurant_slot)
+            .where(
+                restaurant_slot.restaurant_id == restaurant_obj.id,
+                restaurant_slot.slot_date == slot_date,
+                restaurant_slot.slot_time == booking_time,
+                restaurant_slot.seats_booked + guests <= restaurant_slot.capacity
+            )
+            .values(seats_booked=restaurant_slot.seats_booked + guests)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    @staticmethod
+    def slot_is_open(restaurant_id, booking_date, booking_time):
+        """Whether create_slots opened this slot, to tell a closed slot from a full one"""
+        slot_date = booking_date.date() if hasattr(booking_date, 'date') else booking_date
+        return db.session.query(exists().where(
+            restaurant_slot.restaurant_id == restaurant_id,
+            restaurant_slot.slot_date == slot_date,
+            restaurant_slot.slot_time == booking_time
+        )).scalar()
+
+    @staticmethod
+    def reserve_seats_batch(reservations):
+        """
+        Take seats for many reservations at once: [(restaurant_obj, booking_date, booking_time, guests)]
+
+        Same shape as reserve_rooms_batch, keyed by (restaurant, date,
+        time): one SELECT checks every slot, then one conditional UPDATE
+        per distinct party size takes the seats. As in reserve_seats, only
+        slots opened with create_slots can be booked; a reservation for
+        any other time does not fit. Does not commit.
+
+        Returns:
+            indexes of the reservations that do not fit (empty when all are held)
+        """
+        demand, capacity = {}, {}
+        for restaurant_obj, booking_date, booking_time, guests in reservations:
+            if restaurant_obj.seats_per_slot is None:
+                continue
+            slot_date = booking_date.date() if hasattr(booking_date, 'date') else booking_date
+            key = (restaurant_obj.id, slot_date, booking_time)
+            demand[key] = demand.get(key, 0) + guests
+            capacity[key] = 0
+        if not demand:
+            return []
+
+        keys = tuple_(restaurant_slot.restaurant_id, restaurant_slot.slot_date, restaurant_slot.slot_time)
+        for restaurant_id, slot_date, slot_time, slot_capacity, seats_booked in db.session.query(
+                restaurant_slot.restaurant_id, restaurant_slot.slot_date, restaurant_slot.slot_time,
+                restaurant_slot.capacity, restaurant_slot.seats_booked).filter(keys.in_(list(demand))):
+            capacity[(restaurant_id, slot_date, slot_time)] = slot_capacity - seats_booked
+        full = {key for key, guests in demand.items() if guests > capacity[key]}
+
+        def key_of(reservation):
+            restaurant_obj, booking_date, booking_time, _ = reservation
+            return (restaurant_obj.id, booking_date.date() if hasattr(booking_date, 'date') else booking_date, booking_time)
+
+        tracked = [index for index, reservation in enumerate(reservations) if reservation[0].seats_per_slot is not None]
+        if full:
+            return [index for index in tracked if key_of(reservations[index]) in full]
+
+        by_guests = {}
+        for key, guests in demand.items():
+            by_guests.setdefault(guests, []).append(key)
+        updated = 0
+        for guests, group in by_guests.items():
+            updated += db.session.execute(
+                update(restaurant_slot)
+                .where(keys.in_(group), restaurant_slot.seats_booked + guests <= restaurant_slot.capacity)
+                .values(seats_booked=restaurant_slot.seats_booked + guests)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        return [] if updated == len(demand) else tracked
+
+    @staticmethod
+    def release_seats(restaurant_id, booking_date, booking_time, guests):
+        """Give back seats held by reserve_seats. Does not commit."""
+        slot_date = booking_date.date() if hasattr(booking_date, 'date') else booking_date
+        db.session.execute(
+            update(restaurant_slot)
+            .where(
+                restaurant_slot.restaurant_id == restaurant_id,
+                restaurant_slot.slot_date == slot_date,
+                restaurant_slot.slot_time == booking_time,
+                restaurant_slot.seats_booked >= guests
+            )
+            .values(seats_booked=restaurant_slot.seats_booked - guests)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def release_booking(booking_obj):
+        """Give back whatever a booking holds (rooms or seats). Does not commit."""
+        if booking_obj.booking_type == 'hotel' and booking_obj.hotel_id:
+            InventoryService.release_rooms(booking_obj.hotel_id, booking_obj.check_in_date,
+                                           booking_obj.check_out_date, booking_obj.number_of_rooms)
+        elif booking_obj.booking_type == 'restaurant' and booking_obj.restaurant_id:
+            InventoryService.release_seats(booking_obj.restaurant_id, booking_obj.booking_date,
+                                           booking_obj.booking_time, booking_obj.number_of_guests)
@@ -0,0 +1,172 @@
+from datetime import timedelta
+from sqlalchemy import func, insert, select, union
+from models import db, hotel, restaurant, torist_place, trips, trip_items
+from utils.validation import ValidationError
+
+
+# trips column -> (model, key in the itinerary)
+ITINERARY_REFERENCES = (
+    ('torist_place_id', torist_place, 'site'),
+    ('hotel_id', hotel, 'hotel'),
+    ('restaurant_id', restaurant, 'restaurant'),
+)
+# trip_items.item_type -> (column, model)
+ITEM_TYPES = {key: (column, model) for column, model, key in ITINERARY_REFERENCES}
+MAX_ITEMS = 200
+
+
+def _is_int(value):
+    # bool is an int subclass, but true/false are not valid days, ids or positions
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class ItineraryService:
+    """Expands trips into itineraries and writes multi-day trip items"""
+
+    @staticmethod
+    def _entity(row):
+        return {**row.to_summary(), **row.review_stats()}
+
+    @staticmethod
+    def load_references(trip_rows, item_rows=()):
+        """
+        Fetch every site, hotel and restaurant referenced by trip_rows and
+        item_rows
+
+        One IN query per type for the whole batch, however many trips and
+        items there are; types nobody references are not queried at all.
+
+        Returns:
+            {key: {id: entity dict}} for the keys of ITINERARY_REFERENCES
+        """
+        loaded = {}
+        for column, model, key in ITINERARY_REFERENCES:
+            ids = {getattr(row, column) for row in (*trip_rows, *item_rows)} - {None}
+            rows = model.query.filter(model.id.in_(ids)).all() if ids else []
+            loaded[key] = {row.id: ItineraryService._entity(row) for row in rows}
+        return loaded
+
+    @staticmethod
+    def build(trip_rows):
+        """
+        trip_rows as to_dict() with the referenced entities embedded (None
+        when unset or deleted) and their items, ordered by day and position
+        """
+        trip_ids = [trip.id for trip in trip_rows]
+        item_rows = (trip_items.query.filter(trip_items.trip_id.in_(trip_ids))
+                     .order_by(trip_items.trip_id, trip_items.day, trip_items.position).all()) if trip_ids else []
+        loaded = ItineraryService.load_references(trip_rows, item_rows)
+        items_by_trip = {}
+        for item in item_rows:
+            items_by_trip.setdefault(item.trip_id, []).append(
+                {**item.to_dict(), "entity": loaded[item.item_type].get(item.entity_id())})
+
+        itineraries = []
+        for trip in trip_rows:
+            data = trip.to_dict()
+            for column, _, key in ITINERARY_REFERENCES:
+                data[key] = loaded[key].get(getattr(trip, column))
+            data["items"] = items_by_trip.get(trip.id, [])
+            itineraries.append(data)
+        return itineraries
+
+    @staticmethod
+    def parse_items(items, start_date, end_date):
+        """
+        Validate an itinerary body into trip_items rows (without trip_id)
+
+        Each item is {"day", "type", "id"} with an optional "position";
+        positions default to the order of the items within their day. All
+        referenced entities are checked with one IN query per type.
+        """
+        if not isinstance(items, list):
+            raise ValidationError("items must be a list", 400)
+        if len(items) > MAX_ITEMS:
+            raise ValidationError(f"At most {MAX_ITEMS} items per trip", 400)
+        days = (end_date.date() - start_date.date()).days + 1
+
+        rows, next_position, wanted = [], {}, {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ValidationError(f"items[{index}] must be an object", 400)
+            day, item_type, entity_id = item.get('day'), item.get('type'), item.get('id')
+            if not _is_int(day) or not 1 <= day <= days:
+                raise ValidationError(f"items[{index}].day must be an integer between 1 and {days}", 400)
+            if item_type not in ITEM_TYPES:
+                raise ValidationError(f"items[{index}].type must be one of: {', '.join(ITEM_TYPES)}", 400)
+            if not _is_int(entity_id):
+                raise ValidationError(f"items[{index}].id must be an integer", 400)
+            position = item.get('position', next_position.get(day, 1))
+            if not _is_int(position) or position < 1:
+                raise ValidationError(f"items[{index}].position must be a positive integer", 400)
+            next_position[day] = max(next_position.get(day, 1), position + 1)
+
+            column, _ = ITEM_TYPES[item_type]
+            rows.append({
+                'day': day,
+                'position': position,
+                'item_type': item_type,
+                'torist_place_id': None,
+                'hotel_id': None,
+                'restaurant_id': None,
+                column: entity_id,
+                'visit_date': (start_date + timedelta(days=day - 1)).date(),
+            })
+            wanted.setdefault(item_type, set()).add(entity_id)
+
+        if len({(row['day'], row['position']) for row in rows}) != len(rows):
+            raise ValidationError("Two items share the same day and position", 400)
+        for item_type, ids in wanted.items():
+            _, model = ITEM_TYPES[item_type]
+            found = {row_id for (row_id,) in db.session.query(model.id).filter(model.id.in_(ids))}
+            if ids - found:
+                raise ValidationError(f"Unknown {item_type} id(s): {', '.join(map(str, sorted(ids - found)))}", 400)
+        return rows
+
+    @staticmethod
+    def add_items(trip, rows):
+        """Insert rows for a trip with a single multi-row INSERT, committed by the caller"""
+        if rows:
+            db.session.execute(insert(trip_items).values([{**row, 'trip_id': trip.id} for row in rows]))
+
+    @staticmethod
+    def replace_items(trip, rows):
+        """Swap a trip's items for rows: one DELETE and one multi-row INSERT, committed by the caller"""
+        trip_items.query.filter_by(trip_id=trip.id).delete(synchronize_session=False)
+        ItineraryService.add_items(trip, rows)
+
+    @staticmethod
+    def check_dates(trip):
+        """Raise unless end_date is after start_date and every stored item's day still falls within the trip"""
+        if trip.start_date >= trip.end_date:
+            raise ValidationError('end_date must be after start_date', 400)
+        days = (trip.end_date.date() - trip.start_date.date()).days + 1
+        last_day = db.session.query(func.max(trip_items.day)).filter(trip_items.trip_id == trip.id).scalar()
+        if last_day and last_day > days:
+            raise ValidationError(f"The trip has items on day {last_day}; move or remove them before shortening it", 400)
+
+    @staticmethod
+    def refresh_dates(trip):
+        """Recompute visit_date after the trip's start date moved"""
+        for item in trip_items.query.filter_by(trip_id=trip.id):
+            item.visit_date = (trip.start_date + timedelta(days=item.day - 1)).date()
+
+    @staticmethod
+    def trips_touching(item_type, entity_id, start_date, end_date):
+        """
+        Query for trips visiting an entity between two dates (inclusive)
+
+        Multi-stop trips match on their items' visit dates (the
+        (<entity>_id, visit_date) indexes); single-stop trips match on
+        their own reference and date span.
+        """
+        column, _ = ITEM_TYPES[item_type]
+        from_items = select(trip_items.trip_id).where(
+            getattr(trip_items, column) == entity_id,
+            trip_items.visit_date >= start_date.date(),
+            trip_items.visit_date <= end_date.date())
+        single_stop = select(trips.id).where(
+            getattr(trips, column) == entity_id,
+            trips.start_date <= end_date,
+            trips.end_date >= start_date)
+        return trips.query.filter(trips.id.in_(union(from_items, single_stop)))
@@ -0,0 +1,99 @@
+import threading
+import time
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of the redis-py client we use
+
+    Lets the Redis-backed services run in tests and single-node setups
+    without a Redis server. Select it with a ``local://`` URL.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key) if self._alive(key) else None
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = value if isinstance(value, bytes) else str(value).encode()
+            if ex:
+                self._expires[key] = time.time() + ex
+            else:
+                self._expires.pop(key, None)
+        return True
+
+    def setex(self, key, seconds, value):
+        return self.set(key, value, ex=seconds)
+
+    def delete(self, *keys):
+        removed = 0
+        with self._lock:
+            for key in keys:
+                if self._alive(key):
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+        return removed
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._alive(key))
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            value = int(self._data[key]) if self._alive(key) else 0
+            value += amount
+            self._data[key] = str(value).encode()
+            return value
+
+    def zadd(self, key, mapping):
+        with self._lock:
+            zset = self._data.setdefault(key, {})
+            added = sum(1 for member in mapping if member not in zset)
+            zset.update({member: float(score) for member, score in mapping.items()})
+            return added
+
+    def zrangebyscore(self, key, min, max):
+        low = float('-inf') if min == '-inf' else float(min)
+        high = float('inf') if max == '+inf' else float(max)
+        with self._lock:
+            zset = self._data.get(key, {})
+            members = sorted((score, member) for member, score in zset.items() if low <= score <= high)
+            return [member.encode() if isinstance(member, str) else member for _, member in members]
+
+    def zremrangebyscore(self, key, min, max):
+        low = float('-inf') if min == '-inf' else float(min)
+        high = float('inf') if max == '+inf' else float(max)
+        with self._lock:
+            zset = self._data.get(key, {})
+            doomed = [member for member, score in zset.items() if low <= score <= high]
+            for member in doomed:
+                del zset[member]
+            return len(doomed)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+        return True
+
+
+def redis_from_url(url):
+    """Return a redis client for url, or a LocalRedis for local:// URLs"""
+    if url.startswith('local://'):
+        return LocalRedis()
+    import redis  # optional dependency, only needed for a real Redis server
+    return redis.Redis.from_url(url)
@@ -0,0 +1,198 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Seconds; roughly the Prometheus client defaults, with a finer low end for SQL
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SQL_OPERATIONS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_labels(self.label_names, label_values)} {value}"
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three additions under a lock"""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._series.items())
+        names = (*self.label_names, 'le')
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_labels(names, (*label_values, bound))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, label_values)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, label_values)} {count}"
+
+
+class Metrics:
+    """
+    Process-local metrics registry, rendered in the Prometheus text format
+
+    Records per-endpoint request latency, SQL statements and database time
+    per request (from SQLAlchemy engine events), Stripe call latency and
+    password hashing time. Every gunicorn worker keeps its own registry,
+    so a scrape sees the worker that answered it.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Request latency by endpoint', ('method', 'endpoint', 'status'))
+        self.request_statements = Histogram(
+            'http_request_db_statements', 'SQL statements executed per request', ('endpoint',), COUNT_BUCKETS)
+        self.request_db_time = Histogram(
+            'http_request_db_seconds', 'Total database time per request', ('endpoint',))
+        self.db_statement_duration = Histogram(
+            'db_statement_duration_seconds', 'Duration of single SQL statements', ('operation',))
+        self.stripe_duration = Histogram(
+            'stripe_request_duration_seconds', 'Latency of Stripe API calls', ('operation',))
+        self.stripe_errors = Counter(
+            'stripe_request_errors_total', 'Stripe API calls that raised', ('operation',))
+        self.password_hash_duration = Histogram(
+            'password_hash_duration_seconds', 'Time spent hashing or checking passwords', ('operation',))
+        self._collectors = []
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.extensions['metrics'] = self
+
+    def register_collector(self, collector):
+        """collector() yields extra exposition lines at scrape time (e.g. cache counters)"""
+        self._collectors.append(collector)
+
+    @contextmanager
+    def stripe_call(self, operation):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.stripe_errors.inc(operation)
+            raise
+        finally:
+            self.stripe_duration.observe(time.perf_counter() - started, operation)
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_statements = 0
+        g._metrics_db_time = 0.0
+
+    def _after_request(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        self.request_duration.observe(time.perf_counter() - started, request.method, endpoint, response.status_code)
+        self.request_statements.observe(g.get('_metrics_statements', 0), endpoint)
+        self.request_db_time.observe(g.get('_metrics_db_time', 0.0), endpoint)
+        return response
+
+    def render(self):
+        lines = []
+        for metric in (self.request_duration, self.request_statements, self.request_db_time,
+                       self.db_statement_duration, self.stripe_duration, self.stripe_errors,
+                       self.password_hash_duration):
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def stats_collector(prefix, stats):
+    """Collector exposing every number in the dict returned by stats() as a gauge named prefix_key"""
+    def collect():
+        for key, value in stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"# TYPE {prefix}_{key} gauge"
+                yield f"{prefix}_{key} {value}"
+    return collect
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get('_metrics_started')
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    operation = statement.lstrip()[:6].upper()
+    metrics.db_statement_duration.observe(elapsed, operation if operation in SQL_OPERATIONS else 'OTHER')
+    if has_request_context() and '_metrics_started' in g:
+        g._metrics_statements += 1
+        g._metrics_db_time += elapsed
@@ -0,0 +1,230 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, update
+from models import db, booking, booking_group
+from services.group_booking import GroupBookingService
+from services.inventory_service import InventoryService
+from services.stripe_service import StripeService
+
+
+# Waiting for a PaymentIntent: not yet picked up, or a job is creating it
+WAITING_STATUSES = ('pending', 'creating')
+# StripeService errors that retrying with the same request cannot fix; anything else is retried
+PERMANENT_ERRORS = ('card_error', 'invalid_request')
+
+def payment_metadata(booking_obj):
+    """Metadata attached to a booking's PaymentIntent"""
+    metadata = {
+        'booking_id': booking_obj.id,
+        'booking_type': booking_obj.booking_type,
+        'user_id': booking_obj.user_id,
+        'confirmation_code': booking_obj.confirmation_code
+    }
+    if booking_obj.hotel_id:
+        metadata['hotel_id'] = booking_obj.hotel_id
+    if booking_obj.restaurant_id:
+        metadata['restaurant_id'] = booking_obj.restaurant_id
+    return metadata
+
+
+def group_payment_metadata(group):
+    """Metadata attached to a booking group's combined PaymentIntent"""
+    return {
+        'booking_group_id': group.id,
+        'user_id': group.user_id,
+        'booking_count': len(group.bookings)
+    }
+
+
+class PaymentQueue:
+    """
+    Creates Stripe PaymentIntents off the request path
+
+    With PAYMENT_INTENT_MODE=async the booking route commits the booking
+    once and hands its id to this queue; a small thread pool then talks
+    to Stripe and stores the intent id and client_secret on the row. The
+    client polls GET /booking/<id>/payment for the client_secret.
+
+    Jobs live in process memory, so a worker that dies loses its queue;
+    the poll endpoint re-enqueues bookings still waiting after
+    PAYMENT_REQUEUE_SECONDS. A job first claims its booking (pending to
+    creating) with a conditional UPDATE, so a requeued job never runs
+    alongside the original, and the per-booking idempotency key keeps
+    Stripe from creating a second intent. Transient Stripe errors put
+    the booking back to pending for a later retry; only errors that a
+    retry cannot fix cancel it. Booking groups go through the same pool
+    with one intent per group.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.executor = None
+        self.requeue_after = timedelta(seconds=30)
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.requeue_after = timedelta(seconds=int(app.config.get('PAYMENT_REQUEUE_SECONDS', 30)))
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(app.config.get('PAYMENT_QUEUE_WORKERS', 4)),
+            thread_name_prefix='payment-intent'
+        )
+        app.extensions['payment_queue'] = self
+
+    @property
+    def is_async(self):
+        return self.app is not None and self.app.config.get('PAYMENT_INTENT_MODE') == 'async'
+
+    def enqueue(self, booking_id):
+        return self._submit(self._run, booking_id)
+
+    def enqueue_group(self, group_id):
+        return self._submit(self._run_group, group_id)
+
+    def _submit(self, job, job_id):
+        future = self.executor.submit(job, job_id)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
+        # A job that raised would otherwise die silently here
+        error = None if future.cancelled() else future.exception()
+        if error is not None:
+            self.app.logger.exception("Payment job failed", exc_info=error)
+
+    def join(self, timeout=None):
+        """Wait for queued jobs to finish (tests, graceful shutdown)"""
+        with self._lock:
+            pending = list(self._futures)
+        for future in pending:
+            future.result(timeout=timeout)
+
+    def _is_stale(self, obj):
+        if obj.stripe_payment_intent_id or obj.payment_status not in WAITING_STATUSES:
+            return False
+        changed_at = obj.updated_at or obj.created_at
+        return not changed_at or datetime.utcnow() - changed_at >= self.requeue_after
+
+    def requeue_if_stale(self, booking_obj):
+        if booking_obj.group_id or not self._is_stale(booking_obj):
+            return False
+        self.enqueue(booking_obj.id)
+        return True
+
+    def requeue_group_if_stale(self, group):
+        if not self._is_stale(group):
+            return False
+        self.enqueue_group(group.id)
+        return True
+
+    def _run(self, booking_id):
+        with self.app.app_context():
+            self.create_intent(booking_id)
+
+    def _run_group(self, group_id):
+        with self.app.app_context():
+            self.create_group_intent(group_id)
+
+    def _claim(self, model, obj_id, *criteria):
+        """
+        Atomically move a row from pending to creating, and commit
+
+        Only the job whose UPDATE matched the row talks to Stripe, so a
+        poll that requeues a booking while its first job is still running
+        does nothing. A row left in creating by a worker that died is
+        claimable again once it is requeue_after old.
+        """
+        now = datetime.utcnow()
+        result = db.session.execute(
+            update(model)
+            .where(
+                model.id == obj_id,
+                model.stripe_payment_intent_id.is_(None),
+                or_(model.payment_status == 'pending',
+                    and_(model.payment_status == 'creating', model.updated_at <= now - self.requeue_after)),
+                *criteria
+            )
+            .values(payment_status='creating', updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    @staticmethod
+    def _release_claim(model, obj_id):
+        """Put a claimed row back to pending after a transient error; the next stale poll retries it"""
+        db.session.execute(
+            update(model)
+            .where(model.id == obj_id, model.payment_status == 'creating')
+            .values(payment_status='pending', updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def create_intent(self, booking_id):
+        """Create the PaymentIntent for one booking and record the outcome"""
+        if not self._claim(booking, booking_id, booking.group_id.is_(None)):
+            return
+        booking_obj = booking.query.get(booking_id)
+
+        payment_result = StripeService.create_payment_intent(
+            amount=booking_obj.total_price,
+            currency=booking_obj.currency.lower(),
+            metadata=payment_metadata(booking_obj),
+            idempotency_key=f"booking-{booking_obj.id}"
+        )
+        if not payment_result['success'] and payment_result.get('error') not in PERMANENT_ERRORS:
+            self._release_claim(booking, booking_id)
+            return
+        try:
+            # A webhook for the new intent may have settled the booking meanwhile; keep its status
+            db.session.refresh(booking_obj)
+            if payment_result['success']:
+                booking_obj.stripe_payment_intent_id = payment_result['payment_intent_id']
+                booking_obj.stripe_client_secret = payment_result['client_secret']
+                if booking_obj.payment_status == 'creating':
+                    booking_obj.payment_status = 'processing'
+            elif booking_obj.payment_status == 'creating':
+                booking_obj.payment_status = 'failed'
+                booking_obj.booking_status = 'cancelled'
+                booking_obj.cancelled_at = datetime.utcnow()
+                booking_obj.cancellation_reason = f"Payment creation failed: {payment_result.get('message')}"
+                InventoryService.release_booking(booking_obj)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def create_group_intent(self, group_id):
+        """Create the combined PaymentIntent for a booking group and record the outcome"""
+        if not self._claim(booking_group, group_id):
+            return
+        group = booking_group.query.get(group_id)
+
+        payment_result = StripeService.create_payment_intent(
+            amount=group.total_price,
+            currency=group.currency.lower(),
+            metadata=group_payment_metadata(group),
+            idempotency_key=f"booking-group-{group.id}"
+        )
+        if not payment_result['success'] and payment_result.get('error') not in PERMANENT_ERRORS:
+            self._release_claim(booking_group, group_id)
+            return
+        try:
+            db.session.refresh(group)
+            if payment_result['success']:
+                GroupBookingService.record_intent(group, payment_result)
+            elif group.payment_status == 'creating':
+                GroupBookingService.cancel(group, f"Payment creation failed: {payment_result.get('message')}")
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+payment_queue = PaymentQueue()
@@ -0,0 +1,107 @@
+import re
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Expanded IN lists and VALUES rows differ only in their number of placeholders
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)*\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_SELECT_LIST = re.compile(r"^SELECT .*? FROM ", re.IGNORECASE)
+
+
+def statement_shape(statement):
+    """SQL text with placeholder lists collapsed, so queries differing only in bound values compare equal"""
+    return _PLACEHOLDER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement.strip()))
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in SQL_BUDGET_MODE=raise; an AssertionError so it fails tests loudly"""
+
+
+def sql_budget(max_statements):
+    """Per-route statement budget, overriding SQL_BUDGET_DEFAULT"""
+    def decorator(fn):
+        fn._sql_budget = max_statements
+        return fn
+    return decorator
+
+
+class QueryGuard:
+    """
+    Per-request SQL statement budget and N+1 detection for development and tests
+
+    With SQL_BUDGET_MODE=warn or raise, every statement a request executes
+    is counted and grouped by shape (SQL text with bound values and IN
+    lists collapsed). A request fails the check when it runs more than its
+    budget (SQL_BUDGET_DEFAULT, or @sql_budget(n) on the view), or runs
+    the same SELECT shape SQL_N_PLUS_ONE_THRESHOLD times or more - the
+    signature of a lazy relationship loaded once per row.
+
+    warn logs the offending request; raise makes it fail with
+    QueryBudgetExceeded, which surfaces as a test failure under
+    app.testing. With the default mode, off, no listener is installed.
+    """
+
+    def __init__(self):
+        self.mode = 'off'
+        self.default_budget = 50
+        self.repeat_threshold = 5
+
+    def init_app(self, app):
+        self.mode = app.config.get('SQL_BUDGET_MODE', 'off')
+        if self.mode not in ('off', 'warn', 'raise'):
+            raise ValueError("SQL_BUDGET_MODE must be off, warn or raise")
+        self.default_budget = int(app.config.get('SQL_BUDGET_DEFAULT', 50))
+        self.repeat_threshold = int(app.config.get('SQL_N_PLUS_ONE_THRESHOLD', 5))
+        if self.mode == 'off':
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not event.contains(Engine, 'before_cursor_execute', _record_statement):
+            event.listen(Engine, 'before_cursor_execute', _record_statement)
+        app.extensions['query_guard'] = self
+
+    def _before_request(self):
+        g._sql_shapes = Counter()
+
+    def _budget(self):
+        view = current_app.view_functions.get(request.endpoint)
+        return getattr(view, '_sql_budget', self.default_budget)
+
+    def check(self, shapes, budget):
+        """Problems found in one request's statements (empty list when within budget)"""
+        problems = []
+        total = sum(shapes.values())
+        if total > budget:
+            problems.append(f"{total} SQL statements, budget is {budget}")
+        for shape, count in shapes.most_common():
+            if count < self.repeat_threshold:
+                break
+            if shape.upper().startswith('SELECT'):
+                problems.append(f"possible N+1: {count}x {_SELECT_LIST.sub('SELECT ... FROM ', shape)[:200]}")
+        return problems
+
+    def _after_request(self, response):
+        shapes = g.pop('_sql_shapes', None)
+        if shapes is None:
+            return response
+        response.headers['X-SQL-Statements'] = str(sum(shapes.values()))
+        problems = self.check(shapes, self._budget())
+        if problems:
+            message = f"{request.method} {request.path}: " + '; '.join(problems)
+            if self.mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            current_app.logger.warning("SQL budget: %s", message)
+        return response
+
+
+query_guard = QueryGuard()
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        shapes = g.get('_sql_shapes')
+        if shapes is not None:
+            shapes[statement_shape(statement)] += 1
@@ -0,0 +1,116 @@
+from datetime import datetime
+from sqlalchemy import case, func, update
+from models import db, hotel, restaurant, torist_place, review
+from services.cache import mark_changed
+from utils.validation import ValidationError
+
+
+# review column -> (catalog model, label used in errors)
+REVIEW_TARGETS = {
+    'hotel_id': (hotel, 'Hotel'),
+    'restaurant_id': (restaurant, 'Restaurant'),
+    'torist_place_id': (torist_place, 'Tourist site'),
+}
+
+
+def rating_bucket(rating):
+    """Histogram bucket (1-5 stars) for a 0-5 rating, rounded half up"""
+    return min(max(int(rating + 0.5), 1), 5)
+
+
+class ReviewStatsService:
+    """Keeps the review aggregates on hotel, restaurant and torist_place rows in step with the review table"""
+
+    @staticmethod
+    def apply(review_obj, old_rating=None, new_rating=None):
+        """
+        Move the aggregates of every entity the review points at
+
+        old_rating=None means the review is new, new_rating=None means it
+        is being deleted. Each entity gets a single relative UPDATE
+        (review_count = review_count + 1, ...) so concurrent reviews of the
+        same hotel never lose an increment, and review_average is
+        recomputed from the same row in that statement. Does not commit;
+        the cached rows are invalidated when the caller commits.
+
+        Raises:
+            ValidationError: 404 if a referenced entity does not exist
+        """
+        for column, (model, label) in REVIEW_TARGETS.items():
+            target_id = getattr(review_obj, column)
+            if not target_id:
+                continue
+            updated = ReviewStatsService._shift(model, target_id, old_rating, new_rating)
+            if not updated and new_rating is not None:
+                raise ValidationError(f"{label} not found", 404)
+
+    @staticmethod
+    def _shift(model, target_id, old_rating, new_rating):
+        count_delta = (new_rating is not None) - (old_rating is not None)
+        sum_delta = (new_rating or 0.0) - (old_rating or 0.0)
+        new_count = model.review_count + count_delta
+        new_sum = model.review_sum + sum_delta
+
+        values = {
+            'review_count': new_count,
+            'review_sum': new_sum,
+            # SET expressions see the pre-update row on both PostgreSQL and SQLite
+            'review_average': case((new_count > 0, new_sum / new_count), else_=0.0),
+            'updated_at': datetime.utcnow()
+        }
+        old_bucket = rating_bucket(old_rating) if old_rating is not None else None
+        new_bucket = rating_bucket(new_rating) if new_rating is not None else None
+        if old_bucket != new_bucket:
+            if old_bucket:
+                values[f'review_hist_{old_bucket}'] = getattr(model, f'review_hist_{old_bucket}') - 1
+            if new_bucket:
+                values[f'review_hist_{new_bucket}'] = getattr(model, f'review_hist_{new_bucket}') + 1
+
+        result = db.session.execute(
+            update(model)
+            .where(model.id == target_id)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            mark_changed(db.session, model.__tablename__, [target_id])
+        return result.rowcount
+
+    @staticmethod
+    def rebuild():
+        """
+        Recompute every aggregate from the review table
+
+        For backfilling existing databases and for reviews inserted
+        without going through the API (e.g. scripts/seed.py). One GROUP BY
+        per catalog table. Commits.
+        """
+        for column, (model, _) in REVIEW_TARGETS.items():
+            target = getattr(review, column)
+            bucket = case(*[(review.rating < star + 0.5, star) for star in range(1, 5)], else_=5)
+            rows = db.session.query(
+                target,
+                func.count(review.id),
+                func.sum(review.rating),
+                *[func.sum(case((bucket == star, 1), else_=0)) for star in range(1, 6)]
+            ).filter(target.isnot(None)).group_by(target).all()
+
+            changed = {row.id for row in db.session.query(model.id).filter(model.review_count != 0)}
+            db.session.execute(
+                update(model)
+                .where(model.review_count != 0)
+                .values(review_count=0, review_sum=0.0, review_average=0.0,
+                        **{f'review_hist_{star}': 0 for star in range(1, 6)})
+                .execution_options(synchronize_session=False)
+            )
+            for target_id, count, total, *hist in rows:
+                db.session.execute(
+                    update(model)
+                    .where(model.id == target_id)
+                    .values(review_count=count, review_sum=total, review_average=total / count,
+                            **{f'review_hist_{star}': hist[star - 1] for star in range(1, 6)})
+                    .execution_options(synchronize_session=False)
+                )
+                changed.add(target_id)
+            mark_changed(db.session, model.__tablename__, changed)
+        db.session.commit()
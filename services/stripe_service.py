@@ -1,17 +1,24 @@
 import stripe
 import os
 from dotenv import load_dotenv
+from services import fake_stripe
+from services.metrics import metrics
 
 load_dotenv()
 
 # Configure Stripe
 stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
 
+
+def _client():
+    """The stripe module, or the in-process fake when STRIPE_BACKEND=fake (tests, load tests)"""
+    return fake_stripe if os.getenv('STRIPE_BACKEND') == 'fake' else stripe
+
 class StripeService:
     """Service class for handling Stripe payments"""
     
     @staticmethod
-    def create_payment_intent(amount, currency='usd', metadata=None):
+    def create_payment_intent(amount, currency='usd', metadata=None, idempotency_key=None):
         """
         Create a Stripe Payment Intent
         
@@ -19,6 +26,7 @@ class StripeService:
             amount: Amount in smallest currency unit (cents for USD)
             currency: Currency code (default: 'usd')
             metadata: Additional data to attach to payment
+            idempotency_key: Makes retries return the same intent (optional)
         
         Returns:
             Payment Intent object
@@ -27,12 +35,15 @@ class StripeService:
             # Convert amount to cents (Stripe requires smallest unit)
             amount_cents = int(amount * 100)
             
-            payment_intent = stripe.PaymentIntent.create(
-                amount=amount_cents,
-                currency=currency.lower(),
-                metadata=metadata or {},
-                automatic_payment_methods={'enabled': True}
-            )
+            options = {'idempotency_key': idempotency_key} if idempotency_key else {}
+            with metrics.stripe_call('payment_intent.create'):
+                payment_intent = _client().PaymentIntent.create(
+                    amount=amount_cents,
+                    currency=currency.lower(),
+                    metadata=metadata or {},
+                    automatic_payment_methods={'enabled': True},
+                    **options
+                )
             
             return {
                 'success': True,
@@ -74,7 +85,8 @@ class StripeService:
             Payment Intent confirmation result
         """
         try:
-            payment_intent = stripe.PaymentIntent.confirm(payment_intent_id)
+            with metrics.stripe_call('payment_intent.confirm'):
+                payment_intent = _client().PaymentIntent.confirm(payment_intent_id)
             
             return {
                 'success': True,
@@ -101,7 +113,8 @@ class StripeService:
             Payment Intent details
         """
         try:
-            payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            with metrics.stripe_call('payment_intent.retrieve'):
+                payment_intent = _client().PaymentIntent.retrieve(payment_intent_id)
             
             return {
                 'success': True,
@@ -130,7 +143,8 @@ class StripeService:
             Cancellation result
         """
         try:
-            payment_intent = stripe.PaymentIntent.cancel(payment_intent_id)
+            with metrics.stripe_call('payment_intent.cancel'):
+                payment_intent = _client().PaymentIntent.cancel(payment_intent_id)
             
             return {
                 'success': True,
@@ -165,7 +179,8 @@ class StripeService:
             if reason:
                 refund_data['reason'] = reason
             
-            refund = stripe.Refund.create(**refund_data)
+            with metrics.stripe_call('refund.create'):
+                refund = _client().Refund.create(**refund_data)
             
             return {
                 'success': True,
@@ -203,7 +218,8 @@ class StripeService:
             if metadata:
                 customer_data['metadata'] = metadata
             
-            customer = stripe.Customer.create(**customer_data)
+            with metrics.stripe_call('customer.create'):
+                customer = _client().Customer.create(**customer_data)
             
             return {
                 'success': True,
@@ -231,11 +247,11 @@ class StripeService:
             Event object if valid, None if invalid
         """
         try:
-            event = stripe.Webhook.construct_event(
+            event = _client().Webhook.construct_event(
                 payload, signature, webhook_secret
             )
             return event
         except ValueError:
             return None
-        except stripe.error.SignatureVerificationError:
+        except (stripe.error.SignatureVerificationError, fake_stripe.SignatureVerificationError):
             return None
\ No newline at end of file
@@ -0,0 +1,117 @@
+import json
+from datetime import datetime
+from sqlalchemy.orm import selectinload
+from models import db, booking, booking_group, stripe_event
+from utils.sql import insert_ignore
+
+
+HANDLED_EVENTS = ('payment_intent.succeeded', 'payment_intent.payment_failed', 'charge.refunded')
+
+
+class StripeWebhookProcessor:
+    """Records verified Stripe events and applies them to bookings in batches"""
+
+    @staticmethod
+    def record_event(event):
+        """
+        Store an event once; redeliveries of the same event ID are dropped
+        by the primary key. Does not commit.
+
+        Returns:
+            False if the event type is not one we act on
+        """
+        if event['type'] not in HANDLED_EVENTS:
+            return False
+        obj = event['data']['object']
+        intent_id = obj.get('payment_intent') if obj.get('object') == 'charge' else obj.get('id')
+        insert_ignore(stripe_event, [{
+            'id': event['id'],
+            'type': event['type'],
+            'payment_intent_id': intent_id,
+            'payload': json.dumps(obj, default=str),
+            'received_at': datetime.utcnow()
+        }], index_elements=['id'])
+        return True
+
+    @staticmethod
+    def process_pending(batch_size=100):
+        """
+        Apply up to batch_size unprocessed events in one transaction
+
+        Bookings for the whole batch are loaded with a single IN query,
+        booking groups (combined intents) and their bookings with another.
+        On PostgreSQL the batch is claimed with FOR UPDATE SKIP LOCKED so
+        concurrent webhook requests drain different events.
+
+        Returns:
+            number of events processed
+        """
+        events = stripe_event.query.filter(stripe_event.processed_at.is_(None)) \
+            .order_by(stripe_event.received_at) \
+            .limit(batch_size) \
+            .with_for_update(skip_locked=True) \
+            .all()
+        if not events:
+            return 0
+
+        intent_ids = {e.payment_intent_id for e in events if e.payment_intent_id}
+        by_intent = {}
+        if intent_ids:
+            for b in booking.query.filter(booking.stripe_payment_intent_id.in_(intent_ids)):
+                by_intent.setdefault(b.stripe_payment_intent_id, []).append(b)
+        groups = {}
+        if intent_ids:
+            groups = {g.stripe_payment_intent_id: g for g in booking_group.query
+                      .options(selectinload(booking_group.bookings))
+                      .filter(booking_group.stripe_payment_intent_id.in_(intent_ids))}
+
+        now = datetime.utcnow()
+        for event in events:
+            obj = json.loads(event.payload or '{}')
+            for booking_obj in by_intent.get(event.payment_intent_id, []):
+                StripeWebhookProcessor._apply(event.type, obj, booking_obj)
+            if event.payment_intent_id in groups:
+                StripeWebhookProcessor._apply_group(event.type, obj, groups[event.payment_intent_id])
+            event.processed_at = now
+        db.session.commit()
+        return len(events)
+
+    @staticmethod
+    def _apply(event_type, obj, booking_obj):
+        if event_type == 'payment_intent.succeeded':
+            if booking_obj.payment_status in ('paid', 'refunded'):
+                return
+            booking_obj.payment_status = 'paid'
+            booking_obj.booking_status = 'confirmed'
+            booking_obj.stripe_charge_id = obj.get('latest_charge')
+            booking_obj.payment_date = datetime.utcfromtimestamp(obj['created']) if obj.get('created') else datetime.utcnow()
+        elif event_type == 'payment_intent.payment_failed':
+            # The customer may retry with another card, so the booking stays open
+            if booking_obj.payment_status in ('pending', 'creating', 'processing'):
+                booking_obj.payment_status = 'failed'
+        elif event_type == 'charge.refunded':
+            refunded = (obj.get('amount_refunded') or 0) / 100
+            booking_obj.refund_amount = refunded
+            booking_obj.refund_status = 'processed'
+            if obj.get('refunded'):
+                booking_obj.payment_status = 'refunded'
+
+    @staticmethod
+    def _apply_group(event_type, obj, group):
+        """A combined intent settles every booking of the group; refunds are tracked on the group"""
+        if event_type == 'charge.refunded':
+            group.refund_amount = (obj.get('amount_refunded') or 0) / 100
+            if not obj.get('refunded'):
+                return
+            group.payment_status = 'refunded'
+            for booking_obj in group.bookings:
+                booking_obj.refund_amount = booking_obj.total_price
+                booking_obj.refund_status = 'processed'
+                booking_obj.payment_status = 'refunded'
+            return
+        for booking_obj in group.bookings:
+            StripeWebhookProcessor._apply(event_type, obj, booking_obj)
+        if event_type == 'payment_intent.succeeded' and group.payment_status not in ('paid', 'refunded'):
+            group.payment_status = 'paid'
+        elif event_type == 'payment_intent.payment_failed' and group.payment_status in ('pending', 'creating', 'processing'):
+            group.payment_status = 'failed'
@@ -0,0 +1,174 @@
+import re
+from sqlalchemy import case, event, func, literal_column, text
+from sqlalchemy.exc import OperationalError
+from models import db, search_vector
+from utils.validation import ValidationError
+
+
+MAX_TERMS = 8
+MAX_LIMIT = 50
+# Column weights for bm25(), in FTS5 column order: name, location, description
+FTS5_WEIGHTS = (10.0, 5.0, 1.0)
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(q):
+    """Lower-cased words of a search string; punctuation and query operators are dropped"""
+    terms = _WORD.findall((q or '').lower())[:MAX_TERMS]
+    if not terms:
+        raise ValidationError("q must contain at least one word", 400)
+    return terms
+
+
+def _fts5_ddl(table):
+    fts = f"{table}_fts"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"name, location, description, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, name, location, description) "
+        f"VALUES (new.id, new.name, new.location, new.description); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, name, location, description) "
+        f"VALUES ('delete', old.id, old.name, old.location, old.description); END",
+        # Only text edits touch the index; review aggregate and price updates do not
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF name, location, description ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, name, location, description) "
+        f"VALUES ('delete', old.id, old.name, old.location, old.description); "
+        f"INSERT INTO {fts}(rowid, name, location, description) "
+        f"VALUES (new.id, new.name, new.location, new.description); END",
+    ]
+
+
+class TextSearch:
+    """
+    Ranked full-text search over catalog names, locations and descriptions
+
+    PostgreSQL matches against the weighted tsvector expression that the
+    ix_<table>_search GIN indexes are built on and ranks with ts_rank_cd.
+    SQLite uses one external-content FTS5 table per catalog table, kept
+    in sync by triggers and ranked with bm25(); both are created on
+    db.create_all() and dropped on db.drop_all(), and an FTS5 table created for an existing database
+    is filled from its rows once. Every word of the query must match,
+    each as a prefix, so "old cit" finds "Old City Market".
+
+    Other databases, or an SQLite build without FTS5, fall back to a
+    substring scan; fine for a handful of rows, not for a real catalog.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self._fts5 = {}
+
+    def init_app(self, app, models=()):
+        self.models = {model.__tablename__: model for model in models}
+        if not event.contains(db.metadata, 'after_create', _create_fts5_tables):
+            event.listen(db.metadata, 'after_create', _create_fts5_tables)
+            event.listen(db.metadata, 'before_drop', _drop_fts5_tables)
+        app.extensions['text_search'] = self
+
+    def create_fts5_tables(self, connection):
+        for table in self.models:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': f"{table}_fts"}).first() is not None
+            try:
+                for statement in _fts5_ddl(table):
+                    connection.execute(text(statement))
+            except OperationalError:
+                # SQLite compiled without FTS5
+                self._fts5[table] = False
+                continue
+            if not exists:
+                connection.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+            self._fts5[table] = True
+
+    def drop_fts5_tables(self, connection):
+        """
+        Drop the FTS5 tables and their triggers with the catalog tables
+
+        They are not in the metadata, so drop_all() would leave them
+        behind: a later create_all() would find the table, skip the
+        rebuild and keep serving the old rows' index.
+        """
+        for table in self.models:
+            fts = f"{table}_fts"
+            for trigger in ('ai', 'ad', 'au'):
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {fts}_{trigger}"))
+            connection.execute(text(f"DROP TABLE IF EXISTS {fts}"))
+            self._fts5.pop(table, None)
+
+    def _has_fts5(self, table):
+        if table not in self._fts5:
+            self._fts5[table] = db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': f"{table}_fts"}).first() is not None
+        return self._fts5[table]
+
+    def search(self, model, q, limit=10):
+        """
+        Best matches for q in one catalog table
+
+        Returns:
+            list of (row, score) pairs, best first; higher scores are better
+        """
+        terms = search_terms(q)
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            return self._search_postgresql(model, terms, limit)
+        if dialect == 'sqlite' and self._has_fts5(model.__tablename__):
+            return self._search_fts5(model, terms, limit)
+        return self._search_scan(model, terms, limit)
+
+    def _search_postgresql(self, model, terms, limit):
+        vector = search_vector(model.name, model.location, model.description)
+        query = func.to_tsquery(literal_column("'simple'"), ' & '.join(f"{term}:*" for term in terms))
+        score = func.ts_rank_cd(vector, query)
+        rows = (db.session.query(model, score)
+                .filter(vector.op('@@')(query))
+                .order_by(score.desc(), model.id)
+                .limit(limit)
+                .all())
+        return [(row, float(rank)) for row, rank in rows]
+
+    def _search_fts5(self, model, terms, limit):
+        fts = f"{model.__tablename__}_fts"
+        weights = ', '.join(str(w) for w in FTS5_WEIGHTS)
+        match = ' '.join(f'"{term}"*' for term in terms)
+        hits = db.session.execute(
+            text(f"SELECT rowid, bm25({fts}, {weights}) AS rank FROM {fts} "
+                 f"WHERE {fts} MATCH :match ORDER BY rank LIMIT :limit"),
+            {'match': match, 'limit': limit}).all()
+        if not hits:
+            return []
+        rows = {row.id: row for row in model.query.filter(model.id.in_([hit.rowid for hit in hits]))}
+        # bm25() is lower-is-better; negate it so every backend ranks higher-is-better
+        return [(rows[hit.rowid], -hit.rank) for hit in hits if hit.rowid in rows]
+
+    def _search_scan(self, model, terms, limit):
+        query = model.query
+        score = 0
+        for term in terms:
+            name_hit = func.lower(model.name).contains(term, autoescape=True)
+            location_hit = func.lower(model.location).contains(term, autoescape=True)
+            description_hit = func.lower(model.description).contains(term, autoescape=True)
+            query = query.filter(name_hit | location_hit | description_hit)
+            score = score + case((name_hit, 3), else_=0) + case((location_hit, 2), else_=0) + case((description_hit, 1), else_=0)
+        rows = db.session.query(model, score).filter(query.whereclause).order_by(score.desc(), model.id).limit(limit).all()
+        return [(row, float(rank)) for row, rank in rows]
+
+
+text_search = TextSearch()
+
+
+def _create_fts5_tables(target, connection, **kw):
+    # Fires on every db.create_all(), so databases created before FTS5 was added get their tables too
+    if connection.dialect.name == 'sqlite':
+        text_search.create_fts5_tables(connection)
+
+
+def _drop_fts5_tables(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        text_search.drop_fts5_tables(connection)
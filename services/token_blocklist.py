@@ -0,0 +1,182 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, or_
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, revoked_token
+from services.local_redis import redis_from_url
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (no false negatives)"""
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class DatabaseRevocationStore:
+    """Revocations in the revoked_token table (shared by every worker using the same database)"""
+
+    def add(self, jti, expires_at, token_type=None):
+        db.session.merge(revoked_token(jti=jti, token_type=token_type, expires_at=expires_at,
+                                       revoked_at=datetime.utcnow()))
+        db.session.commit()
+
+    def contains(self, jti):
+        row = db.session.query(revoked_token.expires_at).filter(revoked_token.jti == jti).first()
+        return row is not None and (row.expires_at is None or row.expires_at > datetime.utcnow())
+
+    def revoked_since(self, since):
+        """jtis of unexpired revocations made at or after `since` (a unix timestamp, or None for all)"""
+        query = db.session.query(revoked_token.jti).filter(
+            or_(revoked_token.expires_at.is_(None), revoked_token.expires_at > datetime.utcnow()))
+        if since is not None:
+            query = query.filter(revoked_token.revoked_at >= datetime.utcfromtimestamp(since))
+        return [row.jti for row in query]
+
+    def purge_expired(self):
+        # Runs from the JWT loader in the middle of a request: its own connection
+        # and transaction, so committing the purge never commits the request's session
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(delete(revoked_token).where(revoked_token.expires_at <= datetime.utcnow()))
+        except SQLAlchemyError as e:
+            # Expired rows are only dead weight and revoked_since skips them; retried at the next rebuild
+            current_app.logger.warning("Revoked token purge failed: %s", e)
+
+
+class RedisRevocationStore:
+    """
+    Revocations in Redis: one key per jti that expires with the token,
+    plus a sorted set of jtis scored by revocation time for incremental sync
+    """
+
+    def __init__(self, client, max_token_lifetime, prefix='yp:revoked:'):
+        self.client = client
+        self.max_token_lifetime = max_token_lifetime
+        self.prefix = prefix
+
+    def add(self, jti, expires_at, token_type=None):
+        if expires_at is None:
+            # Never expires: no TTL, and a log score purge_expired never trims
+            self.client.set(self.prefix + jti, token_type or '1')
+            self.client.zadd(self.prefix + 'log', {jti: float('inf')})
+            return
+        ttl = int((expires_at - datetime.utcnow()).total_seconds())
+        if ttl <= 0:
+            return
+        self.client.set(self.prefix + jti, token_type or '1', ex=ttl)
+        self.client.zadd(self.prefix + 'log', {jti: time.time()})
+
+    def contains(self, jti):
+        return bool(self.client.exists(self.prefix + jti))
+
+    def revoked_since(self, since):
+        members = self.client.zrangebyscore(self.prefix + 'log', since if since is not None else '-inf', '+inf')
+        return [m.decode() if isinstance(m, bytes) else m for m in members]
+
+    def purge_expired(self):
+        # Per-jti keys expire on their own; trim log entries older than any token can live
+        self.client.zremrangebyscore(self.prefix + 'log', '-inf', time.time() - self.max_token_lifetime)
+
+
+class TokenBlocklist:
+    """
+    Revoked-token check for the JWT hot path
+
+    Revocations live in a shared store (database table or Redis) and
+    expire with the token itself. Each worker keeps a bloom filter of
+    revoked jtis that it refreshes incrementally every
+    TOKEN_BLOCKLIST_SYNC_SECONDS, so checking a token that was never
+    revoked costs no store round trip. Only bloom hits (real revocations
+    and rare false positives) are confirmed against the store.
+
+    Revocations from another worker or node become visible here within
+    one sync interval; revocations made by this worker are visible
+    immediately.
+    """
+
+    SYNC_OVERLAP = 5  # seconds re-read on every sync to tolerate clock skew between nodes
+
+    def __init__(self):
+        self.store = DatabaseRevocationStore()
+        self.sync_interval = 1.0
+        self.rebuild_interval = 3600.0
+        self.capacity = 100000
+        self._bloom = BloomFilter(self.capacity)
+        self._last_sync = None
+        self._last_rebuild = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.sync_interval = float(app.config.get('TOKEN_BLOCKLIST_SYNC_SECONDS', 1))
+        self.capacity = int(app.config.get('TOKEN_BLOCKLIST_CAPACITY', 100000))
+        if app.config.get('TOKEN_BLOCKLIST_BACKEND', 'database') == 'redis':
+            max_lifetime = app.config.get('JWT_REFRESH_TOKEN_EXPIRES')
+            max_lifetime = max_lifetime.total_seconds() if max_lifetime else 30 * 24 * 3600
+            self.store = RedisRevocationStore(redis_from_url(app.config['TOKEN_BLOCKLIST_REDIS_URL']), max_lifetime)
+        else:
+            self.store = DatabaseRevocationStore()
+        self._bloom = BloomFilter(self.capacity)
+        self._last_sync = None
+        app.extensions['token_blocklist'] = self
+
+    def revoke(self, jti, exp, token_type=None):
+        """Revoke a token until its own expiry (`exp` is the JWT exp claim; None revokes it for good)"""
+        self.store.add(jti, datetime.utcfromtimestamp(exp) if exp is not None else None, token_type)
+        with self._lock:
+            self._bloom.add(jti)
+
+    def is_revoked(self, jti):
+        if not jti:
+            return False
+        self._sync()
+        if jti not in self._bloom:
+            return False
+        return self.store.contains(jti)
+
+    def _sync(self):
+        now = time.time()
+        if self._last_sync is not None and now - self._last_sync < self.sync_interval:
+            return
+        if not self._lock.acquire(blocking=self._last_sync is None):
+            return  # another thread is already syncing; the current filter is at most one interval old
+        try:
+            if self._last_sync is not None and now - self._last_sync < self.sync_interval:
+                return
+            if self._last_sync is None or now - self._last_rebuild >= self.rebuild_interval:
+                # Full rebuild drops expired jtis and keeps the false positive rate in check
+                self.store.purge_expired()
+                jtis = self.store.revoked_since(None)
+                bloom = BloomFilter(max(self.capacity, 2 * len(jtis)))
+                self._last_rebuild = now
+            else:
+                jtis = self.store.revoked_since(self._last_sync - self.SYNC_OVERLAP)
+                bloom = self._bloom
+            for jti in jtis:
+                bloom.add(jti)
+            self._bloom = bloom
+            self._last_sync = now
+        finally:
+            self._lock.release()
+
+
+token_blocklist = TokenBlocklist()
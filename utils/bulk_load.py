@@ -0,0 +1,229 @@
+import csv
+import io
+import json
+import sys
+import time
+from datetime import date, datetime
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, insert, text
+from models import db
+from utils.validation import ValidationError
+
+
+def read_rows(path, fmt=None):
+    """
+    Stream dict rows from a CSV (with header) or JSON Lines file
+
+    The format comes from the file extension unless fmt is given; '-'
+    reads standard input. Rows are yielded one at a time, so files of any
+    size load in constant memory.
+    """
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        raise ValidationError("format must be csv or jsonl", 400)
+    handle = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if fmt == 'csv':
+            yield from csv.DictReader(handle)
+        else:
+            for line_number, line in enumerate(handle, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    raise ValidationError(f"{path}:{line_number}: invalid JSON", 400)
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+class RowCoercer:
+    """
+    Converts loose input rows (CSV strings, JSON values) into complete
+    column dicts for one model
+
+    Every output row has the same keys, which executemany and COPY need.
+    The key set is fixed by the first row: its columns, plus every column
+    with a Python-side default (e.g. created_at), which missing values
+    fall back to. Other absent columns are NULL, except an absent primary
+    key, which is left to the database.
+    """
+
+    def __init__(self, model):
+        self.table = model.__table__
+        self.columns = None
+
+    def _select_columns(self, first_row):
+        return [
+            c for c in self.table.columns
+            if c.name in first_row or c.default is not None
+            or not (c.primary_key or c.server_default is not None)
+        ]
+
+    def _default(self, column):
+        default = column.default
+        if default is None:
+            return None
+        if default.is_callable:
+            return default.arg(None)
+        return default.arg if default.is_scalar else None
+
+    @staticmethod
+    def _converter(column):
+        """Parse function for one column, picked once instead of per cell"""
+        column_type = column.type
+        if isinstance(column_type, Boolean):
+            return lambda v: v if isinstance(v, bool) else str(v).lower() in ('1', 'true', 'yes', 't')
+        if isinstance(column_type, Integer):
+            return lambda v: v if type(v) is int else int(v)
+        if isinstance(column_type, Float):
+            return lambda v: v if type(v) is float else float(v)
+        if isinstance(column_type, DateTime):
+            return lambda v: v if isinstance(v, datetime) else datetime.fromisoformat(str(v))
+        if isinstance(column_type, Date):
+            return lambda v: v if isinstance(v, date) else date.fromisoformat(str(v)[:10])
+        return None
+
+    def __call__(self, row):
+        if self.columns is None:
+            self.columns = self._select_columns(row)
+            self.names = {c.name for c in self.columns}
+            self.plan = [(c.name, self._converter(c), c.default is not None) for c in self.columns]
+        if not row.keys() <= self.names:
+            unknown = set(row) - self.names
+            known = {c.name for c in self.table.columns}
+            if unknown - known:
+                raise ValidationError(f"Unknown columns: {', '.join(sorted(unknown - known))}", 400)
+            raise ValidationError(f"Columns missing from the first row: {', '.join(sorted(unknown))}", 400)
+        out = {}
+        for (name, convert, has_default), column in zip(self.plan, self.columns):
+            value = row.get(name)
+            if value is None or value == '':
+                out[name] = self._default(column) if has_default and name not in row else None
+            elif convert is None:
+                out[name] = value
+            else:
+                try:
+                    out[name] = convert(value)
+                except ValueError:
+                    raise ValidationError(f"{name}: invalid value {value!r}", 400)
+        return out
+
+
+class Progress:
+    """Prints rows loaded and throughput at most every `interval` seconds"""
+
+    def __init__(self, label, interval=2.0, stream=None):
+        self.label = label
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.rows = 0
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def update(self, rows):
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self._print(now, end='\r')
+
+    def done(self):
+        self._print(time.perf_counter(), end='\n')
+        return self.rows
+
+    def _print(self, now, end):
+        elapsed = max(now - self.started, 1e-9)
+        print(f"  {self.label}: {self.rows:,} rows in {elapsed:.1f}s ({self.rows / elapsed:,.0f} rows/s)",
+              end=end, file=self.stream, flush=True)
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_batch(table, columns, batch, skip_conflicts):
+    """COPY one batch through psycopg2; with skip_conflicts it goes via a temp table and ON CONFLICT DO NOTHING"""
+    buffer = io.StringIO()
+    # QUOTE_NONNUMERIC writes None as an empty unquoted field (NULL) and '' as "" (empty string)
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in batch:
+        writer.writerow([row[c] for c in columns])
+    buffer.seek(0)
+
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    connection = db.session.connection()
+    cursor = connection.connection.cursor()
+    try:
+        if skip_conflicts:
+            connection.execute(text(
+                f'CREATE TEMP TABLE IF NOT EXISTS "_load_{table}" (LIKE "{table}" INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'))
+            cursor.copy_expert(f'COPY "_load_{table}" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+            connection.execute(text(
+                f'INSERT INTO "{table}" ({column_list}) SELECT {column_list} FROM "_load_{table}" ON CONFLICT DO NOTHING'))
+        else:
+            cursor.copy_expert(f'COPY "{table}" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+def bulk_insert(model, rows, batch_size=5000, skip_conflicts=False, use_copy=True, progress=None):
+    """
+    Load an iterable of row dicts into model's table in batches
+
+    Each batch is written and committed on its own, so memory stays flat
+    and an interrupted load keeps what it already wrote:
+      - PostgreSQL with use_copy: COPY FROM STDIN (via a temp table when
+        skip_conflicts is set)
+      - otherwise one executemany INSERT per batch, with ON CONFLICT DO
+        NOTHING when skip_conflicts is set (PostgreSQL and SQLite)
+
+    Rows may be loose (CSV strings, missing columns); they are coerced to
+    the column types first. With skip_conflicts, rows clashing with any
+    unique key (primary key, email, confirmation code...) are dropped.
+
+    Returns:
+        number of rows processed
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    coerce = RowCoercer(model)
+    progress = progress or Progress(table.name)
+    copy = use_copy and dialect == 'postgresql'
+
+    if skip_conflicts and dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).on_conflict_do_nothing()
+    elif skip_conflicts and dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table).on_conflict_do_nothing()
+    else:
+        stmt = insert(table)
+
+    for batch in _batches((coerce(row) for row in rows), batch_size):
+        try:
+            if copy:
+                _copy_batch(table.name, list(batch[0]), batch, skip_conflicts)
+            else:
+                db.session.execute(stmt, batch)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        progress.update(len(batch))
+
+    if dialect == 'postgresql' and 'id' in table.c and table.c.id.autoincrement:
+        # Explicit ids bypass the sequence; move it past the highest id
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM \"{table.name}\"), 0) + 1, false)"))
+        db.session.commit()
+    return progress.done()
@@ -0,0 +1,109 @@
+from sqlalchemy import func
+from utils.validation import ValidationError
+from utils.pagination import keyset_paginate
+from utils.projection import project, project_dicts, parse_fields
+from utils.conditional import query_validators
+
+
+SORT_FIELDS = ('created_at', 'price', 'rating', 'review_average')
+
+
+def _parse_float(args, name):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValidationError(f"{name} must be a number", 400)
+
+
+def _parse_range(args, name):
+    """Parse legacy "min-max" range arguments (e.g. price_range=50-120)"""
+    value = args.get(name)
+    if not value:
+        return None, None
+    try:
+        low, high = value.split('-')
+        return float(low), float(high)
+    except ValueError:
+        raise ValidationError(f"Invalid {name}", 400)
+
+
+def parse_catalog_filters(args):
+    """
+    Read catalog search filters from query args
+
+    Supported args: location, name (prefix), min_price, max_price,
+    min_rating, max_rating. The legacy price_range / rating_range
+    "min-max" form is accepted as well.
+    """
+    filters = {
+        'location': (args.get('location') or '').strip() or None,
+        'name': (args.get('name') or '').strip().lower() or None,
+        'min_price': _parse_float(args, 'min_price'),
+        'max_price': _parse_float(args, 'max_price'),
+        'min_rating': _parse_float(args, 'min_rating'),
+        'max_rating': _parse_float(args, 'max_rating'),
+    }
+
+    low, high = _parse_range(args, 'price_range')
+    if low is not None:
+        filters['min_price'], filters['max_price'] = low, high
+    low, high = _parse_range(args, 'rating_range')
+    if low is not None:
+        filters['min_rating'], filters['max_rating'] = low, high
+
+    if filters['min_price'] is not None and filters['max_price'] is not None \
+            and filters['min_price'] > filters['max_price']:
+        raise ValidationError("min_price must be <= max_price", 400)
+    if filters['min_rating'] is not None and filters['max_rating'] is not None \
+            and filters['min_rating'] > filters['max_rating']:
+        raise ValidationError("min_rating must be <= max_rating", 400)
+    return filters
+
+
+def apply_catalog_filters(query, model, filters):
+    """
+    Push every filter into one WHERE clause
+
+    Location/price/rating are served by the (location, price, rating)
+    composite index. The name prefix becomes a half-open range on
+    lower(name) so it can use the lower(name) index on both SQLite and
+    PostgreSQL, where LIKE 'x%' would not under a non-C collation.
+    """
+    if filters.get('location'):
+        query = query.filter(model.location == filters['location'])
+    if filters.get('min_price') is not None:
+        query = query.filter(model.price >= filters['min_price'])
+    if filters.get('max_price') is not None:
+        query = query.filter(model.price <= filters['max_price'])
+    if filters.get('min_rating') is not None:
+        query = query.filter(model.rating >= filters['min_rating'])
+    if filters.get('max_rating') is not None:
+        query = query.filter(model.rating <= filters['max_rating'])
+    if filters.get('name'):
+        prefix = filters['name']
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        query = query.filter(func.lower(model.name) >= prefix, func.lower(model.name) < upper)
+    return query
+
+
+def search_catalog(model, args):
+    """
+    Run a filtered, keyset-paginated catalog search in a single SELECT
+    of just the serialized columns (or those behind fields=)
+
+    Returns:
+        (items, pagination) where items is a list of to_dict() rows
+    """
+    filters = parse_catalog_filters(args)
+    fields = parse_fields(args, model)
+    query = project(apply_catalog_filters(model.query, model, filters), model, *SORT_FIELDS, fields=fields)
+    rows, pagination = keyset_paginate(query, model, args, sort_fields=SORT_FIELDS)
+    return project_dicts(model, rows, fields), pagination
+
+
+def search_validators(model, args):
+    """query_validators() of every row a catalog search matches, for conditional reads"""
+    return query_validators(apply_catalog_filters(model.query, model, parse_catalog_filters(args)), model)
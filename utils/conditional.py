@@ -0,0 +1,49 @@
+import hashlib
+import json
+from flask import request, make_response
+from sqlalchemy import func
+
+
+def query_validators(query, model):
+    """
+    [row count, newest updated_at as ISO 8601 or None] of the rows a
+    query matches, from one aggregate SELECT
+
+    A row that is created, updated (updated_at is bumped on every write)
+    or deleted changes one of the two, so together they tell whether
+    anything a read returns can have changed. This is a full aggregate
+    over the matched rows: callers cache it per table version where they
+    can (catalog reads), and it runs on every request where they cannot
+    (review lists, or any read with CACHE_BACKEND=none).
+    """
+    count, newest = query.order_by(None).with_entities(func.count(model.id), func.max(model.updated_at)).one()
+    return [count, newest.isoformat() if newest else None]
+
+
+def conditional(validators, render, scope=()):
+    """
+    Answer a read with an ETag header, or with 304
+
+    validators come from query_validators() (possibly cached). The ETag
+    hashes them with the request path and query string, so every page,
+    sort and fields= variant gets its own; scope adds whatever else the
+    rows depend on (e.g. the user id of a per-user listing) and marks the
+    response private. render() builds the usual (body, status) response
+    and is only called when the client's copy is stale.
+
+    No Last-Modified is sent: the newest updated_at does not move when
+    an older row is deleted, so If-Modified-Since would answer 304 for a
+    listing that lost a row. The row count in the ETag does catch it.
+    """
+    etag = hashlib.sha1(json.dumps([*validators, request.full_path, *map(str, scope)]).encode()).hexdigest()
+    fresh = request.if_none_match.contains_weak(etag)
+    response = make_response('', 304) if fresh else make_response(render())
+    if response.status_code not in (200, 304):
+        return response
+
+    # Weak: the same rows may be encoded (or compressed) differently
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    if scope:
+        response.cache_control.private = True
+    return response
@@ -0,0 +1,89 @@
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+PRECISION = 9  # ~5 m cells; stored on catalog rows
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a point; rows sharing a prefix lie in the same cell"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            interval[0] = middle
+        else:
+            value *= 2
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) of a cell in degrees of latitude and longitude"""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the circle around a point
+
+    Picks the finest precision whose cells are at least radius_km tall and
+    wide at this latitude, so the circle lies within the 3x3 block of
+    cells around the centre. Returns at most nine distinct prefixes (fewer
+    at the poles and the antimeridian); an empty string means the whole
+    world.
+    """
+    # Cells narrow towards the poles; size them for the circle's poleward edge
+    edge_latitude = min(90.0, abs(latitude) + radius_km / KM_PER_DEGREE)
+    lng_km_per_degree = KM_PER_DEGREE * max(math.cos(math.radians(edge_latitude)), 1e-6)
+    precision = 0
+    for candidate in range(1, PRECISION + 1):
+        height, width = cell_size(candidate)
+        if height * KM_PER_DEGREE < radius_km or width * lng_km_per_degree < radius_km:
+            break
+        precision = candidate
+    if precision == 0:
+        return ['']
+    height, width = cell_size(precision)
+    cells = set()
+    for d_lat in (-height, 0.0, height):
+        for d_lng in (-width, 0.0, width):
+            lat = latitude + d_lat
+            if not -90.0 <= lat <= 90.0:
+                continue
+            lng = (longitude + d_lng + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lng, precision))
+    return sorted(cells)
+
+
+def prefix_upper_bound(prefix):
+    """
+    Exclusive upper bound of the geohashes starting with prefix, or None
+    when no geohash sorts after them (an all-'z' prefix)
+
+    The next prefix of the same length: the last digit incremented in
+    BASE32 with carry ('u3z' -> 'u4'), so the bound is itself a geohash
+    and sorts the same way under any collation, unlike a punctuation
+    sentinel such as prefix + '{'.
+    """
+    prefix = prefix.rstrip('z')
+    if not prefix:
+        return None
+    return prefix[:-1] + BASE32[BASE32.index(prefix[-1]) + 1]
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,70 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # optional dependency, much faster than the stdlib json module
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson
+
+    Output decodes to the same values as DefaultJSONProvider's: keys are
+    sorted, and types orjson does not encode itself (date/datetime,
+    Decimal, objects with __html__) go through the same default() hook,
+    so datetimes still come out as HTTP dates. Non-ASCII text is written
+    as UTF-8 instead of \\u escapes. Responses are written as bytes without
+    a str round trip. Calls with options orjson has no equivalent for fall
+    back to the stdlib encoder.
+    """
+
+    def _options(self, kwargs):
+        """orjson options for these json.dumps kwargs, or None if orjson cannot honour them"""
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.pop('sort_keys', self.sort_keys):
+            options |= orjson.OPT_SORT_KEYS
+        indent = kwargs.pop('indent', None)
+        if indent:
+            if indent != 2:
+                return None
+            options |= orjson.OPT_INDENT_2
+        kwargs.pop('separators', None)
+        return None if kwargs else options
+
+    def dumps(self, obj, **kwargs):
+        options = self._options(dict(kwargs))
+        if options is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=options).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        options = self._options({'indent': 2} if pretty else {})
+        body = orjson.dumps(obj, default=self.default, option=options | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json(app):
+    """
+    Install the JSON provider chosen by JSON_ENCODER: orjson, stdlib, or
+    auto (orjson when installed)
+
+    Returns:
+        name of the encoder in use
+    """
+    choice = app.config.get('JSON_ENCODER', 'auto')
+    if choice not in ('auto', 'orjson', 'stdlib'):
+        raise ValueError("JSON_ENCODER must be one of: auto, orjson, stdlib")
+    if choice == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_ENCODER=orjson but orjson is not installed")
+    if choice == 'stdlib' or orjson is None:
+        return 'stdlib'
+    app.json = OrjsonProvider(app)
+    return 'orjson'
@@ -0,0 +1,140 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.types import DateTime, Float, Integer, Numeric, String
+from utils.validation import ValidationError
+
+
+MAX_PER_PAGE = 100
+
+
+def _encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        sort, order, value, last_id = payload['s'], payload['o'], payload['v'], payload['id']
+    except Exception:
+        raise ValidationError("Invalid cursor", 400)
+    if not isinstance(sort, str) or not isinstance(order, str) or not _is_int(last_id):
+        raise ValidationError("Invalid cursor", 400)
+    return sort, order, value, last_id
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _dump_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _load_value(column, value):
+    """The cursor's sort value, checked against the column type so it can be bound safely"""
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValidationError("Invalid cursor", 400)
+    if isinstance(column.type, (Integer, Float, Numeric)):
+        valid = _is_int(value) or isinstance(value, float)
+    elif isinstance(column.type, String):
+        valid = isinstance(value, str)
+    else:
+        valid = isinstance(value, (str, int, float)) and not isinstance(value, bool)
+    if not valid:
+        raise ValidationError("Invalid cursor", 400)
+    return value
+
+
+def keyset_paginate(query, model, args, sort_fields=('created_at',), default_order='desc'):
+    """
+    Cursor (keyset) pagination over (sort key, id)
+
+    Each page is a plain range scan on the (sort key, id) index, so the
+    cost does not grow with page depth the way OFFSET does, and no
+    COUNT(*) runs unless the client asks for include_total=true.
+
+    Query args:
+        cursor: opaque token from the previous page's next_cursor
+        per_page: page size (max 100)
+        sort: one of sort_fields (defaults to the first one)
+        order: 'asc' or 'desc'
+        include_total: 'true' to also return the total row count
+
+    Returns:
+        (items, pagination) where items are ORM objects, or rows for a
+        query restricted with utils.projection.project()
+    """
+    try:
+        per_page = min(max(int(args.get('per_page', 10)), 1), MAX_PER_PAGE)
+    except ValueError:
+        raise ValidationError("per_page must be an integer", 400)
+
+    sort = args.get('sort') or sort_fields[0]
+    order = (args.get('order') or default_order).lower()
+    cursor = args.get('cursor')
+    last_value = last_id = None
+    if cursor:
+        # The cursor pins the ordering it was issued for
+        sort, order, last_value, last_id = _decode_cursor(cursor)
+
+    if sort not in sort_fields:
+        raise ValidationError(f"sort must be one of: {', '.join(sort_fields)}", 400)
+    if order not in ('asc', 'desc'):
+        raise ValidationError("order must be 'asc' or 'desc'", 400)
+
+    total = None
+    if str(args.get('include_total', '')).lower() in ('1', 'true', 'yes'):
+        total = query.order_by(None).count()
+
+    pk = model.id
+    column = getattr(model, sort)
+    descending = order == 'desc'
+
+    if cursor:
+        if sort == 'id':
+            query = query.filter(pk < last_id if descending else pk > last_id)
+        else:
+            last_value = _load_value(column, last_value)
+            if descending:
+                query = query.filter(or_(column < last_value, and_(column == last_value, pk < last_id)))
+            else:
+                query = query.filter(or_(column > last_value, and_(column == last_value, pk > last_id)))
+
+    if sort == 'id':
+        ordering = [pk.desc() if descending else pk.asc()]
+    else:
+        ordering = [column.desc(), pk.desc()] if descending else [column.asc(), pk.asc()]
+
+    rows = query.order_by(*ordering).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = _encode_cursor({
+            's': sort,
+            'o': order,
+            'v': _dump_value(getattr(last, sort)),
+            'id': last.id
+        })
+
+    pagination = {
+        "per_page": per_page,
+        "sort": sort,
+        "order": order,
+        "has_more": has_more,
+        "next_cursor": next_cursor
+    }
+    if total is not None:
+        pagination["total"] = total
+    return items, pagination
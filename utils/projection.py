@@ -0,0 +1,77 @@
+from functools import lru_cache
+from sqlalchemy.types import Date, DateTime
+from utils.validation import parse_include
+
+
+@lru_cache(maxsize=None)
+def field_columns(model):
+    """{to_dict() key: columns it is built from} for a model with DICT_COLUMNS"""
+    derived = getattr(model, 'DERIVED_FIELDS', {})
+    used = {column for columns, _ in derived.values() for column in columns}
+    fields = {name: (name,) for name in model.DICT_COLUMNS if name not in used}
+    fields.update({name: columns for name, (columns, _) in derived.items()})
+    return fields
+
+
+def parse_fields(args, *models):
+    """
+    The fields= query arg (e.g. "id,name,price,rating") as a frozenset of
+    to_dict() keys of the given models, or None when every field is wanted
+    """
+    allowed = sorted({name for model in models for name in field_columns(model)})
+    return frozenset(parse_include(args.get('fields'), allowed, 'fields')) or None
+
+
+def project(query, model, *extra, fields=None):
+    """
+    Restrict a query to the columns model.row_dict() reads (or just those
+    behind `fields`), plus id and extra (e.g. the keyset sort keys)
+
+    Rows come back as named tuples instead of ORM instances: no identity
+    map, no change tracking and no attribute instrumentation, which is
+    most of the cost of loading a large page. Only for read-only listings;
+    anything that modifies rows or follows relationships needs the model.
+    """
+    if fields is None:
+        names = model.DICT_COLUMNS
+    else:
+        columns = field_columns(model)
+        names = [name for field in sorted(fields) for name in columns[field]]
+    names = dict.fromkeys(('id', *names, *extra))
+    return query.with_entities(*(getattr(model, name) for name in names))
+
+
+@lru_cache(maxsize=256)
+def _serializer(model, fields):
+    derived = getattr(model, 'DERIVED_FIELDS', {})
+    getters = []
+    for field in sorted(fields):
+        if field in derived:
+            getters.append((field, derived[field][1]))
+        elif isinstance(model.__table__.c[field].type, (Date, DateTime)):
+            getters.append((field, lambda row, name=field: getattr(row, name).isoformat() if getattr(row, name) else None))
+        else:
+            getters.append((field, lambda row, name=field: getattr(row, name)))
+    return lambda row: {field: get(row) for field, get in getters}
+
+
+def project_dicts(model, rows, fields=None):
+    """row_dict() of every projected row, or just its `fields` keys"""
+    if fields is None:
+        return [model.row_dict(row) for row in rows]
+    serialize = _serializer(model, fields)
+    return [serialize(row) for row in rows]
+
+
+def pick(data, fields, keep=()):
+    """
+    Restrict dicts that are already built (cached entries, search hits,
+    rows with embedded resources) to `fields` plus the `keep` keys; data
+    may be one dict, a list of them or None
+    """
+    if fields is None or data is None:
+        return data
+    wanted = fields.union(keep)
+    if isinstance(data, list):
+        return [{key: value for key, value in item.items() if key in wanted} for item in data]
+    return {key: value for key, value in data.items() if key in wanted}
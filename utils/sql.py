@@ -0,0 +1,33 @@
+from sqlalchemy.exc import IntegrityError
+from models import db
+
+
+def insert_ignore(model, rows, index_elements):
+    """
+    Multi-row INSERT that skips rows clashing with a unique key
+
+    Uses INSERT ... ON CONFLICT DO NOTHING on PostgreSQL and SQLite, and
+    falls back to one savepoint per row on other databases.
+
+    Returns:
+        number of rows inserted
+    """
+    if not rows:
+        return 0
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        inserted = 0
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(model.__table__.insert().values(**row))
+                inserted += 1
+            except IntegrityError:
+                pass
+        return inserted
+    stmt = insert(model.__table__).values(rows).on_conflict_do_nothing(index_elements=index_elements)
+    return db.session.execute(stmt).rowcount
@@ -73,6 +73,48 @@ def parse_date(value: str, field_name: str, fmt: str = '%Y-%m-%d'):
         raise ValidationError(f"{field_name} must match format {fmt}", 400)
 
 
+def parse_slot_time(value, field_name: str = 'time'):
+    """Normalise a time slot such as "7:30" or "19:00" to zero-padded HH:MM"""
+    try:
+        return datetime.strptime(value.strip(), '%H:%M').strftime('%H:%M')
+    except Exception:
+        raise ValidationError(f"{field_name} must match format HH:MM", 400)
+
+
+def parse_include(value, allowed, field_name: str = 'include'):
+    """Parse a comma-separated list such as "hotel,restaurant" into a set of allowed names"""
+    names = {name.strip() for name in (value or '').split(',') if name.strip()}
+    unknown = names - set(allowed)
+    if unknown:
+        raise ValidationError(f"{field_name} must be a comma-separated subset of: {', '.join(allowed)}", 400)
+    return names
+
+
+def validate_coordinates(data: dict):
+    """Optional latitude/longitude pair from a JSON body; returns (None, None) when absent"""
+    validate_fields(data, {
+        'latitude': {'required': False, 'type': 'number', 'min': -90, 'max': 90},
+        'longitude': {'required': False, 'type': 'number', 'min': -180, 'max': 180}
+    })
+    latitude, longitude = data.get('latitude'), data.get('longitude')
+    if (latitude is None) != (longitude is None):
+        raise ValidationError("latitude and longitude must be given together", 400)
+    return latitude, longitude
+
+
+def parse_limit(value, default: int, maximum: int, field_name: str = 'limit'):
+    """Parse an optional positive result count, clamped to maximum"""
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"{field_name} must be an integer", 400)
+    if limit < 1:
+        raise ValidationError(f"{field_name} must be at least 1", 400)
+    return min(limit, maximum)
+
+
 def validate_password_strength(password: str, min_length: int = 8):
     if not isinstance(password, str) or len(password) < min_length:
         raise ValidationError(f"Password must be at least {min_length} characters", 400)